@@ -0,0 +1,233 @@
+# animation.py
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from coloration import map_smooth_to_color_fixed
+from poster import POSTER_TILE, compute_tile, poster_tiles, write_png
+
+# Rapport d'échelle entre deux images clés successives : chaque image clé sert toutes les
+# images dont la largeur de vue est comprise entre KEY_RATIO fois la sienne et la sienne.
+KEY_RATIO = 0.5
+
+# Sous-échantillons par axe lors de la réduction d'une image clé en image de la vidéo ;
+# les couleurs des sous-échantillons sont moyennées.
+FRAME_SAMPLES = 2
+
+# Champs d'une image clé repris de la précédente lorsqu'ils sont absents.
+KEYFRAME_FIELDS = ("center", "span", "max_iter", "fractal", "colormap", "gamma")
+KEYFRAME_DEFAULTS = {"fractal": "Mandelbrot", "colormap": "viridis", "gamma": 0.5}
+
+
+def load_path(path):
+    """
+    Lit un chemin d'animation JSON :
+      {"fps": 30, "size": [1280, 720],
+       "keyframes": [{"time": 0, "center": [-0.75, 0], "span": 3.5, "max_iter": 200},
+                     {"time": 20, "center": [-0.7436, 0.1318], "span": 1e-6, "max_iter": 3000}]}
+    'span' est la largeur de la vue dans le plan complexe ; les champs absents d'une image
+    clé (formule, colormap, gamma...) sont repris de la précédente.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    keyframes = []
+    previous = dict(KEYFRAME_DEFAULTS)
+    for key in sorted(data["keyframes"], key=lambda k: k["time"]):
+        key = dict(previous, **key)
+        keyframes.append(key)
+        previous = {name: key[name] for name in KEYFRAME_FIELDS if name in key}
+    return data.get("fps", 30), tuple(data.get("size", (1280, 720))), keyframes
+
+
+def interpolate(a, b, u):
+    """
+    Vue à la fraction u (entre 0 et 1) du segment entre les images clés a et b.
+
+    La largeur de vue suit une interpolation exponentielle (vitesse de zoom constante à
+    l'écran). Le centre avance proportionnellement à la réduction de la largeur, si bien
+    que le point visé par b se rapproche régulièrement du centre de l'écran ; max_iter est
+    interpolé géométriquement et gamma linéairement, la formule et le colormap sont ceux de a.
+    """
+    span = a["span"] * (b["span"] / a["span"]) ** u
+    w = (a["span"] - span) / (a["span"] - b["span"]) if a["span"] != b["span"] else u
+    center = [ca + (cb - ca) * w for ca, cb in zip(a["center"], b["center"])]
+    max_iter = int(round(a["max_iter"] * (b["max_iter"] / a["max_iter"]) ** u))
+    gamma = a["gamma"] + (b["gamma"] - a["gamma"]) * u
+    return {"center": center, "span": span, "max_iter": max_iter, "gamma": gamma,
+            "fractal": a["fractal"], "colormap": a["colormap"]}
+
+
+def frame_views(fps, keyframes):
+    """
+    Retourne la liste des vues de toutes les images de l'animation.
+    """
+    views = []
+    for a, b in zip(keyframes, keyframes[1:]):
+        count = int(round((b["time"] - a["time"]) * fps))
+        views.extend(interpolate(a, b, i / count) for i in range(count))
+    views.append(interpolate(keyframes[-1], keyframes[-1], 0.0))
+    return views
+
+
+def plan_levels(views, width, height, ratio=KEY_RATIO):
+    """
+    Regroupe les images successives par image clé à calculer.
+
+    Un groupe se termine quand la largeur de vue sort de ['ratio' fois, 1 / 'ratio' fois] la
+    plus grande du groupe, quand le centre s'est déplacé de plus d'une demi-largeur ou
+    quand la formule change. L'image clé couvre les vues de toutes ses images
+    avec le pas de la plus fine : chaque image s'en déduit par réduction, sans calcul.
+    Retourne la liste des images clés {"grid", "size", "max_iter", "fractal", "frames"}.
+    """
+    groups = []
+    for index, view in enumerate(views):
+        group = groups[-1] if groups else None
+        if group is not None:
+            widest = max(v["span"] for _, v in group)
+            first = group[0][1]["center"]
+            moved = max(abs(view["center"][0] - first[0]), abs(view["center"][1] - first[1]))
+        if (group is None or view["fractal"] != group[0][1]["fractal"] or
+                not ratio * widest <= view["span"] <= widest / ratio or moved > widest / 2):
+            groups.append([])
+        groups[-1].append((index, view))
+    levels = []
+    for group in groups:
+        step = min(v["span"] for _, v in group) / (width - 1)
+        lo_re = min(v["center"][0] - v["span"] / 2 for _, v in group)
+        hi_re = max(v["center"][0] + v["span"] / 2 for _, v in group)
+        lo_im = min(v["center"][1] - v["span"] * (height - 1) / (width - 1) / 2 for _, v in group)
+        hi_im = max(v["center"][1] + v["span"] * (height - 1) / (width - 1) / 2 for _, v in group)
+        size = (int(math.ceil((hi_re - lo_re) / step)) + 1, int(math.ceil((hi_im - lo_im) / step)) + 1)
+        levels.append({"grid": [lo_re, lo_im, step, step], "size": size,
+                       "max_iter": max(v["max_iter"] for _, v in group),
+                       "fractal": group[0][1]["fractal"], "frames": [i for i, _ in group]})
+    return levels
+
+
+def _compute_level_tile(job):
+    path, rect, params = job
+    y0, y1, x0, x1 = rect
+    level = np.load(path, mmap_mode="r+")
+    level[y0:y1, x0:x1] = compute_tile(rect, params)
+    level.flush()
+    del level
+    return path
+
+
+def render_frame(level_path, level, view, width, height, samples=FRAME_SAMPLES):
+    """
+    Déduit une image de la vidéo de son image clé : chaque pixel reçoit la moyenne des
+    couleurs de samples×samples points de l'image clé (plus proche voisin), colorés avec
+    map_smooth_to_color_fixed comme à l'affichage (normalisation par le max_iter de la vue).
+    """
+    values = np.load(level_path, mmap_mode="r")
+    re_start, im_start, step, _ = level["grid"]
+    # Pixels carrés : même pas sur les deux axes
+    view_step = view["span"] / (width - 1)
+    re0 = view["center"][0] - view_step * (width - 1) / 2
+    im0 = view["center"][1] - view_step * (height - 1) / 2
+    offsets = (np.arange(samples) + 0.5) / samples - 0.5
+    xs = ((re0 + (np.arange(width)[:, None] + offsets) * view_step - re_start) / step).ravel()
+    ys = ((im0 + (np.arange(height)[:, None] + offsets) * view_step - im_start) / step).ravel()
+    xs = np.clip(np.rint(xs), 0, values.shape[1] - 1).astype(np.intp)
+    ys = np.clip(np.rint(ys), 0, values.shape[0] - 1).astype(np.intp)
+    # Sous-échantillons rangés en (hauteur, samples, largeur, samples)
+    result = values[ys][:, xs].reshape(height, samples, width, samples)
+    normalized = np.clip(result / (view["max_iter"] + 1), 0, 1) ** view["gamma"]
+    colors = map_smooth_to_color_fixed(normalized, view["colormap"]).astype(np.float32)
+    return (colors.mean(axis=(1, 3)) + 0.5).astype(np.uint8)
+
+
+def _render_frame_job(job):
+    index, level_path, level, view, width, height, output = job
+    image = render_frame(level_path, level, view, width, height)
+    if output is None:
+        return index, image.tobytes()
+    write_png(os.path.join(output, "frame_%05d.png" % index), image)
+    return index, None
+
+
+def render_animation(path, output, workers=None, pipe=None, tile=POSTER_TILE, engine="cpu", log=print):
+    """
+    Calcule l'animation décrite par le chemin 'path' (voir load_path).
+
+    Les images clés (voir plan_levels) sont calculées par tuiles dans un pool de processus,
+    dans des fichiers memmap du répertoire 'output'/levels. Les images de la vidéo en sont
+    ensuite déduites en parallèle et écrites dans l'ordre : fichiers 'output'/frame_NNNNN.png,
+    ou flux RGB brut (rgb24) envoyé sur l'entrée standard de la commande 'pipe', par
+    exemple "ffmpeg -f rawvideo -pix_fmt rgb24 -s 1280x720 -r 30 -i - zoom.mp4".
+    Retourne le nombre d'images par minute obtenu.
+    """
+    fps, (width, height), keyframes = load_path(path)
+    views = frame_views(fps, keyframes)
+    levels = plan_levels(views, width, height)
+    level_dir = os.path.join(output, "levels")
+    os.makedirs(level_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    pool = mp.Pool(workers)
+    encoder = None
+    try:
+        jobs = []
+        for k, level in enumerate(levels):
+            level["path"] = os.path.join(level_dir, "level_%04d.npy" % k)
+            level_width, level_height = level["size"]
+            array = np.lib.format.open_memmap(level["path"], mode="w+", dtype=np.float32,
+                                              shape=(level_height, level_width))
+            del array
+            params = {"grid": level["grid"], "max_iter": level["max_iter"], "engine": engine,
+                      "fractal": level["fractal"]}
+            jobs.extend((level["path"], rect, params) for rect in poster_tiles(level_width, level_height, tile))
+        log("%d images, %d images clés, %d tuiles" % (len(views), len(levels), len(jobs)))
+        # Le moteur GPU calcule les tuiles dans ce processus, l'une après l'autre
+        tiles = map if engine == "gpu" else lambda f, j: pool.imap_unordered(f, j, chunksize=1)
+        for _ in tiles(_compute_level_tile, jobs):
+            pass
+        log("Images clés calculées en %.1f s" % (time.perf_counter() - start))
+
+        if pipe is not None:
+            encoder = subprocess.Popen(shlex.split(pipe), stdin=subprocess.PIPE)
+        frame_jobs = [(index, level["path"], {"grid": level["grid"]}, views[index], width, height,
+                       None if pipe is not None else output)
+                      for level in levels for index in level["frames"]]
+        # imap conserve l'ordre des images, indispensable pour l'encodeur
+        for index, data in pool.imap(_render_frame_job, frame_jobs, chunksize=4):
+            if encoder is not None:
+                encoder.stdin.write(data)
+    finally:
+        pool.terminate()
+        if encoder is not None:
+            encoder.stdin.close()
+            encoder.wait()
+        shutil.rmtree(level_dir, ignore_errors=True)
+
+    per_minute = len(views) / (time.perf_counter() - start) * 60
+    log("%d images en %.1f s (%.0f images/min)" % (len(views), time.perf_counter() - start, per_minute))
+    return per_minute
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rendu hors ligne d'une animation de zoom.")
+    parser.add_argument("path", help="chemin d'animation JSON (images clés)")
+    parser.add_argument("output", help="répertoire des images (et des images clés temporaires)")
+    parser.add_argument("--workers", type=int, default=None, help="processus de calcul (défaut : tous les cœurs)")
+    parser.add_argument("--pipe", default=None,
+                        help="commande d'encodage recevant les images en RGB brut sur son entrée standard")
+    parser.add_argument("--tile", type=int, default=POSTER_TILE)
+    parser.add_argument("--engine", choices=("cpu", "gpu"), default="cpu")
+    args = parser.parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    render_animation(args.path, args.output, args.workers, args.pipe, args.tile, args.engine)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# antialias.py
+import numpy as np
+
+from coloration import map_smooth_to_color_fixed
+
+# Écart de couleur (sur 255, canal le plus différent) avec un voisin au-delà duquel un
+# pixel est considéré comme un pixel de bord et suréchantillonné.
+AA_THRESHOLD = 32
+
+# Sous-échantillons par axe : chaque pixel de bord reçoit d'abord AA_FIRST_GRID ×
+# AA_FIRST_GRID points tirés au hasard dans les cases d'une grille régulière
+# (échantillonnage stratifié) ; ceux dont ces points restent de couleurs différentes en
+# reçoivent AA_GRID × AA_GRID de plus.
+AA_FIRST_GRID = 2
+AA_GRID = 3
+
+# Graine des tirages : une même vue donne toujours la même image (reprise des affiches).
+AA_SEED = 0
+
+
+def _colors(values, max_iter, colormap, gamma):
+    # Même normalisation et même correction gamma que l'affichage interactif
+    normalized = np.clip(values / (max_iter + 1), 0, 1) ** gamma
+    return map_smooth_to_color_fixed(normalized, colormap)
+
+
+def boundary_mask(colors, interior, threshold=AA_THRESHOLD):
+    """
+    Pixels de bord : écart de couleur supérieur à 'threshold' avec l'un des quatre voisins
+    (fort gradient), ou voisin de l'autre côté de la frontière de l'ensemble ('interior').
+    Les deux pixels d'une paire qui diffère sont retenus.
+    """
+    colors = colors.astype(np.int16)
+    edges = np.zeros(interior.shape, dtype=bool)
+    for axis in (0, 1):
+        jump = np.abs(np.diff(colors, axis=axis)).max(axis=-1) > threshold
+        jump |= np.diff(interior, axis=axis)
+        lead = [slice(None), slice(None)]
+        lead[axis] = slice(None, -1)
+        edges[tuple(lead)] |= jump
+        lead[axis] = slice(1, None)
+        edges[tuple(lead)] |= jump
+    return edges
+
+
+def jitter_offsets(count, grid=AA_GRID, rng=None):
+    """
+    Décalages (en pixels, partie réelle : colonnes, imaginaire : lignes) de grid × grid
+    sous-échantillons stratifiés pour 'count' pixels : tableau (grid * grid, count).
+    """
+    rng = np.random.default_rng(AA_SEED) if rng is None else rng
+    cells = (np.arange(grid) + 0.5) / grid - 0.5
+    cell_re, cell_im = np.meshgrid(cells, cells)
+    jitter = rng.uniform(-0.5, 0.5, (2, grid * grid, count)) / grid
+    return (cell_re.reshape(-1, 1) + jitter[0]) + 1j * (cell_im.reshape(-1, 1) + jitter[1])
+
+
+def _sample_colors(state, idx, grid, rng, colormap, gamma):
+    # Tous les sous-échantillons sont calculés en un seul lot : (grid * grid, len(idx), 3)
+    jitter = jitter_offsets(idx.size, grid, rng)
+    values = state.sample(np.tile(idx, grid * grid), jitter.ravel())
+    return _colors(values, state.max_iter, colormap, gamma).reshape(grid * grid, idx.size, 3)
+
+
+def antialias(state, colormap="viridis", gamma=0.5, threshold=AA_THRESHOLD, first_grid=AA_FIRST_GRID,
+              grid=AA_GRID):
+    """
+    Image RGB (uint8) anti-crénelée de la vue calculée par 'state' (FractalStateCPU ou
+    FractalStateGPU), sans recalculer la vue.
+
+    Les pixels de bord (voir boundary_mask) sont suréchantillonnés par des points tirés
+    dans leur surface et calculés par la même formule (state.sample) : first_grid ×
+    first_grid points, puis grid × grid de plus pour ceux dont les premiers diffèrent de
+    plus de 'threshold'. Les couleurs des points, obtenues avec map_smooth_to_color_fixed,
+    sont moyennées ; les autres pixels gardent la couleur de 'result'.
+    Retourne (image, nombre d'échantillons supplémentaires).
+    """
+    result = state.result
+    if hasattr(result, "get"):
+        result = result.get()
+    image = _colors(result, state.max_iter, colormap, gamma)
+    idx = np.flatnonzero(boundary_mask(image, result >= state.max_iter, threshold))
+    if idx.size == 0:
+        return image, 0
+    rng = np.random.default_rng(AA_SEED)
+    colors = _sample_colors(state, idx, first_grid, rng, colormap, gamma).astype(np.int16)
+    total = colors.sum(axis=0, dtype=np.float64)
+    count = np.full(idx.size, first_grid * first_grid)
+    varying = np.flatnonzero((colors.max(axis=0) - colors.min(axis=0)).max(axis=-1) > threshold)
+    if varying.size:
+        total[varying] += _sample_colors(state, idx[varying], grid, rng, colormap, gamma).sum(axis=0)
+        count[varying] += grid * grid
+    flat = image.reshape(-1, 3)
+    flat[idx] = (total / count[:, None] + 0.5).astype(np.uint8)
+    return image, int(count.sum())
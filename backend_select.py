@@ -0,0 +1,284 @@
+# backend_select.py
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmark import _make_state, _timed
+
+# Fichier des mesures des moteurs de calcul, par machine et par classe de charge.
+BACKEND_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                             "fractal-generator", "backends.json")
+
+# Bornes supérieures des classes de résolution (en pixels) et de nombre d'itérations : le
+# moteur le plus rapide est mesuré et retenu séparément pour chaque classe.
+PIXEL_CLASSES = (250_000, 1_000_000, 4_000_000)
+ITER_CLASSES = (256, 1024, 4096)
+
+# Vue mesurée (centre, largeur) : la vue initiale de l'application.
+PROBE_VIEW = ((-0.5, 0.0), 4.0)
+
+# Recalculs complets chronométrés par moteur (le meilleur temps est retenu).
+PROBE_REPEAT = 2
+
+# Priorité (nice) du processus de mesure lancé en arrière-plan par EngineSelector : il ne
+# prend au rendu de l'application que le temps processeur qu'elle n'utilise pas.
+PROBE_NICENESS = 10
+
+
+def available_engines():
+    """
+    Moteurs installés : "cpu" et "mp" (NumPy), "gpu" si CuPy est présent. CuPy n'est pas
+    importé ici : il ne l'est que si le moteur GPU est mesuré ou retenu.
+    """
+    engines = ["cpu", "mp"]
+    if importlib.util.find_spec("cupy") is not None:
+        engines.append("gpu")
+    return engines
+
+
+def _bound(value, limits):
+    for limit in limits:
+        if value <= limit:
+            return "<=%d" % limit
+    return ">%d" % limits[-1]
+
+
+def workload_class(width, height, max_iter):
+    """
+    Classe de charge d'une vue de width × height pixels et max_iter itérations (voir
+    PIXEL_CLASSES et ITER_CLASSES), par exemple "px<=1000000/it<=256".
+    """
+    return "px%s/it%s" % (_bound(width * height, PIXEL_CLASSES), _bound(max_iter, ITER_CLASSES))
+
+
+def machine_fingerprint():
+    """
+    Ce dont dépendent les mesures : quand il change, les mesures conservées sont refaites.
+    """
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count(), "engines": available_engines()}
+
+
+def probe_engines(engines, width, height, max_iter, repeat=PROBE_REPEAT, log=print):
+    """
+    Mesure chaque moteur de 'engines' sur la vue PROBE_VIEW en width × height pixels et
+    max_iter itérations : meilleur temps d'un recalcul complet, une fois l'état créé (pool
+    de processus démarré, noyaux GPU compilés). Retourne {moteur: secondes}, None pour un
+    moteur qui n'a pas pu être créé ou mesuré.
+    """
+    times = {}
+    for engine in engines:
+        state = None
+        try:
+            state = _make_state(engine, "Mandelbrot", width, height, max_iter, *PROBE_VIEW)
+            times[engine] = _timed(state, state.full_recompute, repeat)
+        except Exception as exc:
+            # CuPy peut être installé sans GPU utilisable : le moteur est seulement écarté
+            log("Moteur %s indisponible : %s" % (engine, exc))
+            times[engine] = None
+            continue
+        finally:
+            if hasattr(state, "close"):
+                state.close()
+        log("Moteur %-3s : %.1f ms" % (engine, times[engine] * 1e3))
+    return times
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(path, data):
+    # Écriture atomique : deux lancements simultanés ne laissent jamais un fichier tronqué
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _measurements(cache_path):
+    # Mesures conservées, ou aucune si elles ont été faites sur une autre machine
+    cache = _load(cache_path)
+    fingerprint = machine_fingerprint()
+    if cache.get("fingerprint") != fingerprint:
+        cache = {"fingerprint": fingerprint, "classes": {}}
+    return cache
+
+
+def _fastest(engines, times):
+    measured = [engine for engine in engines if times.get(engine) is not None]
+    if not measured:
+        return "cpu"
+    return min(measured, key=times.get)
+
+
+def default_engine(engines):
+    """
+    Moteur retenu tant que la classe de charge n'est pas mesurée : le pool de processus
+    s'il y a plusieurs cœurs, sinon le moteur mono-processus (le GPU peut être installé
+    sans être utilisable).
+    """
+    if "mp" in engines and (os.cpu_count() or 1) > 1:
+        return "mp"
+    return "cpu" if "cpu" in engines else engines[0]
+
+
+def measured_engine(width, height, max_iter, engines=None, cache_path=BACKEND_CACHE):
+    """
+    Plus rapide des moteurs 'engines' pour la classe de charge de la vue d'après les seules
+    mesures conservées dans 'cache_path', ou None si l'un d'eux n'y a pas encore été mesuré.
+    """
+    engines = list(engines if engines is not None else available_engines())
+    if len(engines) == 1:
+        return engines[0]
+    times = _measurements(cache_path)["classes"].get(workload_class(width, height, max_iter), {})
+    if any(engine not in times for engine in engines):
+        return None
+    return _fastest(engines, times)
+
+
+def choose_engine(width, height, max_iter, engines=None, cache_path=BACKEND_CACHE, log=print):
+    """
+    Retourne le plus rapide des moteurs 'engines' (par défaut ceux installés, voir
+    available_engines) pour la classe de charge de la vue (voir workload_class).
+
+    Les moteurs ne sont mesurés (voir probe_engines) qu'une fois par classe : les temps sont
+    conservés dans 'cache_path' et ne sont refaits que si la machine ou les versions
+    changent (voir machine_fingerprint). Seuls les moteurs pas encore mesurés pour la
+    classe le sont ; avec un seul moteur, rien n'est mesuré. La mesure bloque : pour ne
+    pas l'attendre, voir EngineSelector.
+    """
+    engines = list(engines if engines is not None else available_engines())
+    if len(engines) == 1:
+        return engines[0]
+    cache = _measurements(cache_path)
+    key = workload_class(width, height, max_iter)
+    times = cache["classes"].setdefault(key, {})
+    missing = [engine for engine in engines if engine not in times]
+    if missing:
+        log("Mesure des moteurs de calcul (%s), une seule fois pour cette machine" % key)
+        times.update(probe_engines(missing, width, height, max_iter, log=log))
+        try:
+            _save(cache_path, cache)
+        except OSError as exc:
+            log("Mesures non enregistrées : %s" % exc)
+    return _fastest(engines, times)
+
+
+def probe_in_background(width, height, max_iter, engines, cache_path=BACKEND_CACHE):
+    """
+    Lance la mesure des moteurs 'engines' pour la classe de charge de la vue dans un
+    processus séparé, de priorité réduite (voir PROBE_NICENESS), qui enregistre ses temps
+    dans 'cache_path' (voir main). Retourne le subprocess.Popen du processus.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--size", str(width), str(height),
+               "--max-iter", str(max_iter), "--engines", *engines, "--cache", cache_path]
+    lower_priority = (lambda: os.nice(PROBE_NICENESS)) if hasattr(os, "nice") else None
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            preexec_fn=lower_priority)
+
+
+class EngineSelector:
+    """
+    Choix du moteur au fil d'une session, sans jamais attendre de mesure.
+
+    engine(max_iter) retourne le moteur mesuré le plus rapide pour la classe de charge de la
+    vue (voir workload_class) ; tant que la classe n'est pas mesurée, il retourne
+    default_engine et la fait mesurer en arrière-plan (voir probe_in_background), une
+    classe à la fois, si bien que le choix peut changer lors d'un appel suivant. Le
+    fichier des mesures n'est relu qu'au changement de classe ou à la fin d'une mesure.
+
+    engine(max_iter, deep=True) écarte le GPU, qui n'a pas de mode perturbation : une vue
+    de zoom profond va au plus rapide des moteurs CPU.
+    """
+
+    def __init__(self, width, height, engines=None, cache_path=BACKEND_CACHE):
+        self.width = width
+        self.height = height
+        self.engines = list(engines if engines is not None else available_engines())
+        self.default = default_engine(self.engines)
+        self.cache_path = cache_path
+        self._choices = {}
+        self._cpu_choices = {}
+        self._probed = set()
+        self._probe = None
+
+    def engine(self, max_iter, deep=False):
+        """
+        Moteur à utiliser pour une vue de max_iter itérations, 'deep' si elle demande le
+        mode perturbation (voir la docstring de la classe).
+        """
+        engine = self._choice(max_iter)
+        if deep and engine == "gpu":
+            return self._cpu_engine(max_iter)
+        return engine
+
+    def _cpu_engine(self, max_iter):
+        # Le GPU n'est retenu que pour une classe mesurée : les moteurs CPU l'ont été avec lui
+        key = workload_class(self.width, self.height, max_iter)
+        if key not in self._cpu_choices:
+            engines = [engine for engine in self.engines if engine != "gpu"]
+            self._cpu_choices[key] = (measured_engine(self.width, self.height, max_iter, engines, self.cache_path)
+                                      or default_engine(engines))
+        return self._cpu_choices[key]
+
+    def _choice(self, max_iter):
+        key = workload_class(self.width, self.height, max_iter)
+        if self._probe is not None and self._probe.poll() is not None:
+            self._probe = None
+        if key in self._choices:
+            return self._choices[key]
+        if self._probe is not None:
+            return self.default
+        engine = measured_engine(self.width, self.height, max_iter, self.engines, self.cache_path)
+        if engine is None and key not in self._probed:
+            self._probed.add(key)
+            self._probe = probe_in_background(self.width, self.height, max_iter, self.engines, self.cache_path)
+            return self.default
+        # Mesure terminée, ou échouée : la classe n'est plus remesurée pendant la session
+        self._choices[key] = self.default if engine is None else engine
+        return self._choices[key]
+
+    def close(self):
+        """
+        Interrompt la mesure en cours ; la classe sera mesurée au prochain lancement.
+        """
+        if self._probe is not None:
+            self._probe.terminate()
+            self._probe.wait()
+            self._probe = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure des moteurs de calcul et choix du plus rapide.")
+    parser.add_argument("--size", type=int, nargs=2, default=(1100, 600), metavar=("LARGEUR", "HAUTEUR"))
+    parser.add_argument("--max-iter", type=int, default=100)
+    parser.add_argument("--engines", nargs="+", choices=("cpu", "mp", "gpu"), default=None,
+                        help="moteurs à comparer (défaut : installés)")
+    parser.add_argument("--cache", default=BACKEND_CACHE, help="fichier des mesures")
+    parser.add_argument("--force", action="store_true", help="refait les mesures de la classe")
+    args = parser.parse_args(argv)
+
+    width, height = args.size
+    if args.force:
+        cache = _load(args.cache)
+        if cache.get("classes", {}).pop(workload_class(width, height, args.max_iter), None) is not None:
+            _save(args.cache, cache)
+    engine = choose_engine(width, height, args.max_iter, args.engines, args.cache)
+    print("Moteur retenu pour %s : %s" % (workload_class(width, height, args.max_iter), engine))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# benchmark.py
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from coloration import map_smooth_to_color_fixed, quantize
+from precision import PRECISION_POLICIES
+
+# Vues de référence : (nom, centre, largeur de vue, max_iter, formule).
+CORPUS = [
+    ("full", (-0.75, 0.0), 3.5, 500, "Mandelbrot"),
+    ("seahorse", (-0.7453, 0.1127), 0.01, 1000, "Mandelbrot"),
+    # Intérieur de la mini-Mandelbrot de période 3 : presque tous les pixels sont intérieurs
+    ("deep_interior", (-1.7548776662466927, 0.0), 1e-9, 2000, "Mandelbrot"),
+    ("deep_boundary", (-0.743643887037151, 0.131825904205330), 1e-9, 3000, "Mandelbrot"),
+]
+
+# Vue utilisée pour chaque formule des boutons de l'interface.
+FORMULA_VIEW = ((0.0, 0.0), 4.0, 300)
+
+# Sens de chaque mesure : +1 si une valeur plus grande est meilleure, -1 sinon.
+METRICS = {"full_ms": -1, "mpixel_s": 1, "iter_s": 1, "add_iter_ms": -1, "pan_ms": -1,
+           "colorize_ms": -1, "peak_mb": -1, "bytes_px": -1}
+
+# Dégradation relative au-delà de laquelle une mesure est signalée comme régression.
+REGRESSION_THRESHOLD = 0.10
+
+# Écart absolu (ms) en dessous duquel une durée n'est pas comparée : sur des mesures de
+# l'ordre de la milliseconde, la gigue de l'ordonnanceur dépasse à elle seule le seuil relatif.
+NOISE_FLOOR_MS = 0.5
+
+
+def formula_cases():
+    """
+    Une vue par formule de TOP_BUTTONS.
+    """
+    from ui import TOP_BUTTONS
+    center, span, max_iter = FORMULA_VIEW
+    return [("formula_" + button["label"].replace(" ", "_"), center, span, max_iter, button["label"])
+            for button in TOP_BUTTONS]
+
+
+def _make_state(backend, fractal, width, height, max_iter, center, span, precision="auto"):
+    span_im = span * (height - 1) / (width - 1)
+    bounds = (center[0] - span / 2, center[0] + span / 2, center[1] - span_im / 2, center[1] + span_im / 2)
+    if backend == "gpu":
+        from fractal_state_gpu import FractalStateGPU
+        return FractalStateGPU(width, height, max_iter, *bounds, fractal_type=fractal, precision=precision)
+    if backend == "mp":
+        from fractal_state_mp import FractalStateMP
+        return FractalStateMP(width, height, max_iter, *bounds, precision=precision, fractal_type=fractal)
+    from fractal_state_cpu import FractalStateCPU
+    return FractalStateCPU(width, height, max_iter, *bounds, precision=precision, fractal_type=fractal)
+
+
+def _host(array):
+    return array.get() if hasattr(array, "get") else array
+
+
+def _timed(state, action, repeat):
+    """
+    Meilleur temps (en secondes) de 'action' sur 'repeat' essais ; sur le GPU, le temps
+    inclut la fin des calculs en file.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        action()
+        if hasattr(state.result, "get"):
+            import cupy as cp
+            cp.cuda.Stream.null.synchronize()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _timed_fresh(make_state, action, repeat):
+    """
+    Meilleur temps de action(état) sur 'repeat' essais, chacun sur un état neuf créé par
+    make_state() hors chronométrage : les mesures qui modifient l'état (ajout
+    d'itérations, translation) partent ainsi toutes de la même vue.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        state = make_state()
+        try:
+            best = min(best, _timed(state, lambda: action(state), 1))
+        finally:
+            if hasattr(state, "close"):
+                state.close()
+    return best
+
+
+def state_bytes(state):
+    """
+    Mémoire occupée par les tableaux de l'état (grilles, résultat, masque, orbites actives,
+    mémoire partagée...), sur l'hôte ou sur le GPU.
+    """
+    return sum(value.nbytes for value in vars(state).values()
+               if isinstance(getattr(value, "nbytes", None), int))
+
+
+def pixel_iterations(result, max_iter):
+    """
+    Nombre d'itérations représentées par 'result' : l'itération d'échappement de chaque
+    pixel, max_iter pour les pixels qui ne s'échappent pas. Les pixels écartés tôt par la
+    détection d'intérieur comptent pour max_iter : c'est un débit effectif.
+    """
+    escaped = result < max_iter
+    return float(np.ceil(result[escaped]).sum() + max_iter * (~escaped).sum())
+
+
+def run_case(backend, case, width, height, repeat, precision="auto"):
+    """
+    Mesure une vue de référence sur un backend. Toutes les durées sont le meilleur de
+    'repeat' essais ; l'ajout d'itérations et la translation partent chacun d'un état neuf.
+
+    'peak_mb' est le pic des allocations Python et NumPy du processus pendant un recalcul
+    complet (tracemalloc) : il n'est mesuré que pour "cpu" (None sinon), tracemalloc ne
+    voyant ni les processus de travail et la mémoire partagée de "mp", ni la mémoire du
+    GPU. 'bytes_px' compte pour tous les backends les tableaux de l'état, y compris
+    partagés ou sur le GPU (voir state_bytes).
+    """
+    name, center, span, max_iter, fractal = case
+
+    def make_state():
+        return _make_state(backend, fractal, width, height, max_iter, center, span, precision)
+
+    state = make_state()
+    try:
+        tracemalloc.start()
+        full = _timed(state, state.full_recompute, repeat)
+        peak = tracemalloc.get_traced_memory()[1] if backend == "cpu" else None
+        tracemalloc.stop()
+        result = _host(state.result)
+        iterations = pixel_iterations(result, max_iter)
+        bytes_px = state_bytes(state) / (width * height)
+
+        normalized = np.clip(result / (max_iter + 1), 0, 1) ** 0.5
+        colorize = _timed(state, lambda: map_smooth_to_color_fixed(normalized, "viridis"), repeat)
+        indices = np.empty(result.shape, dtype=np.uint16)
+        scratch = np.empty(result.shape, dtype=np.float32)
+        quantize_time = _timed(state, lambda: quantize(result, max_iter, indices, scratch), repeat)
+    finally:
+        if hasattr(state, "close"):
+            state.close()
+    add_iter = _timed_fresh(make_state, lambda s: s.update_add_iterations(max_iter + max_iter // 2), repeat)
+    pan = _timed_fresh(make_state, lambda s: s.apply_translation(width // 16, height // 16), repeat)
+    return {"full_ms": full * 1e3, "mpixel_s": width * height / full / 1e6, "iter_s": iterations / full,
+            "add_iter_ms": add_iter * 1e3, "pan_ms": pan * 1e3, "colorize_ms": colorize * 1e3,
+            "quantize_ms": quantize_time * 1e3, "peak_mb": None if peak is None else peak / 2**20,
+            "bytes_px": bytes_px}
+
+
+def available_backends():
+    backends = ["cpu", "mp"]
+    try:
+        import cupy  # noqa: F401
+        backends.append("gpu")
+    except ImportError:
+        pass
+    return backends
+
+
+def run_suite(backends, width, height, repeat, cases=None, precision="auto", log=print):
+    """
+    Exécute le corpus (vues de référence puis formules) sur chaque backend, avec la
+    politique de précision 'precision' (voir precision.complex_dtype).
+    """
+    cases = cases if cases is not None else CORPUS + formula_cases()
+    results = {}
+    for backend in backends:
+        for case in cases:
+            measures = run_case(backend, case, width, height, repeat, precision)
+            key = "%s/%s" % (backend, case[0])
+            results[key] = measures
+            peak = "-" if measures["peak_mb"] is None else "%.1f" % measures["peak_mb"]
+            log("%-32s %8.1f ms %7.2f Mpix/s %9.3g it/s  +iter %7.1f ms  pan %6.1f ms  "
+                "couleur %5.1f ms  pic %6s Mo  %5.1f o/pixel" % (key, measures["full_ms"], measures["mpixel_s"],
+                                                                 measures["iter_s"], measures["add_iter_ms"],
+                                                                 measures["pan_ms"], measures["colorize_ms"],
+                                                                 peak, measures["bytes_px"]))
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare les mesures à celles d'une exécution de référence. Retourne la liste des
+    régressions (clé, mesure, référence, valeur) au-delà du seuil relatif 'threshold'.
+    Les mesures absentes (None) d'un côté ou de l'autre ne sont pas comparées, ni les
+    durées qui varient de moins de NOISE_FLOOR_MS.
+    """
+    regressions = []
+    for key, measures in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric, sign in METRICS.items():
+            if not reference.get(metric) or measures.get(metric) is None:
+                continue
+            if metric.endswith("_ms") and abs(measures[metric] - reference[metric]) < NOISE_FLOOR_MS:
+                continue
+            change = (measures[metric] - reference[metric]) / reference[metric] * sign
+            if change < -threshold:
+                regressions.append((key, metric, reference[metric], measures[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai des moteurs de calcul et de la coloration.")
+    parser.add_argument("--backends", nargs="+", default=None, help="cpu, mp, gpu (défaut : disponibles)")
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600), metavar=("LARGEUR", "HAUTEUR"))
+    parser.add_argument("--repeat", type=int, default=3, help="essais par mesure (le meilleur est gardé)")
+    parser.add_argument("--cases", nargs="+", default=None, help="noms des vues à mesurer")
+    parser.add_argument("--output", default=None, help="fichier JSON des résultats")
+    parser.add_argument("--baseline", default=None, help="fichier JSON d'une exécution de référence")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--precision", choices=PRECISION_POLICIES, default="auto")
+    args = parser.parse_args(argv)
+
+    cases = CORPUS + formula_cases()
+    if args.cases:
+        cases = [case for case in cases if case[0] in args.cases]
+    width, height = args.size
+    results = run_suite(args.backends or available_backends(), width, height, args.repeat, cases,
+                        args.precision)
+    report = {"meta": {"size": [width, height], "repeat": args.repeat, "precision": args.precision,
+                       "python": platform.python_version(), "numpy": np.__version__,
+                       "machine": platform.machine(), "cpus": os.cpu_count()},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for key, metric, reference, value in regressions:
+            print("Régression %s %s : %.4g -> %.4g" % (key, metric, reference, value))
+        if regressions:
+            return 1
+        print("Aucune régression au-delà de %.0f %%" % (args.threshold * 100))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# checkpoint.py
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+# Signature (et version) du format des points de reprise.
+CHECKPOINT_MAGIC = b"FRACKPT1"
+
+# Alignement (en octets) du début de l'en-tête de données et de chaque tableau : les
+# tableaux sont projetés en mémoire directement depuis le fichier (voir read_checkpoint).
+CHECKPOINT_ALIGN = 64
+
+# Intervalle minimal (en secondes) entre deux points de reprise d'un même état.
+CHECKPOINT_INTERVAL = 5.0
+
+
+def _aligned(size):
+    return -(-size // CHECKPOINT_ALIGN) * CHECKPOINT_ALIGN
+
+
+def write_checkpoint(path, meta, arrays):
+    """
+    Écrit un point de reprise : la signature, la longueur de l'en-tête, l'en-tête JSON
+    ('meta' et position, type et forme de chaque tableau), puis les octets bruts des
+    tableaux de 'arrays', chacun aligné sur CHECKPOINT_ALIGN.
+
+    L'écriture est atomique : le fichier est écrit à côté puis renommé, si bien que 'path'
+    contient toujours un point de reprise complet, même si le processus est tué pendant
+    l'écriture. Les projections d'un point de reprise précédent restent valides.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += _aligned(array.nbytes)
+    header = json.dumps({"meta": meta, "arrays": layout}).encode()
+    base = _aligned(len(CHECKPOINT_MAGIC) + 8 + len(header))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(CHECKPOINT_MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(base + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).data)
+        f.truncate(base + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path, mode="c"):
+    """
+    Rattache le point de reprise 'path' sans copier ses tableaux : retourne (meta, arrays)
+    où chaque tableau est un np.memmap du fichier. Avec mode="c" (copie à l'écriture), les
+    tableaux sont modifiables en place sans que le fichier change ; seules les pages
+    modifiées sont recopiées en mémoire. Lève ValueError si le fichier n'est pas un point
+    de reprise.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(CHECKPOINT_MAGIC))
+        size = f.read(8)
+        if magic != CHECKPOINT_MAGIC or len(size) != 8:
+            raise ValueError("point de reprise invalide : %r" % (path,))
+        (length,) = struct.unpack("<Q", size)
+        header = json.loads(f.read(length))
+    base = _aligned(len(CHECKPOINT_MAGIC) + 8 + length)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype, shape = np.dtype(entry["dtype"]), tuple(entry["shape"])
+        if int(np.prod(shape)) == 0:
+            # Un tableau vide ne peut pas être projeté
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode=mode, offset=base + entry["offset"], shape=shape)
+    return header["meta"], arrays
+
+
+def bound_params(pairs):
+    """
+    Paramètres liés d'une formule à partir de leur forme sérialisée (voir
+    formulas.Formula.cache_key).
+    """
+    return {name: complex(re, im) for name, re, im in pairs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rendu sans fenêtre avec point de reprise : relancée avec le même fichier, la commande "
+                    "reprend le calcul là où il s'était arrêté.")
+    parser.add_argument("checkpoint", help="fichier du point de reprise")
+    parser.add_argument("--size", type=int, nargs=2, default=(1100, 600), metavar=("LARGEUR", "HAUTEUR"))
+    parser.add_argument("--center", type=float, nargs=2, default=(-0.75, 0.0), metavar=("RE", "IM"))
+    parser.add_argument("--span", type=float, default=3.5, help="largeur de la vue dans le plan complexe")
+    parser.add_argument("--max-iter", type=int, default=2000)
+    parser.add_argument("--fractal", default="Mandelbrot", help="formule (voir formulas.FORMULAS)")
+    parser.add_argument("--interval", type=float, default=CHECKPOINT_INTERVAL,
+                        help="secondes entre deux points de reprise")
+    args = parser.parse_args(argv)
+
+    from fractal_state_cpu import FractalStateCPU
+    width, height = args.size
+    span_im = args.span * (height - 1) / (width - 1)
+    start = time.perf_counter()
+    # Un point de reprise existant l'emporte sur la vue demandée (voir FractalStateCPU)
+    state = FractalStateCPU(width, height, args.max_iter, args.center[0] - args.span / 2,
+                            args.center[0] + args.span / 2, args.center[1] - span_im / 2,
+                            args.center[1] + span_im / 2, fractal_type=args.fractal,
+                            checkpoint=args.checkpoint, checkpoint_interval=args.interval)
+    if state.resumed:
+        print("Reprise de %s : %s, %d itérations" % (args.checkpoint, state.fractal_type, state.max_iter))
+    if state.max_iter < args.max_iter:
+        state.update_add_iterations(args.max_iter)
+    state.close()
+    print("Terminé en %.2f s : %d pixels encore actifs" % (time.perf_counter() - start, state.active_idx.size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
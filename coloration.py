@@ -1,15 +1,64 @@
 # coloration.py
 import numpy as np
-import matplotlib.pyplot as plt
+
+from colormap_tables import COLORMAP_TABLES
+
+# Nombre d'entrées des tables de couleurs (LUT) : assez pour que la quantification de la
+# valeur smooth reste invisible à l'écran.
+LUT_SIZE = 4096
+
+# Tables déjà calculées, par couple (colormap, gamma).
+_LUT_CACHE = {}
+
+
+def colormap_lut(colormap_name="viridis", gamma=1.0):
+    """
+    Retourne la table (LUT_SIZE, 3) en uint8 du colormap, correction gamma incluse :
+    l'entrée k correspond à la valeur normalisée k / (LUT_SIZE - 1) élevée à la puissance gamma.
+    Les tables sont mises en cache ; elles ne doivent pas être modifiées.
+
+    Les palettes de colormap_tables sont lues dans leurs tables embarquées, avec le même
+    choix de couleur que matplotlib ; matplotlib n'est importé que pour les autres.
+    """
+    key = (colormap_name, gamma)
+    lut = _LUT_CACHE.get(key)
+    if lut is None:
+        x = np.linspace(0.0, 1.0, LUT_SIZE) ** gamma
+        table = COLORMAP_TABLES.get(colormap_name)
+        if table is not None:
+            colors = np.frombuffer(bytes.fromhex("".join(table)), dtype=np.uint8).reshape(-1, 3)
+            # Comme un ListedColormap : la couleur d'indice floor(x * N), bornée à N - 1
+            lut = colors[np.minimum((x * len(colors)).astype(np.intp), len(colors) - 1)]
+        else:
+            import matplotlib
+            lut = (matplotlib.colormaps[colormap_name](x)[:, :3] * 255).astype(np.uint8)
+        _LUT_CACHE[key] = lut
+    return lut
+
+
+def quantize(result, max_iter, out=None, scratch=None):
+    """
+    Convertit 'result' (valeurs smooth) en indices de LUT (uint16), avec la même
+    normalisation que l'affichage : result / (max_iter + 1), bornée à [0, 1].
+    'out' et 'scratch' (float32) permettent de réutiliser des tampons de la taille de 'result'.
+    """
+    if scratch is None:
+        scratch = np.empty(result.shape, dtype=np.float32)
+    if out is None:
+        out = np.empty(result.shape, dtype=np.uint16)
+    np.multiply(result, (LUT_SIZE - 1) / (max_iter + 1), out=scratch)
+    np.clip(scratch, 0, LUT_SIZE - 1, out=scratch)
+    np.copyto(out, scratch, casting="unsafe")
+    return out
+
 
 def map_smooth_to_color_fixed(normalized_array, colormap_name="viridis"):
     """
     Applique un colormap à un tableau 2D de valeurs normalisées (dans [0,1]).
     On suppose que 0 correspond à du noir.
-    
+
     Retourne un tableau 3D (hauteur, largeur, 3) en uint8.
     """
-    cmap = plt.get_cmap(colormap_name)
-    colored = cmap(normalized_array)  # Tableau de forme (H, W, 4) avec des valeurs dans [0,1]
-    image_rgb = (colored[:, :, :3] * 255).astype(np.uint8)
-    return image_rgb
+    lut = colormap_lut(colormap_name)
+    indices = (np.clip(normalized_array, 0, 1) * (LUT_SIZE - 1)).astype(np.intp)
+    return lut[indices]
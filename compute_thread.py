@@ -0,0 +1,270 @@
+# compute_thread.py
+import threading
+
+import numpy as np
+
+from escape_histogram import escape_histogram, next_max_iter
+from instrumentation import PROFILER
+
+# Durée (en millisecondes) d'un paquet de rendu progressif : entre deux paquets, le thread
+# de calcul vérifie si une nouvelle requête est arrivée.
+SLICE_MS = 20
+
+
+class Frame:
+    """
+    Image publiée par le thread de calcul. Elle expose 'result' et 'max_iter' comme un
+    état de fractale, ce qui permet de la passer directement à display_fractal.
+    """
+
+    def __init__(self, result, max_iter, generation):
+        self.result = result
+        self.max_iter = max_iter
+        self.generation = generation
+        self._histogram = None
+
+    def escape_histogram(self):
+        """
+        Histogramme des itérations d'échappement de l'image (voir
+        escape_histogram.escape_histogram), calculé à la première demande.
+        """
+        if self._histogram is None:
+            self._histogram = escape_histogram(self.result, self.max_iter)
+        return self._histogram
+
+
+def _merge(method, previous, args):
+    """
+    Fusionne deux requêtes consécutives de même type : les translations s'additionnent,
+    les zooms se composent, sinon la plus récente l'emporte.
+    """
+    if method == "apply_translation":
+        return previous[0] + args[0], previous[1] + args[1]
+    if method == "zoom_center":
+        return previous[0] * args[0], args[1]
+    return args
+
+
+class ComputeWorker:
+    """
+    Exécute les calculs d'un état de fractale (CPU, multi-cœurs ou GPU) dans un thread dédié.
+
+    La boucle pygame ne touche plus à l'état : elle soumet des requêtes (mêmes noms que les
+    méthodes de l'état) qui sont mises en file et fusionnées avec la précédente lorsqu'elles
+    sont de même type, si bien qu'un glissement de curseur ne laisse qu'un seul recalcul en
+    attente. Chaque requête incrémente 'generation' ; l'affinage (refine) et les passes du
+    rendu progressif d'une génération dépassée ne sont pas publiés.
+
+    En mode itérations automatiques (set_auto_iter), une fois la vue terminée, le calcul des
+    pixels encore actifs est prolongé par paquets tant que l'histogramme des échappements
+    montre que des pixels changent encore (voir escape_histogram.next_max_iter) ; chaque
+    paquet est publié et peut être interrompu par une nouvelle requête.
+
+    Le résultat est publié dans deux tampons alternés : 'frame' désigne toujours une image
+    complète, que le thread principal lit sans verrou entre acquire() et release().
+    """
+
+    def __init__(self, state, slice_ms=SLICE_MS):
+        self.state = state
+        self.slice_ms = slice_ms
+        self.max_iter = state.max_iter
+        self.generation = 0
+        self.error = None
+        self.auto_iter = False
+        self._extend_pending = False
+        self._requests = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._buffers = [np.empty(state.result.shape, dtype=state.result.dtype),
+                         np.empty(state.result.shape, dtype=state.result.dtype)]
+        self._reading = None
+        self.frame = None
+        self._publish(0)
+        self._thread = threading.Thread(target=self._run, name="fractal-compute", daemon=True)
+        self._thread.start()
+
+    # --- Côté boucle pygame ---------------------------------------------------------
+
+    def submit(self, method, *args, **attrs):
+        """
+        Met en file l'appel state.<method>(*args), précédé de l'affectation des attributs
+        'attrs' sur l'état (par exemple fractal_type).
+        """
+        with self._cond:
+            if self._requests and self._requests[-1][0] == method:
+                _, previous, previous_attrs = self._requests[-1]
+                self._requests[-1] = (method, _merge(method, previous, args), {**previous_attrs, **attrs})
+            else:
+                self._requests.append((method, args, attrs))
+            self.generation += 1
+            self._cond.notify()
+
+    def full_recompute(self, **attrs):
+        self.submit("full_recompute", **attrs)
+
+    def apply_translation(self, dx, dy):
+        self.submit("apply_translation", dx, dy)
+
+    def zoom_center(self, factor, new_max_iter):
+        self.max_iter = new_max_iter
+        self.submit("zoom_center", factor, new_max_iter)
+
+    def set_max_iter(self, new_max_iter):
+        """
+        Change le nombre d'itérations sans modifier le domaine (voir update_zoom).
+        """
+        self.max_iter = new_max_iter
+        self.submit("set_max_iter", new_max_iter)
+
+    def reset_view(self, **attrs):
+        self.submit("reset_view", **attrs)
+
+    def replace_state(self, factory):
+        """
+        Remplace l'état par factory(état courant), appelé dans le thread de calcul ; si
+        factory retourne None, l'état est conservé. L'ancien état est fermé.
+        """
+        self.submit("replace_state", factory)
+
+    def set_auto_iter(self, enabled):
+        """
+        Active ou désactive le mode itérations automatiques (voir la docstring de la classe).
+        """
+        with self._cond:
+            self.auto_iter = enabled
+            self._extend_pending = enabled
+            self._cond.notify()
+
+    def acquire(self):
+        """
+        Retourne l'image la plus récente ; son tampon ne sera pas réécrit avant release().
+        """
+        # Lecture et marquage sous le verrou : _publish ne peut pas choisir ce tampon entre les deux
+        with self._cond:
+            frame = self.frame
+            self._reading = frame.result
+        return frame
+
+    def release(self):
+        with self._cond:
+            self._reading = None
+            self._cond.notify_all()
+
+    def check(self):
+        """
+        Relance dans le thread principal une exception survenue dans le thread de calcul.
+        """
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        """
+        Arrête le thread de calcul après la requête ou le paquet en cours.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    # --- Côté thread de calcul ------------------------------------------------------
+
+    def _busy(self):
+        return (getattr(self.state, "refine_pending", False) or getattr(self.state, "progressive_pending", False)
+                or self._extend_pending)
+
+    def _extend(self, generation):
+        """
+        Prolonge d'un paquet les itérations de la vue terminée, si son histogramme le justifie.
+        """
+        frame = self.frame
+        active = int(self.state.mask.sum())
+        new_max_iter = next_max_iter(frame.escape_histogram(), active, frame.result.size)
+        if new_max_iter is None:
+            self._extend_pending = False
+            return
+        with PROFILER.span("state.auto_iter"):
+            self.state.update_add_iterations(new_max_iter)
+        # Un recalcul complet (changement de précision, voir update_add_iterations) n'a fait
+        # que planifier les passes du rendu progressif : elles sont publiées par advance()
+        if getattr(self.state, "progressive_pending", False):
+            return
+        self._publish(generation, stale_check=True)
+
+    def _apply(self, method, args, attrs):
+        state = self.state
+        for name, value in attrs.items():
+            setattr(state, name, value)
+        with PROFILER.span("state." + method):
+            if method == "replace_state":
+                self._replace(*args)
+            elif method == "set_max_iter":
+                state.update_zoom(state.re_start, state.re_end, state.im_start, state.im_end, *args)
+            else:
+                getattr(state, method)(*args)
+
+    def _replace(self, factory):
+        state = factory(self.state)
+        if state is None:
+            return
+        previous, self.state = self.state, state
+        if hasattr(previous, "close"):
+            previous.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._requests or self._busy() or self._closed):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                requests, self._requests = self._requests, []
+                generation = self.generation
+            try:
+                if requests:
+                    for request in requests:
+                        self._apply(*request)
+                    self._extend_pending = self.auto_iter
+                    # La vue issue des requêtes est toujours publiée, même si d'autres
+                    # requêtes sont arrivées entre-temps : l'affichage suit ainsi un zoom continu.
+                    self._publish(generation)
+                elif getattr(self.state, "refine_pending", False):
+                    with PROFILER.span("state.refine"):
+                        self.state.refine()
+                    self._publish(generation, stale_check=True)
+                elif getattr(self.state, "progressive_pending", False):
+                    with PROFILER.span("state.advance"):
+                        updated = self.state.advance(self.slice_ms)
+                    if updated:
+                        self._publish(generation, stale_check=True)
+                else:
+                    self._extend(generation)
+            except Exception as exc:
+                self.error = exc
+                with self._cond:
+                    self._requests = []
+                    while not (self._requests or self._closed):
+                        self._cond.wait()
+
+    def _publish(self, generation, stale_check=False):
+        """
+        Recopie state.result dans le tampon qui n'est pas affiché puis l'expose via 'frame'.
+        Avec stale_check, le résultat est abandonné si une requête plus récente est arrivée.
+        """
+        if stale_check and generation != self.generation:
+            return
+        back = self._buffers[1] if self.frame is not None and self.frame.result is self._buffers[0] \
+            else self._buffers[0]
+        # Le thread principal peut encore lire l'image précédente dans ce tampon
+        with self._cond:
+            while self._reading is back:
+                self._cond.wait()
+        result = self.state.result
+        with PROFILER.span("publish"):
+            if isinstance(result, np.ndarray):
+                np.copyto(back, result)
+            else:
+                result.get(out=back)
+        if not self._requests:
+            self.max_iter = self.state.max_iter
+        self.frame = Frame(back, self.state.max_iter, generation)
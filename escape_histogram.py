@@ -0,0 +1,67 @@
+# escape_histogram.py
+import numpy as np
+
+# Fenêtre (en itérations) sur laquelle le taux d'échappement est mesuré, et pas minimal
+# d'augmentation du budget d'itérations en mode automatique.
+AUTO_ITER_WINDOW = 32
+
+# Taux d'échappement (fraction des pixels de la vue par itération) en dessous duquel de
+# nouvelles itérations ne changent plus l'image de façon visible : sur une vue de
+# 1100×600 pixels et une fenêtre de 32 itérations, une vingtaine de pixels.
+AUTO_ITER_RATE = 1e-6
+
+# Bornes du budget d'itérations automatique.
+AUTO_ITER_MIN = 50
+AUTO_ITER_MAX = 10000
+
+
+def escape_histogram(result, max_iter):
+    """
+    Nombre de pixels échappés à chaque itération, d'après les valeurs smooth de 'result' :
+    l'élément n compte les pixels échappés à l'itération n (1 à max_iter), l'élément 0 est
+    toujours nul. La valeur smooth d'un pixel reste à moins d'une itération de son
+    itération d'échappement, ce qui suffit à la coloration par histogramme et au réglage
+    du nombre d'itérations.
+    """
+    escaped = result[result < max_iter]
+    bins = np.clip(np.ceil(escaped), 1, max_iter).astype(np.intp)
+    return np.bincount(bins, minlength=max_iter + 1)[:max_iter + 1]
+
+
+def _threshold(pixels, window, rate):
+    return rate * window * pixels
+
+
+def next_max_iter(hist, active, pixels, limit=AUTO_ITER_MAX, window=AUTO_ITER_WINDOW, rate=AUTO_ITER_RATE):
+    """
+    Budget d'itérations suivant d'une vue d'histogramme 'hist' (voir escape_histogram)
+    dont 'active' pixels sur 'pixels' sont encore itérés, ou None s'il est inutile de
+    continuer : plus assez de pixels actifs pour changer l'image, ou taux d'échappement des
+    'window' dernières itérations tombé sous 'rate' après le pic de l'histogramme.
+    Sinon, le budget augmente de moitié (d'au moins 'window' itérations), jusqu'à 'limit'.
+    """
+    max_iter = hist.size - 1
+    threshold = _threshold(pixels, window, rate)
+    if max_iter >= limit or active < threshold:
+        return None
+    past_peak = hist.any() and hist.argmax() < max_iter - window
+    if past_peak and hist[-window:].sum() < threshold:
+        return None
+    return min(limit, max_iter + max(window, max_iter // 2))
+
+
+def cutoff_iteration(hist, pixels, window=AUTO_ITER_WINDOW, rate=AUTO_ITER_RATE):
+    """
+    Nombre d'itérations suffisant pour la vue d'histogramme 'hist' : fin de la dernière
+    fenêtre de 'window' itérations où le taux d'échappement atteint encore 'rate', au
+    moins AUTO_ITER_MIN. Sert à réduire le budget lors d'un zoom arrière ; sans aucun
+    pixel échappé, le budget courant est conservé.
+    """
+    if not hist.any():
+        return hist.size - 1
+    cumulative = np.concatenate(([0], np.cumsum(hist)))
+    windowed = cumulative[window:] - cumulative[:-window]
+    significant = np.flatnonzero(windowed >= _threshold(pixels, window, rate))
+    if significant.size == 0:
+        return AUTO_ITER_MIN
+    return max(AUTO_ITER_MIN, int(significant[-1]) + window)
@@ -0,0 +1,178 @@
+# formulas.py
+import numpy as np
+
+# Itérations de l'orbite du point critique 0 au-delà desquelles, restée bornée, elle est
+# considérée comme bornée (voir Formula.connected_for).
+CONNECTED_ITER = 1000
+
+
+class Formula:
+    """
+    Formule itérée d'une fractale, déclarée une seule fois pour tous les backends.
+
+    'step(xp, z, c, prev, tmp, params)' calcule une itération en place dans z, avec xp le
+    module de calcul (numpy ou cupy) : chaque pas n'utilise que des ufuncs avec 'out' sur
+    des tableaux déjà rassemblés, sans temporaire. 'tmp' est un tampon de la taille de z ;
+    'prev' (valeur précédente de z) n'est fourni qu'aux formules déclarées avec uses_prev,
+    qui doivent le mettre à jour.
+
+    julia : z part du point du pixel et c vaut params["c"] ; sinon z part de 0 et c est le
+    point du pixel (voir start). L'échappement est |z| > 2 pour toutes les formules.
+    defaults : paramètres de la formule et leurs valeurs par défaut (voir bind).
+    mandelbrot_interior : la cardioïde principale et le bourgeon de période 2 sont
+    intérieurs (rejet immédiat, voir fractal_state_cpu.in_cardioid_or_bulb).
+    perturbation : la formule est z² + c et supporte le zoom profond par perturbation.
+    symmetry : symétrie de l'image (voir symmetry.SYMMETRIES), exploitée pour ne calculer
+    qu'une moitié des pixels qui se correspondent ; "conjugate" suppose des paramètres
+    réels (voir symmetry_for).
+    connected : l'ensemble est connexe, si bien qu'un rectangle dont tout le bord a le même
+    nombre d'itérations ne contient aucun détail et peut être rempli sans calcul (voir
+    mariani_silver) ; pour une formule julia, seulement si l'orbite du point critique 0
+    reste bornée (voir connected_for).
+    """
+
+    def __init__(self, name, step, julia=False, defaults=None, uses_prev=False, mandelbrot_interior=False,
+                 perturbation=False, symmetry=None, connected=False):
+        self.name = name
+        self.step = step
+        self.julia = julia
+        self.defaults = dict(defaults or {})
+        self.uses_prev = uses_prev
+        self.mandelbrot_interior = mandelbrot_interior
+        self.perturbation = perturbation
+        self.symmetry = symmetry
+        self.connected = connected
+
+    def bind(self, params=None):
+        """
+        Paramètres effectifs d'un calcul : valeurs par défaut complétées par 'params' (les
+        clés inconnues de la formule sont ignorées). Les états les lient une fois au début
+        de chaque calcul, jamais dans la boucle d'itérations.
+        """
+        bound = dict(self.defaults)
+        bound.update((key, value) for key, value in (params or {}).items() if key in self.defaults)
+        return bound
+
+    def start(self, xp, points, params):
+        """
+        Valeurs initiales (z, c) des pixels de points 'points' : c est le tableau constant
+        passé à step, nul pour les pixels retirés afin que leur z reste à 0.
+        """
+        if self.julia:
+            return points.copy(), xp.full_like(points, params["c"])
+        return xp.zeros_like(points), points
+
+    def symmetry_for(self, params):
+        """
+        Symétrie de la formule avec les paramètres liés 'params', ou None : la symétrie par
+        rapport à l'axe réel disparaît dès qu'un paramètre n'est pas réel.
+        """
+        if self.symmetry == "conjugate" and any(complex(value).imag for value in params.values()):
+            return None
+        return self.symmetry
+
+    def connected_for(self, params):
+        """
+        Vrai si l'ensemble de la formule avec les paramètres liés 'params' est connexe (voir
+        'connected'). Pour une formule julia, l'orbite du point critique 0 sous 'step' doit
+        rester dans |z| <= 2 pendant CONNECTED_ITER itérations : comme pour z² + c, un
+        ensemble de Julia dont c est hors de l'ensemble de Mandelbrot est une poussière.
+        """
+        if not self.connected:
+            return False
+        if not self.julia:
+            return True
+        z = np.zeros(1, dtype=np.complex128)
+        c = np.full(1, params["c"], dtype=np.complex128)
+        prev = np.zeros_like(z) if self.uses_prev else None
+        tmp = np.empty_like(z)
+        for _ in range(CONNECTED_ITER):
+            self.step(np, z, c, prev, tmp, params)
+            if abs(z[0]) > 2:
+                return False
+        return True
+
+    def cache_key(self, params):
+        """
+        Paramètres liés 'params' sous la forme attendue dans les clés du cache de tuiles
+        (tuple de (nom, partie réelle, partie imaginaire), sérialisable en JSON).
+        """
+        return tuple((name, complex(value).real, complex(value).imag) for name, value in sorted(params.items()))
+
+
+def _square_add(xp, z, c, prev, tmp, params):
+    xp.multiply(z, z, out=z)
+    xp.add(z, c, out=z)
+
+
+def _burning_ship(xp, z, c, prev, tmp, params):
+    # (|x| + i|y|)² + c
+    xp.abs(z.real, out=z.real)
+    xp.abs(z.imag, out=z.imag)
+    _square_add(xp, z, c, prev, tmp, params)
+
+
+def _tricorn(xp, z, c, prev, tmp, params):
+    # conj(z)² + c
+    xp.conjugate(z, out=z)
+    _square_add(xp, z, c, prev, tmp, params)
+
+
+def _multibrot3(xp, z, c, prev, tmp, params):
+    xp.multiply(z, z, out=tmp)
+    xp.multiply(tmp, z, out=z)
+    xp.add(z, c, out=z)
+
+
+def _phoenix(xp, z, c, prev, tmp, params):
+    # z² + p z_prev + c, puis z_prev <- z
+    xp.multiply(z, z, out=tmp)
+    xp.multiply(prev, params["p"], out=prev)
+    xp.add(tmp, prev, out=tmp)
+    xp.add(tmp, c, out=tmp)
+    xp.copyto(prev, z)
+    xp.copyto(z, tmp)
+
+
+def _perpendicular(xp, z, c, prev, tmp, params):
+    # (|x| - i|y|)² + c
+    xp.abs(z.real, out=z.real)
+    xp.abs(z.imag, out=z.imag)
+    xp.negative(z.imag, out=z.imag)
+    _square_add(xp, z, c, prev, tmp, params)
+
+
+# Formules disponibles, par nom (valeurs de fractal_type).
+FORMULAS = {}
+
+
+def register_formula(formula):
+    """
+    Ajoute (ou remplace) une formule du registre et la retourne. Une formule enregistrée
+    après la création du pool de FractalStateMP reste utilisable : la formule elle-même
+    est transmise avec chaque tâche (sa fonction step doit donc être définie au niveau
+    d'un module).
+    """
+    FORMULAS[formula.name] = formula
+    return formula
+
+
+def get_formula(name):
+    try:
+        return FORMULAS[name]
+    except KeyError:
+        raise ValueError("formule inconnue : %r" % (name,)) from None
+
+
+MANDELBROT = register_formula(Formula("Mandelbrot", _square_add, mandelbrot_interior=True, perturbation=True,
+                                      symmetry="conjugate", connected=True))
+register_formula(Formula("Julia", _square_add, julia=True, defaults={"c": -0.7 + 0.27015j}, symmetry="point",
+                         connected=True))
+# Burning Ship et Perpendicular ne sont pas symétriques : |Im z| ne commute pas avec la conjugaison
+register_formula(Formula("Burning Ship", _burning_ship))
+register_formula(Formula("Custom", _square_add, julia=True, defaults={"c": -0.7 + 0.27015j}, symmetry="point",
+                         connected=True))
+register_formula(Formula("Tricorn", _tricorn, symmetry="conjugate"))
+register_formula(Formula("Multibrot3", _multibrot3, symmetry="conjugate", connected=True))
+register_formula(Formula("Phoenix", _phoenix, defaults={"p": -0.5}, uses_prev=True, symmetry="conjugate"))
+register_formula(Formula("Perpendicular", _perpendicular))
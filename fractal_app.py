@@ -1,20 +1,20 @@
 # fractal_app.py
+import numpy as np
 import pygame
 import sys
-from ui import draw_ui, handle_ui_event, UI_OPTIONS
-
-try:
-    from fractal_state_gpu import FractalStateGPU
-    from renderer_incremental import display_fractal
-    use_gpu = True
-except ImportError:
-    try:
-        from fractal_state_cpu import FractalStateCPU
-        from renderer_cpu import display_fractal as display_fractal
-        use_gpu = False
-    except ImportError:
-        print("Aucune implémentation de fractale (GPU ou CPU) n'est disponible.")
-        sys.exit(1)
+import time
+from backend_select import BACKEND_CACHE, EngineSelector, available_engines
+from compute_thread import ComputeWorker
+from escape_histogram import cutoff_iteration
+from fractal_state_cpu import FractalStateCPU
+from fractal_state_mp import FractalStateMP
+from instrumentation import PROFILER
+from julia_atlas import JuliaAtlas
+from perturbation import needs_perturbation
+# Les deux renderers dessinent l'image dans la même surface (voir renderer_cpu.blit_result)
+from renderer_cpu import restore_background
+from tile_cache import TileCache
+from ui import draw_hud, draw_ui, formula_params, handle_ui_event, UI_OPTIONS
 
 # Configuration de base
 WIDTH = 1100
@@ -25,52 +25,225 @@ INIT_RE_END   = 1.5
 INIT_IM_START = -1.2
 INIT_IM_END   = 1.2
 CONTINUOUS_ZOOM_FACTOR = 0.95
+# Nombre de processus pour le calcul CPU (None : tous les cœurs, 1 : un seul cœur sans pool)
+CPU_WORKERS = None
+# Détection de l'intérieur (cardioïde/bourgeon et orbites périodiques) ; ne change pas l'image
+INTERIOR_CHECK = True
+# Exploitation de la symétrie de la formule (axe réel, ou centrale pour Julia) : seule une
+# moitié des pixels qui se correspondent est calculée ; ne change pas l'image
+SYMMETRY = True
+# Rendu par subdivision de rectangles (Mariani–Silver) ; utilise le backend CPU mono-processus
+MARIANI_SILVER = False
+# Zoom avec réutilisation : l'image précédente projetée est affichée aussitôt, puis affinée
+# à l'image suivante (backends CPU uniquement)
+ZOOM_REUSE = True
+# Rendu progressif (1/8, 1/4, 1/2 puis pleine résolution) par paquets d'au plus
+# COMPUTE_SLICE_MS millisecondes dans le thread de calcul (backends CPU uniquement)
+PROGRESSIVE = True
+COMPUTE_SLICE_MS = 20
+# Cache des tuiles déjà calculées (taille maximale en mémoire, en octets) ; avec un
+# répertoire TILE_CACHE_DIR, les tuiles évincées sont conservées sur disque
+TILE_CACHE_BYTES = 256 * 2**20
+TILE_CACHE_DIR = None
+# Précision du calcul : "auto" (complex64 pour les vues peu profondes à peu d'itérations,
+# complex128 sinon),
+# "single" ou "double" (voir precision.complex_dtype)
+PRECISION = "auto"
+# Mesures par image et HUD (F3 pour basculer) ; avec TRACE_PATH, la trace est écrite au
+# format Chrome (chrome://tracing, Perfetto) à la fermeture
+PROFILE = False
+TRACE_PATH = None
+# Point de reprise (voir checkpoint.py) : l'état y est enregistré toutes les
+# CHECKPOINT_INTERVAL secondes et à la fermeture, et la vue enregistrée est reprise au
+# démarrage ; utilise le backend CPU mono-processus
+CHECKPOINT_PATH = None
+CHECKPOINT_INTERVAL = 5.0
+# Moteur de calcul : "cpu", "mp", "gpu", ou "auto" pour le plus rapide des moteurs installés
+# à la taille de la fenêtre et au nombre d'itérations courant, lu dans BACKEND_CACHE_PATH ;
+# une classe de charge pas encore mesurée l'est en arrière-plan, sur le moteur par défaut
+# en attendant (voir backend_select.EngineSelector). Avec "auto", une vue de zoom profond
+# (voir perturbation.PRECISION_LIMIT) n'est jamais calculée sur le GPU, qui n'a pas de mode
+# perturbation : elle passe au moteur CPU le plus rapide et y reste
+BACKEND = "auto"
+BACKEND_CACHE_PATH = BACKEND_CACHE
+
+def zoom_max_iter(worker, zoom_in):
+    """
+    Nombre d'itérations de la vue suivante lors d'un zoom. Sans mode automatique, il
+    augmente (zoom avant) ou diminue (zoom arrière) de 1, entre 50 et 2000. En mode
+    automatique, il est conservé en zoom avant (le thread de calcul le prolonge là où la
+    frontière l'exige) et ramené en zoom arrière à ce qu'exige l'image affichée.
+    """
+    if UI_OPTIONS["fixed_iter"]:
+        return worker.max_iter
+    if UI_OPTIONS["auto_iter"]:
+        if zoom_in:
+            return worker.max_iter
+        frame = worker.acquire()
+        cutoff = cutoff_iteration(frame.escape_histogram(), frame.result.size)
+        worker.release()
+        return min(worker.max_iter, cutoff)
+    if zoom_in:
+        return min(2000, int(worker.max_iter+1))
+    return max(50, int(worker.max_iter-1))
+
+def select_backend():
+    """
+    Moteur de calcul de départ de l'application (voir BACKEND) et, avec "auto", le
+    sélecteur qui le réévalue quand le nombre d'itérations change de classe (None sinon).
+    MARIANI_SILVER, CHECKPOINT_PATH et CPU_WORKERS = 1 imposent le moteur CPU
+    mono-processus.
+    """
+    if MARIANI_SILVER or CHECKPOINT_PATH is not None or CPU_WORKERS == 1:
+        return "cpu", None
+    if BACKEND != "auto":
+        return BACKEND, None
+    selector = EngineSelector(WIDTH, HEIGHT, available_engines(), BACKEND_CACHE_PATH)
+    return selector.engine(INIT_MAX_ITER), selector
+
+def create_state(backend, bounds, max_iter, tile_cache, fractal_type="Mandelbrot", formula_params=None):
+    """
+    État de fractale du moteur 'backend' pour le domaine 'bounds' = (re_start, re_end,
+    im_start, im_end), avec les options de l'application.
+    """
+    if backend == "gpu":
+        from fractal_state_gpu import FractalStateGPU
+        return FractalStateGPU(WIDTH, HEIGHT, max_iter, *bounds, fractal_type=fractal_type,
+                               interior_check=INTERIOR_CHECK, tile_cache=tile_cache, precision=PRECISION,
+                               formula_params=formula_params, symmetry=SYMMETRY)
+    if backend == "cpu":
+        return FractalStateCPU(WIDTH, HEIGHT, max_iter, *bounds, interior_check=INTERIOR_CHECK,
+                               mariani_silver=MARIANI_SILVER, zoom_reuse=ZOOM_REUSE, progressive=PROGRESSIVE,
+                               tile_cache=tile_cache, precision=PRECISION, fractal_type=fractal_type,
+                               formula_params=formula_params, symmetry=SYMMETRY, checkpoint=CHECKPOINT_PATH,
+                               checkpoint_interval=CHECKPOINT_INTERVAL)
+    return FractalStateMP(WIDTH, HEIGHT, max_iter, *bounds, workers=CPU_WORKERS, interior_check=INTERIOR_CHECK,
+                          zoom_reuse=ZOOM_REUSE, progressive=PROGRESSIVE, tile_cache=tile_cache,
+                          precision=PRECISION, fractal_type=fractal_type, formula_params=formula_params,
+                          symmetry=SYMMETRY)
+
+def switch_backend(backend, tile_cache):
+    """
+    Fabrique passée à ComputeWorker.replace_state : recrée l'état courant (domaine,
+    itérations, formule) sur le moteur 'backend'. Une vue en zoom profond reste sur son
+    moteur CPU, dont le centre est conservé en haute précision ; une vue du GPU devenue
+    trop profonde (voir deep_view) y passe, et le nouvel état entre en mode perturbation.
+    """
+    def factory(state):
+        if getattr(state, "deep", False):
+            return None
+        return create_state(backend, (state.re_start, state.re_end, state.im_start, state.im_end),
+                            state.max_iter, tile_cache, state.fractal_type, state.formula_params)
+    return factory
+
+def deep_view(state):
+    """
+    Indique si la vue de 'state' demande le mode perturbation (voir
+    perturbation.needs_perturbation), que seuls les moteurs CPU possèdent ; l'état GPU,
+    qui ne passe jamais en mode 'deep', est jugé sur son domaine.
+    """
+    if getattr(state, "deep", False):
+        return True
+    step = max((state.re_end - state.re_start) / (WIDTH - 1), (state.im_end - state.im_start) / (HEIGHT - 1))
+    return needs_perturbation((state.re_start + state.re_end) / 2, (state.im_start + state.im_end) / 2, step)
+
+def open_atlas(state):
+    """
+    Atlas des ensembles de Julia des constantes de la vue courante (voir
+    julia_atlas.JuliaAtlas), calculé par lot sur le GPU avec le backend GPU.
+    """
+    xp = np
+    if not isinstance(state.result, np.ndarray):
+        import cupy as xp
+    return JuliaAtlas(WIDTH, HEIGHT, state.re_start, state.re_end, state.im_start, state.im_end,
+                      precision=PRECISION, xp=xp)
 
 def run_app():
+    # CuPy n'est importé que si le moteur GPU est retenu ; les images publiées par le
+    # thread de calcul sont toujours sur l'hôte, quel que soit le moteur retenu ensuite
+    backend, selector = select_backend()
+    if backend == "gpu":
+        from renderer_incremental import display_fractal
+    else:
+        from renderer_cpu import display_fractal
+
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Mandelbrot Interactive")
     clock = pygame.time.Clock()
 
     # Création de l'état initial de la fractale
-    if use_gpu:
-        state = FractalStateGPU(WIDTH, HEIGHT, INIT_MAX_ITER, INIT_RE_START, INIT_RE_END, INIT_IM_START, INIT_IM_END)
-    else:
-        state = FractalStateCPU(WIDTH, HEIGHT, INIT_MAX_ITER, INIT_RE_START, INIT_RE_END, INIT_IM_START, INIT_IM_END)
+    tile_cache = TileCache(TILE_CACHE_BYTES, TILE_CACHE_DIR)
+    state = create_state(backend, (INIT_RE_START, INIT_RE_END, INIT_IM_START, INIT_IM_END), INIT_MAX_ITER,
+                         tile_cache)
+    if getattr(state, "resumed", False):
+        # L'interface suit la formule du point de reprise
+        UI_OPTIONS["fractal_type"] = state.fractal_type
+        if state.fractal_type == "Custom":
+            UI_OPTIONS["custom_re"], UI_OPTIONS["custom_im"] = state.params["c"].real, state.params["c"].imag
 
-    display_fractal(screen, state, colormap_name=UI_OPTIONS["colormap"], gamma=UI_OPTIONS["gamma"])
+    # Tous les calculs ont lieu dans le thread de calcul ; la boucle ne fait que soumettre
+    # des requêtes et afficher la dernière image publiée.
+    worker = ComputeWorker(state, slice_ms=COMPUTE_SLICE_MS)
+    worker.set_auto_iter(UI_OPTIONS["auto_iter"] and not UI_OPTIONS["fixed_iter"])
+    shown = None
 
     dragging = False
     continuous_zoom = False
     view_updated = False
+    # Atlas des ensembles de Julia affiché à la place de la vue (touche A), ou None
+    atlas = None
+    PROFILER.enable(PROFILE, trace=TRACE_PATH is not None)
 
     while True:
+        worker.check()
+        events_start = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                worker.close()
+                if hasattr(worker.state, "close"):
+                    worker.state.close()
+                if selector is not None:
+                    selector.close()
+                if TRACE_PATH is not None:
+                    PROFILER.export_chrome_trace(TRACE_PATH)
                 pygame.quit()
                 sys.exit(0)
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                PROFILER.enable(not PROFILER.enabled, trace=TRACE_PATH is not None)
+                view_updated = True
+
+            # Touche A : atlas des ensembles de Julia de la vue ; un clic sur une vignette ouvre
+            # l'ensemble correspondant (formule Custom), Échap referme l'atlas
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                atlas = open_atlas(worker.state) if atlas is None else None
+                dragging = continuous_zoom = False
+                view_updated = True
+                continue
+            if atlas is not None:
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    atlas = None
+                    view_updated = True
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    c = atlas.cell_at(*event.pos)
+                    if c is not None:
+                        UI_OPTIONS["fractal_type"] = "Custom"
+                        UI_OPTIONS["custom_re"], UI_OPTIONS["custom_im"] = c.real, c.imag
+                        worker.reset_view(fractal_type="Custom", formula_params=formula_params())
+                        atlas = None
+                        view_updated = True
+                continue
             
-            if handle_ui_event(event, state):
+            if handle_ui_event(event, worker):
                 view_updated = True
 
             # Gestion du zoom avec la molette
             if event.type == pygame.MOUSEWHEEL:
-                if event.y > 0:
-                    zoom_factor = 0.9
-                    new_max_iter = min(2000, int(state.max_iter+1)) if not UI_OPTIONS["fixed_iter"] else state.max_iter
-                else:
-                    zoom_factor = 1.1
-                    new_max_iter = max(50, int(state.max_iter-1)) if not UI_OPTIONS["fixed_iter"] else state.max_iter
-                center_re = (state.re_start + state.re_end) / 2
-                center_im = (state.im_start + state.im_end) / 2
-                width_range = (state.re_end - state.re_start) * zoom_factor
-                height_range = (state.im_end - state.im_start) * zoom_factor
-                new_re_start = center_re - width_range / 2
-                new_re_end = center_re + width_range / 2
-                new_im_start = center_im - height_range / 2
-                new_im_end = center_im + height_range / 2
-                state.update_zoom(new_re_start, new_re_end, new_im_start, new_im_end, new_max_iter)
-                view_updated = True
+                zoom_factor = 0.9 if event.y > 0 else 1.1
+                new_max_iter = zoom_max_iter(worker, event.y > 0)
+                # Le centre est conservé par l'état (en haute précision sur CPU pour le zoom profond)
+                worker.zoom_center(zoom_factor, new_max_iter)
 
             # Activation du déplacement et du zoom continu
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -86,43 +259,62 @@ def run_app():
 
             if event.type == pygame.MOUSEMOTION and dragging:
                 dx, dy = event.rel
-                state.apply_translation(dx, dy)
-                view_updated = True
+                worker.apply_translation(dx, dy)
 
-        # Zoom continu
+        # Zoom continu (les requêtes accumulées pendant un calcul sont fusionnées)
         if continuous_zoom:
-            # Récupérer l'image actuelle
-            current_surface = screen.copy()
-            center_re = (state.re_start + state.re_end) / 2
-            center_im = (state.im_start + state.im_end) / 2
-            width_range = (state.re_end - state.re_start) * CONTINUOUS_ZOOM_FACTOR
-            height_range = (state.im_end - state.im_start) * CONTINUOUS_ZOOM_FACTOR
-            new_max_iter = min(2000, int(state.max_iter+1)) if not UI_OPTIONS["fixed_iter"] else state.max_iter
-            new_re_start = center_re - width_range / 2
-            new_re_end = center_re + width_range / 2
-            new_im_start = center_im - height_range / 2
-            new_im_end = center_im + height_range / 2
-            state.update_zoom(new_re_start, new_re_end, new_im_start, new_im_end, new_max_iter)
-            # Utiliser smoothscale pour interpoler entre l'image précédente et la nouvelle fractale
-            interpolated = pygame.transform.smoothscale(current_surface, (WIDTH, HEIGHT))
-            screen.blit(interpolated, (0, 0))
-            view_updated = True
+            new_max_iter = zoom_max_iter(worker, True)
+            # Avec ZOOM_REUSE, l'état fournit directement l'image précédente interpolée
+            worker.zoom_center(CONTINUOUS_ZOOM_FACTOR, new_max_iter)
 
         # Si le bouton Reset Zoom a été cliqué, réinitialiser la vue
         if UI_OPTIONS.get("reset_zoom", False):
-            state.reset_view()
+            worker.reset_view()
             UI_OPTIONS["reset_zoom"] = False
-            view_updated = True
 
         # Mettre à jour le nombre d'itérations affiché avec la valeur actuelle de state
-        UI_OPTIONS["max_iter"] = state.max_iter
+        UI_OPTIONS["max_iter"] = worker.max_iter
+
+        # Moteur le plus rapide pour la classe de charge courante, hors GPU en zoom profond
+        # (voir BACKEND) ; le domaine est relu sans verrou, une vue en cours de mise à jour
+        # est au pire jugée au tour suivant
+        if selector is not None:
+            engine = selector.engine(worker.max_iter, deep_view(worker.state))
+            if engine != backend:
+                backend = engine
+                worker.replace_state(switch_backend(backend, tile_cache))
+        PROFILER.record_since("events", events_start)
 
-        if view_updated:
-            display_fractal(screen, state, colormap_name=UI_OPTIONS["colormap"], gamma=UI_OPTIONS["gamma"])
+        # Nouvelle image publiée par le thread de calcul, ou changement de palette/gamma ;
+        # le HUD, translucide, impose de redessiner l'image à chaque tour
+        redrawn = False
+        if atlas is not None:
+            if view_updated:
+                display_fractal(screen, atlas, colormap_name=UI_OPTIONS["colormap"], gamma=UI_OPTIONS["gamma"])
+                view_updated = False
+                redrawn = True
+        elif worker.frame is not shown or view_updated or PROFILER.enabled:
+            shown = worker.acquire()
+            with PROFILER.span("display_fractal"):
+                display_fractal(screen, shown, colormap_name=UI_OPTIONS["colormap"], gamma=UI_OPTIONS["gamma"])
+            worker.release()
             view_updated = False
+            redrawn = True
 
-        draw_ui(screen)
-        pygame.display.update()
+        # Une seule présentation par tour : toute la fenêtre si l'image a été redessinée,
+        # sinon les seuls éléments de l'interface qui ont changé (aucune si rien n'a changé)
+        dirty = []
+        if atlas is None:
+            with PROFILER.span("draw_ui"):
+                dirty = draw_ui(screen, restore_background, redraw_all=redrawn)
+        if PROFILER.enabled:
+            draw_hud(screen, PROFILER.summary())
+        with PROFILER.span("display.update"):
+            if redrawn:
+                pygame.display.update()
+            elif dirty:
+                pygame.display.update(dirty)
+        PROFILER.end_frame()
         clock.tick(60)
 
 def run():
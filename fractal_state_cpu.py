@@ -1,97 +1,975 @@
 # fractal_state_cpu.py
+import time
+from decimal import Decimal
+
 import numpy as np
 
+from checkpoint import CHECKPOINT_INTERVAL, bound_params, read_checkpoint, write_checkpoint
+from formulas import MANDELBROT, get_formula
+from instrumentation import PROFILER
+from mariani_silver import render_mariani_silver
+from perturbation import (ReferenceOrbit, iterate_perturbation, midpoint, needs_perturbation,
+                          offset_axes, shift)
+from precision import RESULT_DTYPE, complex_dtype
+from progressive import PROGRESSIVE_STRIDES, fill_from_grid, pass_mask
+from symmetry import centered_axis, mirror_orbit, mirror_pairs
+from tile_cache import ACTIVE, ESCAPED, TILE_SIZE, lattice_origin, level_key, pixel_status, view_tiles
+from zoom_reuse import refine_from_seed, resample_previous
+
+# Part de pixels "morts" (échappés mais pas encore retirés) au-delà de laquelle
+# les tableaux actifs sont compactés.
+COMPACT_THRESHOLD = 0.25
+
+# Distance en dessous de laquelle une orbite est considérée comme revenue sur
+# son point de référence (détection de cycle), en complex128 puis en complex64.
+PERIODICITY_EPS = 1e-12
+PERIODICITY_EPS_SINGLE = 1e-6
+
+
+def in_cardioid_or_bulb(c):
+    """
+    Retourne un masque des points de c situés dans la cardioïde principale ou dans
+    le bourgeon de période 2 de l'ensemble de Mandelbrot (intérieur garanti).
+    """
+    x = c.real - 0.25
+    y2 = c.imag * c.imag
+    q = x * x + y2
+    cardioid = q * (q + x) <= 0.25 * y2
+    bulb = (c.real + 1.0) ** 2 + y2 <= 0.0625
+    return cardioid | bulb
+
+
+def iterate_active(idx, z, c, result, mask, start, stop, interior_check=False, counts=None, formula=MANDELBROT,
+                   params=None, prev=None, xp=np):
+    """
+    Itère la formule 'formula' (z = z^2 + c par défaut) uniquement sur les pixels encore
+    actifs, stockés de façon compacte.
+
+    Paramètres :
+      - idx : indices plats (dans la grille H×W) des pixels actifs.
+      - z, c : valeurs complexes correspondantes, tableaux contigus de même taille que idx
+        (c est la constante de l'itération, voir formulas.Formula.start).
+      - result, mask : grilles complètes H×W ; seuls les pixels qui s'échappent y sont écrits.
+      - start, stop : plage d'itérations à effectuer (numérotation globale).
+      - params : paramètres liés de la formule (voir formulas.Formula.bind).
+      - prev : valeurs précédentes de z, pour les formules déclarées avec uses_prev.
+
+    Le pas de la formule et le test d'échappement (|z|^2 > 4) se font en place dans des
+    tampons préalloués. Les pixels échappés sont neutralisés (z = c = 0) puis retirés
+    lorsque leur proportion dépasse COMPACT_THRESHOLD : le coût suit le nombre de pixels
+    actifs et non la taille de la grille.
+
+    Si interior_check est vrai, l'orbite de chaque pixel est comparée à un point de
+    référence renouvelé aux puissances de 2 (méthode de Brent) : un pixel qui y revient
+    est périodique, donc intérieur, et il est retiré sans toucher à 'result'.
+
+    Si 'counts' (grille d'entiers) est fourni, on y note le nombre d'itérations à
+    l'échappement de chaque pixel.
+
+    z et c peuvent être en complex64 ou en complex128 (voir precision.complex_dtype) : les
+    tampons suivent leur type et la tolérance de détection de cycle est adaptée. Avec
+    xp=cupy, tous les tableaux sont sur le GPU (voir julia_atlas.julia_batch).
+
+    Retourne les tableaux (idx, z, c, prev) compactés, prêts à être repris plus tard.
+    """
+    flat_result = result.reshape(-1)
+    flat_mask = mask.reshape(-1)
+    step = formula.step
+    n = idx.size
+    alive = xp.ones(n, dtype=bool)
+    dead = 0
+    mod2 = xp.empty(n, dtype=z.real.dtype)
+    tmp = xp.empty(n, dtype=z.real.dtype)
+    scratch = xp.empty(n, dtype=z.dtype)
+    escaped = xp.empty(n, dtype=bool)
+    inv_log2 = 1.0 / np.log(2)
+    trace = PROFILER.enabled
+    if interior_check:
+        z_ref = z.copy()
+        prev_ref = None if prev is None else prev.copy()
+        diff = xp.empty(n, dtype=z.dtype)
+        eps = PERIODICITY_EPS_SINGLE if z.dtype == xp.complex64 else PERIODICITY_EPS
+        eps2 = eps * eps
+
+    for i in range(start, stop):
+        if n == dead:
+            break
+        if trace:
+            PROFILER.count("active_pixels", n - dead)
+        step(xp, z, c, prev, scratch, params)
+        xp.multiply(z.real, z.real, out=mod2)
+        xp.multiply(z.imag, z.imag, out=tmp)
+        xp.add(mod2, tmp, out=mod2)
+        xp.greater(mod2, 4.0, out=escaped)
+        retired = escaped.any()
+        if retired:
+            sel = xp.flatnonzero(escaped)
+            # log|z| = 0.5 * log(|z|^2)
+            flat_result[idx[sel]] = i + 1 - xp.log(0.5 * xp.log(mod2[sel])) * inv_log2
+            flat_mask[idx[sel]] = False
+            if counts is not None:
+                counts.reshape(-1)[idx[sel]] = i + 1
+            z[sel] = 0
+            c[sel] = 0
+            if prev is not None:
+                prev[sel] = 0
+            alive[sel] = False
+            dead += sel.size
+
+        if interior_check:
+            xp.subtract(z, z_ref, out=diff)
+            xp.multiply(diff.real, diff.real, out=mod2)
+            xp.multiply(diff.imag, diff.imag, out=tmp)
+            xp.add(mod2, tmp, out=mod2)
+            xp.less(mod2, eps2, out=escaped)
+            if prev is not None:
+                # L'état de l'orbite est le couple (z, z précédent)
+                xp.subtract(prev, prev_ref, out=diff)
+                xp.multiply(diff.real, diff.real, out=mod2)
+                xp.multiply(diff.imag, diff.imag, out=tmp)
+                xp.add(mod2, tmp, out=mod2)
+                xp.logical_and(escaped, mod2 < eps2, out=escaped)
+            xp.logical_and(escaped, alive, out=escaped)
+            if escaped.any():
+                sel = xp.flatnonzero(escaped)
+                flat_mask[idx[sel]] = False
+                z[sel] = 0
+                c[sel] = 0
+                if prev is not None:
+                    prev[sel] = 0
+                alive[sel] = False
+                dead += sel.size
+                retired = True
+            if (i + 1) & i == 0:
+                z_ref[:] = z
+                if prev is not None:
+                    prev_ref[:] = prev
+
+        if retired and dead > COMPACT_THRESHOLD * n:
+            idx, z, c = idx[alive], z[alive], c[alive]
+            if prev is not None:
+                prev = prev[alive]
+            if interior_check:
+                z_ref = z_ref[alive]
+                if prev is not None:
+                    prev_ref = prev_ref[alive]
+                diff = diff[:idx.size]
+            n = idx.size
+            dead = 0
+            alive = xp.ones(n, dtype=bool)
+            mod2, tmp, scratch, escaped = mod2[:n], tmp[:n], scratch[:n], escaped[:n]
+
+    if dead:
+        idx, z, c = idx[alive], z[alive], c[alive]
+        if prev is not None:
+            prev = prev[alive]
+    return idx, z, c, prev
+
+
+def translation_slices(width, height, dx, dy):
+    """
+    Pour une translation de (dx, dy) pixels, retourne (dst, src) : les tranches 2D telles que
+    nouveau[dst] = ancien[src] pour la partie de l'image conservée.
+    """
+    def axis(n, d):
+        if d >= 0:
+            return slice(d, n), slice(0, n - d)
+        return slice(0, n + d), slice(-d, n)
+    dst_y, src_y = axis(height, dy)
+    dst_x, src_x = axis(width, dx)
+    return (dst_y, dst_x), (src_y, src_x)
+
+
+def exposed_rects(width, height, dx, dy):
+    """
+    Retourne les rectangles (y0, y1, x0, x1) découverts par une translation de (dx, dy)
+    pixels : une bande horizontale et une bande verticale formant un L.
+    """
+    rects = []
+    if dy > 0:
+        rects.append((0, dy, 0, width))
+    elif dy < 0:
+        rects.append((height + dy, height, 0, width))
+    y0, y1 = max(dy, 0), height + min(dy, 0)
+    if dx > 0:
+        rects.append((y0, y1, 0, dx))
+    elif dx < 0:
+        rects.append((y0, y1, width + dx, width))
+    return [r for r in rects if r[0] < r[1] and r[2] < r[3]]
+
+
 class FractalStateCPU:
     """
-    Cette classe gère l'état du calcul de la fractale Mandelbrot sur le CPU à l'aide de NumPy.
+    Cette classe gère l'état du calcul de la fractale sur le CPU à l'aide de NumPy.
     Elle calcule la grille complexe correspondant au domaine d'affichage et réalise le calcul
     de la fractale de manière complète ou incrémentale pour ajouter des itérations.
     Elle permet également de traduire (déplacer) la vue.
+
+    La formule est celle de 'fractal_type' dans le registre formulas.FORMULAS (Mandelbrot
+    par défaut), avec les paramètres 'formula_params' ; toutes deux sont lues au début de
+    chaque recalcul complet (voir _bind_formula). Pour les formules déclarées avec
+    uses_prev (Phoenix), active_m contient la valeur précédente de z de chaque pixel.
+
+    Avec symmetry, un recalcul complet n'itère que les pixels dont l'image par la symétrie
+    de la formule (voir symmetry.mirror_pairs) n'est pas déjà dans la vue : les autres
+    reçoivent la valeur de leur source, ainsi qu'une copie miroir de son état actif. Les
+    axes de la grille sont calculés depuis le milieu de la vue (symmetry.centered_axis),
+    ce qui aligne exactement les lignes de part et d'autre de l'axe réel ; l'image obtenue
+    est identique.
+
+    Les pixels encore actifs sont conservés sous forme compacte (active_idx, active_z,
+    active_c) afin que chaque itération ne coûte que le nombre de pixels restants.
+    Avec interior_check, les pixels de la cardioïde principale et du bourgeon de
+    période 2 sont écartés d'emblée et les orbites périodiques sont retirées en cours
+    de calcul ; l'image obtenue est identique.
+
+    Le centre de la vue est conservé en haute précision (center_re, center_im en Decimal)
+    et sa taille dans span_re/span_im. Lorsque l'écart entre pixels devient trop petit
+    pour le float64, l'état passe automatiquement en mode perturbation (attribut 'deep') :
+    une orbite de référence haute précision et des écarts dz par pixel en float64.
+
+    Selon 'precision' (voir precision.complex_dtype), les vues peu profondes à peu
+    d'itérations sont calculées en complex64, les autres en complex128 ; 'result' est stocké en
+    float32. Seuls les axes de la grille sont conservés : les points c (ou dc) des pixels
+    sont générés à la demande, par lot (voir points).
+
+    Avec zoom_reuse, zoom_center affiche d'abord l'image précédente projetée sur la nouvelle
+    vue (refine_pending est alors vrai) ; refine() effectue ensuite le calcul en n'itérant
+    complètement que les zones de bord.
+
+    Avec progressive, full_recompute ne calcule plus rien lui-même : il planifie des passes
+    de résolution croissante (voir progressive.PROGRESSIVE_STRIDES) que advance() exécute
+    par paquets d'itérations, sous un budget de temps par image. Tout changement de vue
+    abandonne aussitôt le travail en cours.
+
+    Avec un tile_cache (voir tile_cache.TileCache), les vues sont assemblées à partir des
+    tuiles déjà calculées (ou reprises depuis une tuile calculée avec moins d'itérations)
+    pour des vues de même échelle dont les pixels coïncident (même phase dans le réseau
+    des tuiles, voir tile_cache.lattice_origin), et seules les autres sont calculées. Le
+    cache n'est pas utilisé en mode perturbation ni en mode mariani_silver.
+
+    Avec un fichier 'checkpoint' (voir checkpoint.write_checkpoint), l'état (result, mask,
+    pixels actifs compacts et leur z, z précédent pour Phoenix, domaine, formule et
+    paramètres, max_iter) y est enregistré au plus toutes les 'checkpoint_interval'
+    secondes, y compris au cours d'un calcul complet ou d'un ajout d'itérations : les
+    itérations sont alors découpées en paquets et les pixels en cours de calcul sont
+    enregistrés avec l'itération atteinte. Si le fichier existe à la création, l'état s'y
+    rattache sans copie (attribut 'resumed') : vue, formule et max_iter sont ceux du point de
+    reprise et un calcul interrompu est seulement terminé. Les vues en perturbation, en mode
+    mariani_silver, en attente d'affinage ou en cours de rendu progressif ne sont pas
+    enregistrées.
     """
-    
-    def __init__(self, width, height, max_iter, re_start, re_end, im_start, im_end):
+
+    def __init__(self, width, height, max_iter, re_start, re_end, im_start, im_end,
+                 interior_check=True, mariani_silver=False, zoom_reuse=False, progressive=False,
+                 tile_cache=None, precision="auto", fractal_type="Mandelbrot", formula_params=None, symmetry=True,
+                 checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.fractal_type = fractal_type
+        self.formula_params = formula_params
+        self.formula = get_formula(fractal_type)
+        self.params = self.formula.bind(formula_params)
+        self.interior_check = interior_check
+        self.symmetry = symmetry
+        self.precision = precision
+        self.mariani_silver = mariani_silver
+        self.zoom_reuse = zoom_reuse
+        self.progressive = progressive
+        self.tile_cache = tile_cache
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_time = time.perf_counter()
         self.width = width
         self.height = height
         self.max_iter = max_iter
+        # Sauvegarde des paramètres initiaux pour le Reset Zoom
+        self.init_params = (re_start, re_end, im_start, im_end, max_iter)
+        self._set_domain(re_start, re_end, im_start, im_end)
+        self.compute_grid()
+        self.resumed = checkpoint is not None and self._resume_checkpoint()
+        if not self.resumed:
+            self.full_recompute()
+
+    def _set_domain(self, re_start, re_end, im_start, im_end):
         self.re_start = re_start
         self.re_end = re_end
         self.im_start = im_start
         self.im_end = im_end
-        self.compute_grid()
-        self.full_recompute()
-    
+        self.center_re = midpoint(re_start, re_end)
+        self.center_im = midpoint(im_start, im_end)
+        self.span_re = re_end - re_start
+        self.span_im = im_end - im_start
+        self._update_precision_mode()
+
+    def _update_precision_mode(self):
+        # Le mode n'est réévalué que lorsque l'échelle change, jamais lors d'une translation,
+        # pour que l'état compact reste cohérent avec le mode qui l'a produit.
+        self.step = max(self.span_re / (self.width - 1), self.span_im / (self.height - 1))
+        self.deep = self.formula.perturbation and needs_perturbation(self.center_re, self.center_im, self.step)
+        self.cdtype = self._view_dtype(self.max_iter)
+
+    def _view_dtype(self, max_iter):
+        # Type complexe de la vue courante calculée en max_iter itérations (voir precision.complex_dtype)
+        if self.deep:
+            return np.complex128
+        return complex_dtype(self.precision, self.center_re, self.center_im, self.step, max_iter)
+
+    def _set_bounds_from_center(self):
+        self.re_start = float(shift(self.center_re, -self.span_re / 2))
+        self.re_end = float(shift(self.center_re, self.span_re / 2))
+        self.im_start = float(shift(self.center_im, -self.span_im / 2))
+        self.im_end = float(shift(self.center_im, self.span_im / 2))
+
     def compute_grid(self):
         """
-        Crée la grille de nombres complexes correspondant au domaine courant, sur le CPU.
+        Calcule les axes de la grille correspondant au domaine courant : parties réelles des
+        colonnes (grid_re) et imaginaires des lignes (grid_im). En mode perturbation, ce
+        sont les écarts au centre (dc). Avec le cache de tuiles, la position de la vue dans
+        le réseau des tuiles est aussi calculée (voir tile_cache.lattice_origin) ; la grille
+        reste celle du domaine demandé.
+        """
+        if self.deep:
+            self.grid_re, self.grid_im = offset_axes(self.width, self.height, self.span_re, self.span_im)
+            return
+        self.grid_re = centered_axis(self.re_start, self.re_end, self.width)
+        self.grid_im = centered_axis(self.im_start, self.im_end, self.height)
+        if self._cache_enabled():
+            step_re = self.span_re / (self.width - 1)
+            step_im = self.span_im / (self.height - 1)
+            self.origin, phase = lattice_origin(self.re_start, self.im_start, step_re, step_im)
+            self.level = level_key(step_re, step_im, phase)
+
+    def points(self, idx):
+        """
+        Retourne les points c (les écarts dc en mode perturbation) des pixels d'indices plats
+        'idx', dans le type complexe de la vue.
         """
-        re = np.linspace(self.re_start, self.re_end, self.width)
-        im = np.linspace(self.im_start, self.im_end, self.height)
-        self.c = re[np.newaxis, :] + 1j * im[:, np.newaxis]
-    
+        rows, cols = np.divmod(idx, self.width)
+        c = np.empty(idx.size, dtype=self.cdtype)
+        c.real = self.grid_re[cols]
+        c.imag = self.grid_im[rows]
+        return c
+
+    def _bind_formula(self):
+        """
+        Résout la formule de 'fractal_type' et lie ses paramètres 'formula_params' pour le
+        calcul qui commence : aucun des deux n'est relu pendant les itérations. Le mode
+        perturbation, réservé aux formules qui le supportent, est réévalué si elle change.
+        """
+        formula = get_formula(self.fractal_type)
+        changed = formula.perturbation != self.formula.perturbation
+        self.formula, self.params = formula, formula.bind(self.formula_params)
+        if changed:
+            self._update_precision_mode()
+            self.compute_grid()
+
+    def _tracks_prev(self):
+        # active_m contient la valeur précédente de z (hors mode perturbation)
+        return self.formula.uses_prev and not self.deep
+
     def full_recompute(self):
         """
         Recalcule entièrement la fractale pour le domaine courant et le nombre d'itérations défini.
-        Initialise les tableaux 'z' (pour le calcul de z = z^2 + c),
-        'result' (pour stocker la valeur smooth finale de chaque pixel) et 'mask' (pour suivre les pixels actifs).
+        Initialise 'result' (valeur smooth finale de chaque pixel), 'mask' (pixels actifs)
+        ainsi que l'ensemble compact des pixels actifs, puis itère.
+        En mode mariani_silver, seule une partie des pixels est réellement calculée
+        (voir mariani_silver.render_mariani_silver et l'attribut computed_fraction), si la
+        formule le permet (voir formulas.Formula.connected_for) ; sinon la vue est calculée
+        normalement.
+        En mode progressive, les passes sont seulement planifiées (voir advance).
+        """
+        self._bind_formula()
+        # Le nombre d'itérations a pu changer depuis la dernière évaluation du type complexe
+        self.cdtype = self._view_dtype(self.max_iter)
+        self._reset()
+        self.computed_fraction = 1.0
+        if self.mariani_silver and self.formula.connected_for(self.params):
+            self.counts = np.zeros((self.height, self.width), dtype=np.int32)
+            self.computed_fraction = render_mariani_silver(self)
+            return
+        view = (0, self.height, 0, self.width)
+        self._resumable = True
+        todo = self._assemble(view)
+        self._plan_mirror(todo)
+        self.computed_fraction = todo.mean()
+        if self.progressive:
+            self._todo = todo
+            self._passes = list(PROGRESSIVE_STRIDES)
+            self._pass_result = np.empty_like(self.result)
+            if self._partner is not None:
+                # Pixels actifs repris du cache de tuiles
+                self._append_active(self._mirror_active(self._active_pixels()))
+        else:
+            self.compute_pixels(np.flatnonzero(todo))
+            self._finish_mirror()
+            self._store_tiles(view)
+            self._save_checkpoint()
+
+    def _plan_mirror(self, todo):
+        """
+        Retire de 'todo' les pixels images d'un autre pixel de la vue par la symétrie de la
+        formule (hors perturbation) ; ils seront recopiés depuis leur source par _mirror_grids
+        et _mirror_active. Les axes sont comparés dans le type de calcul des points.
+        """
+        kind = self.formula.symmetry_for(self.params)
+        if not self.symmetry or kind is None or self.deep:
+            return
+        real = np.empty(0, dtype=self.cdtype).real.dtype
+        dst, src = mirror_pairs(self.grid_re.astype(real), self.grid_im.astype(real), kind)
+        planned = todo.ravel()[dst]
+        if not planned.any():
+            return
+        dst, src = dst[planned], src[planned]
+        todo.ravel()[dst] = False
+        self._mirror = (kind, dst, src)
+        self._partner = np.full(self.width * self.height, -1, dtype=np.intp)
+        self._partner[src] = dst
+
+    def _finish_mirror(self):
+        # Recopie des images par symétrie une fois leurs sources calculées
+        if self._partner is not None:
+            self._append_active(self._mirror_active(self._active_pixels()))
+            self._mirror_grids()
+            self._partner = None
+
+    def _mirror_grids(self):
+        kind, dst, src = self._mirror
+        for grid in (self.result, self.mask):
+            grid.reshape(-1)[dst] = grid.reshape(-1)[src]
+
+    def _mirror_active(self, pixels):
         """
-        self.z = np.zeros((self.height, self.width), dtype=np.complex128)
-        self.result = np.full((self.height, self.width), self.max_iter, dtype=np.float64)
+        Copies miroir (voir symmetry.mirror_orbit) des pixels de l'ensemble compact 'pixels'
+        dont l'image est recopiée.
+        """
+        idx, z, c, m = pixels
+        dst = self._partner[idx]
+        sel = dst >= 0
+        z, c, m = mirror_orbit(self._mirror[0], z[sel], c[sel], None if m is None else m[sel])
+        return dst[sel], z, c, m
+
+    def _active_pixels(self):
+        return self.active_idx, self.active_z, self.active_c, self.active_m if self._tracks_prev() else None
+
+    def _reset(self):
+        self.result = np.full((self.height, self.width), self.max_iter, dtype=RESULT_DTYPE)
         self.mask = np.ones((self.height, self.width), dtype=bool)
-        for i in range(self.max_iter):
-            self.z[self.mask] = self.z[self.mask]**2 + self.c[self.mask]
-            diverged = np.abs(self.z) > 2
-            new_diverged = diverged & self.mask
-            if np.any(new_diverged):
-                self.result[new_diverged] = i + 1 - np.log(np.log(np.abs(self.z[new_diverged])))/np.log(2)
-                self.mask[new_diverged] = False
-    
+        self.counts = None
+        self.seed = None
+        self.refine_pending = False
+        self.approximate = False
+        # Rendu progressif : passes restantes et passe en cours (pixels compacts, itération atteinte)
+        self._passes = []
+        self._pass = None
+        self._todo = None
+        # Symétrie du recalcul en cours : (type, pixels images, pixels sources) et, pour
+        # chaque pixel, l'indice de son image à recopier (-1 sinon)
+        self._mirror = None
+        self._partner = None
+        # Vrai quand result, mask et les pixels actifs (avec ceux en cours de calcul)
+        # décrivent exactement la vue : l'état peut alors être enregistré
+        self._resumable = False
+        if self.deep:
+            self.reference = ReferenceOrbit(self.center_re, self.center_im, self.step, self.max_iter)
+            self.ref_offset = 0j
+        self._clear_active()
+
+    def _clear_active(self):
+        # En mode perturbation, active_z et active_c contiennent les écarts dz et dc
+        self.active_idx = np.empty(0, dtype=np.intp)
+        self.active_z = np.empty(0, dtype=self.cdtype)
+        self.active_c = np.empty(0, dtype=self.cdtype)
+        self.active_m = np.empty(0, dtype=np.intp if self.deep else self.cdtype)
+
+    def compute_pixels(self, idx):
+        """
+        Calcule les pixels d'indices plats 'idx' de l'itération 0 à max_iter, écrit leur
+        résultat dans 'result' et ajoute ceux qui restent actifs à l'ensemble compact.
+        """
+        PROFILER.count("pixels_computed", idx.size)
+        pixels = self._start_pixels(idx, self.result)
+        self._append_active(self._iterate_saved(pixels, 0))
+
+    def _start_pixels(self, idx, result):
+        """
+        Initialise 'result' et 'mask' pour les pixels d'indices plats 'idx' et écarte ceux de
+        la cardioïde. Retourne l'ensemble compact (idx, z, c, m) à itérer depuis 0 ;
+        m est la position dans l'orbite de référence en mode perturbation, la valeur
+        précédente de z pour une formule uses_prev, None sinon.
+        """
+        result.reshape(-1)[idx] = self.max_iter
+        self.mask.reshape(-1)[idx] = True
+        if self.deep:
+            c = self.points(idx) + self.ref_offset
+            c_abs = complex(self.reference.center_re, self.reference.center_im) + c
+        else:
+            c = self.points(idx)
+            c_abs = c
+        if self.interior_check and self.formula.mandelbrot_interior:
+            interior = in_cardioid_or_bulb(c_abs)
+            self.mask.ravel()[idx[interior]] = False
+            idx, c = idx[~interior], c[~interior]
+        z, c = self.formula.start(np, c, self.params)
+        m = None
+        if self.deep:
+            m = np.zeros(idx.size, dtype=np.intp)
+        elif self.formula.uses_prev:
+            m = np.zeros(idx.size, dtype=self.cdtype)
+        return idx, z, c, m
+
+    def sample(self, idx, jitter):
+        """
+        Calcule, de l'itération 0 à max_iter, les points décalés de 'jitter' pixels (partie
+        réelle : colonnes, partie imaginaire : lignes) par rapport aux pixels d'indices plats
+        'idx', sans toucher à l'état. Retourne leurs valeurs au format de 'result' ; sert au
+        suréchantillonnage des pixels de bord (voir antialias).
+        """
+        step_re, step_im = self.span_re / (self.width - 1), self.span_im / (self.height - 1)
+        c = self.points(idx) + (jitter.real * step_re + 1j * jitter.imag * step_im).astype(self.cdtype)
+        values = np.full(idx.size, self.max_iter, dtype=RESULT_DTYPE)
+        mask = np.ones(idx.size, dtype=bool)
+        local = np.arange(idx.size)
+        if self.deep:
+            c = c + self.ref_offset
+            c_abs = complex(self.reference.center_re, self.reference.center_im) + c
+        else:
+            c_abs = c
+        if self.interior_check and self.formula.mandelbrot_interior:
+            interior = in_cardioid_or_bulb(c_abs)
+            mask[interior] = False
+            local, c = local[~interior], c[~interior]
+        z, c = self.formula.start(np, c, self.params)
+        if self.deep:
+            self.reference.extend(self.max_iter)
+            iterate_perturbation(local, z, c, np.zeros(local.size, dtype=np.intp), self.reference.orbit, values,
+                                 mask, 0, self.max_iter, self.interior_check, min(PERIODICITY_EPS, self.step * 1e-6))
+        else:
+            prev = np.zeros_like(z) if self.formula.uses_prev else None
+            iterate_active(local, z, c, values, mask, 0, self.max_iter, self.interior_check,
+                           formula=self.formula, params=self.params, prev=prev)
+        return values
+
+    def _iterate_pixels(self, pixels, start, stop, result):
+        """
+        Itère l'ensemble compact 'pixels' de start à stop et retourne l'ensemble compacté.
+        """
+        idx, z, c, m = pixels
+        if self.deep:
+            self.reference.extend(stop)
+            # Tolérance de détection de cycle ramenée à l'échelle du pixel
+            return iterate_perturbation(idx, z, c, m, self.reference.orbit, result, self.mask,
+                                        start, stop, self.interior_check,
+                                        min(PERIODICITY_EPS, self.step * 1e-6), self.counts)
+        return iterate_active(idx, z, c, result, self.mask, start, stop, self.interior_check, self.counts,
+                              self.formula, self.params, m)
+
+    def _iterate_saved(self, pixels, start):
+        """
+        Itère l'ensemble compact 'pixels' de start à max_iter (voir _iterate_pixels) et
+        retourne l'ensemble compacté. Avec un point de reprise, les itérations sont
+        découpées en paquets dont la taille suit le temps mesuré, de sorte que l'état soit
+        enregistré toutes les checkpoint_interval secondes avec 'pixels' en cours de calcul.
+        """
+        if not self._checkpoint_ready():
+            return self._iterate_pixels(pixels, start, self.max_iter, self.result)
+        i, chunk = start, 1
+        while i < self.max_iter and pixels[0].size:
+            stop = min(i + chunk, self.max_iter)
+            t0 = time.perf_counter()
+            pixels = self._iterate_pixels(pixels, i, stop, self.result)
+            now = time.perf_counter()
+            if stop < self.max_iter:
+                self._save_checkpoint(pending=(pixels, stop))
+            left = self._checkpoint_time + self.checkpoint_interval - time.perf_counter()
+            chunk = max(1, int(left / max(now - t0, 1e-6) * (stop - i)))
+            i = stop
+        return pixels
+
+    def _append_active(self, pixels):
+        idx, z, c, m = pixels
+        self.active_idx = np.concatenate([self.active_idx, idx])
+        self.active_z = np.concatenate([self.active_z, z])
+        self.active_c = np.concatenate([self.active_c, c])
+        if m is not None:
+            self.active_m = np.concatenate([self.active_m, m])
+
+    def _iterate(self, start):
+        # Pendant le calcul, tous les pixels actifs sont "en cours" (voir _iterate_saved)
+        tracked = self.deep or self._tracks_prev()
+        pixels = (self.active_idx, self.active_z, self.active_c, self.active_m if tracked else None)
+        self._clear_active()
+        self._append_active(self._iterate_saved(pixels, start))
+
+    @property
+    def progressive_pending(self):
+        """
+        Vrai tant que des passes du rendu progressif restent à calculer.
+        """
+        return bool(self._passes) or self._pass is not None
+
+    def advance(self, budget_ms):
+        """
+        Poursuit le rendu progressif pendant environ budget_ms millisecondes.
+
+        La passe en cours est itérée par paquets dont la taille est ajustée au temps
+        mesuré par itération ; une passe terminée est recopiée dans 'result', puis les
+        pixels pas encore calculés reçoivent la valeur du pixel de grille le plus proche.
+        Retourne True si au moins une passe s'est terminée (l'image doit être réaffichée).
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        updated = False
+        chunk = 1
+        while self.progressive_pending:
+            if self._pass is None:
+                stride = self._passes.pop(0)
+                previous = stride * 2 if stride < PROGRESSIVE_STRIDES[0] else None
+                idx = np.flatnonzero(pass_mask(self.height, self.width, stride, previous) & self._todo)
+                self._pass = (stride, idx, self._start_pixels(idx, self._pass_result), 0)
+                PROFILER.count("pixels_computed", idx.size)
+                chunk = 1
+            stride, idx, pixels, i = self._pass
+            stop = min(i + chunk, self.max_iter)
+            t0 = time.perf_counter()
+            pixels = self._iterate_pixels(pixels, i, stop, self._pass_result)
+            now = time.perf_counter()
+            if stop >= self.max_iter or pixels[0].size == 0:
+                self._append_active(pixels)
+                self.result.reshape(-1)[idx] = self._pass_result.reshape(-1)[idx]
+                # Les pixels issus du cache de tuiles (et les images par symétrie) sont déjà définitifs
+                fill_from_grid(self.result, stride, keep=~self._todo)
+                if self._partner is not None:
+                    self._append_active(self._mirror_active(pixels))
+                    self._mirror_grids()
+                self._pass = None
+                updated = True
+                if not self.progressive_pending:
+                    self._partner = None
+                    self._store_tiles((0, self.height, 0, self.width))
+                    self._save_checkpoint()
+            else:
+                self._pass = (stride, idx, pixels, stop)
+                chunk = max(1, int((deadline - now) / max(now - t0, 1e-6) * (stop - i)))
+            if now >= deadline:
+                break
+        return updated
+
     def update_add_iterations(self, new_max_iter):
         """
         Ajoute des itérations supplémentaires si le domaine reste identique.
-        
-        Pour chaque itération additionnelle (de self.max_iter à new_max_iter), met à jour
-        les tableaux 'z', 'result' et 'mask' pour traiter uniquement les pixels encore actifs.
-        """
-        for i in range(self.max_iter, new_max_iter):
-            self.z[self.mask] = self.z[self.mask]**2 + self.c[self.mask]
-            diverged = np.abs(self.z) > 2
-            new_diverged = diverged & self.mask
-            if np.any(new_diverged):
-                self.result[new_diverged] = i + 1 - np.log(np.log(np.abs(self.z[new_diverged])))/np.log(2)
-                self.mask[new_diverged] = False
-        self.max_iter = new_max_iter
-    
+
+        Reprend directement à partir de l'état compact des pixels encore actifs,
+        pour les itérations de self.max_iter à new_max_iter. En mode mariani_silver, ou si
+        l'affinage d'un zoom a conservé des pixels de l'aperçu, ces zones n'ont pas d'état à
+        reprendre : la vue est alors recalculée, de même qu'un rendu progressif inachevé ou
+        une vue qui passe en complex128 (voir precision.SINGLE_PRECISION_MAX_ITER).
+        """
+        self._finish_refine()
+        if (self.mariani_silver or self.approximate or self.progressive_pending or
+                self._view_dtype(new_max_iter) != self.cdtype):
+            self.max_iter = new_max_iter
+            self.full_recompute()
+            return
+        # Pixels non échappés : intérieurs (y compris ceux déjà écartés) tant qu'ils ne
+        # s'échappent pas ; ceux qui s'échappent reçoivent leur valeur pendant le calcul
+        self.result[self.result == self.max_iter] = new_max_iter
+        start, self.max_iter = self.max_iter, new_max_iter
+        self._iterate(start)
+        self._store_tiles((0, self.height, 0, self.width))
+        self._save_checkpoint()
+
     def apply_translation(self, dx, dy):
         """
-        Applique une translation (déplacement) aux tableaux en utilisant np.roll et met à jour le domaine.
-        """
-        self.z = np.roll(self.z, shift=(dy, dx), axis=(0, 1))
-        self.result = np.roll(self.result, shift=(dy, dx), axis=(0, 1))
-        self.mask = np.roll(self.mask, shift=(dy, dx), axis=(0, 1))
-        scale_re = (self.re_end - self.re_start) / self.width
-        scale_im = (self.im_end - self.im_start) / self.height
-        self.re_start -= dx * scale_re
-        self.re_end   -= dx * scale_re
-        self.im_start -= dy * scale_im
-        self.im_end   -= dy * scale_im
+        Applique une translation (déplacement) de (dx, dy) pixels et met à jour le domaine.
+
+        La partie conservée de l'image est décalée (sans rebouclage) avec ses pixels actifs,
+        qui gardent leur propre c (ou dc et l'orbite de référence en mode perturbation).
+        Seule la bande en L découverte est calculée, jusqu'à max_iter : le coût suit le
+        nombre de pixels exposés et non la taille de la vue. Un rendu progressif inachevé
+        est abandonné et replanifié pour la nouvelle vue.
+        """
+        self._finish_refine()
+        self.center_re = shift(self.center_re, -dx * self.span_re / (self.width - 1))
+        self.center_im = shift(self.center_im, -dy * self.span_im / (self.height - 1))
+        self._set_bounds_from_center()
+        self.compute_grid()
+        if abs(dx) >= self.width or abs(dy) >= self.height or self.progressive_pending:
+            self.full_recompute()
+            return
+
+        dst, src = translation_slices(self.width, self.height, dx, dy)
+        for name, fill in (("result", self.max_iter), ("mask", True), ("counts", 0)):
+            old = getattr(self, name)
+            if old is None:
+                continue
+            new = np.full_like(old, fill)
+            new[dst] = old[src]
+            setattr(self, name, new)
+
+        rows = self.active_idx // self.width + dy
+        cols = self.active_idx % self.width + dx
+        keep = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        self.active_idx = rows[keep] * self.width + cols[keep]
+        self.active_z = self.active_z[keep]
+        self.active_c = self.active_c[keep]
+        if self.deep or self._tracks_prev():
+            self.active_m = self.active_m[keep]
+        if self.deep:
+            # Les nouveaux pixels sont exprimés par rapport au centre de l'orbite de référence
+            self.ref_offset = complex(self.center_re - self.reference.center_re,
+                                      self.center_im - self.reference.center_im)
+
+        rects = exposed_rects(self.width, self.height, dx, dy)
+        # Les bandes sont calculées en un seul lot : l'état reste enregistrable pendant le calcul
+        todo = np.zeros((self.height, self.width), dtype=bool)
+        for rect in rects:
+            todo |= self._assemble(rect)
+        self.compute_pixels(np.flatnonzero(todo))
+        for rect in rects:
+            self._store_tiles(rect)
+        self._save_checkpoint()
+
+    def zoom_center(self, factor, new_max_iter):
+        """
+        Zoome d'un facteur 'factor' autour du centre de la vue, en conservant le centre
+        en haute précision (indispensable au-delà des limites du float64).
+
+        Avec zoom_reuse, l'image précédente est seulement projetée sur le nouveau domaine :
+        'result' contient aussitôt cet aperçu et le calcul réel est laissé à refine().
+        """
+        self.span_re *= factor
+        self.span_im *= factor
+        self._set_bounds_from_center()
+        old_max_iter = self.max_iter
+        self.max_iter = new_max_iter
+        self._update_precision_mode()
+        self.compute_grid()
+        if not self.zoom_reuse or self.mariani_silver:
+            self.full_recompute()
+            return
+        previous = self.seed if self.refine_pending else self.result
+        seed = resample_previous(previous, factor)
+        # Les pixels intérieurs de la vue précédente le restent au nouveau max_iter
+        seed[seed >= old_max_iter] = new_max_iter
+        self._reset()
+        self.seed = seed
+        self.result = np.where(np.isnan(seed), new_max_iter, seed).astype(RESULT_DTYPE)
+        self.refine_pending = True
+
+    def refine(self):
+        """
+        Étape d'affinage qui suit un zoom avec réutilisation.
+
+        Les pixels de bord (voisinage non uniforme dans l'aperçu) sont itérés complètement.
+        Dans les zones uniformes, un pixel par bloc est recalculé pour vérifier l'aperçu :
+        les blocs contredits sont recalculés entièrement, les autres gardent l'aperçu.
+        Met à jour computed_fraction (part des pixels réellement itérés).
+        """
+        seed = self.seed
+        self._reset()
+        accepted = refine_from_seed(self, seed)
+        self.approximate = bool(accepted.any())
+        self.computed_fraction = 1.0 - accepted.sum() / accepted.size
+        self._resumable = True
+        self._store_tiles((0, self.height, 0, self.width))
+        self._save_checkpoint()
+
+    def _finish_refine(self):
+        if self.refine_pending:
+            self.refine()
+
+    def _cache_enabled(self):
+        return self.tile_cache is not None and not self.deep and not self.mariani_silver
+
+    def _tile_key(self, tx, ty):
+        # Le type complexe en fait partie : une tuile calculée en complex64 ne sert jamais
+        # de point de reprise à une vue calculée en complex128
+        return (self.fractal_type, self.formula.cache_key(self.params), self.level, np.dtype(self.cdtype).str,
+                tx, ty)
+
+    def _assemble(self, rect):
+        """
+        Remplit depuis le cache de tuiles les pixels du rectangle 'rect' = (y0, y1, x0, x1).
+
+        Une tuile calculée avec le même max_iter est recopiée telle quelle (ses pixels actifs
+        rejoignent l'ensemble compact) ; une tuile calculée avec moins d'itérations est
+        reprise à partir de ses 'z' (et 'z_prev' pour une formule uses_prev). Retourne le
+        masque des pixels qui restent à calculer.
+        """
+        y0, y1, x0, x1 = rect
+        todo = np.zeros((self.height, self.width), dtype=bool)
+        todo[y0:y1, x0:x1] = True
+        if not self._cache_enabled():
+            return todo
+        flat = np.arange(self.width * self.height, dtype=np.intp).reshape(self.height, self.width)
+        resumed = {}
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            found = self.tile_cache.lookup(self._tile_key(tx, ty), self.max_iter)
+            if found is None:
+                continue
+            entry_max_iter, arrays = found
+            status = arrays["status"][tile]
+            active = status == ACTIVE
+            self.result[view] = np.where(status == ESCAPED, arrays["result"][tile], self.max_iter)
+            self.mask[view] = active
+            todo[view] = False
+            idx = flat[view][active]
+            c = self.formula.start(np, self.points(idx), self.params)[1]
+            m = arrays["z_prev"][tile][active].astype(self.cdtype) if self.formula.uses_prev else None
+            pixels = (idx, arrays["z"][tile][active].astype(self.cdtype), c, m)
+            if entry_max_iter == self.max_iter:
+                self._append_active(pixels)
+            else:
+                resumed.setdefault(entry_max_iter, []).append(pixels)
+        for start, groups in resumed.items():
+            pixels = tuple(None if p[0] is None else np.concatenate(p) for p in zip(*groups))
+            self._append_active(self._iterate_pixels(pixels, start, self.max_iter, self.result))
+        return todo
+
+    def _store_tiles(self, rect):
+        """
+        Enregistre dans le cache les tuiles entièrement visibles qui recouvrent 'rect'.
+        Rien n'est enregistré tant que la vue n'est pas définitive.
+        """
+        if not self._cache_enabled() or self.approximate or self.refine_pending or self.progressive_pending:
+            return
+        active = {"z": self.active_z}
+        if self._tracks_prev():
+            active["z_prev"] = self.active_m
+        grids = {}
+        for name, values in active.items():
+            grid = np.zeros(self.width * self.height, dtype=self.cdtype)
+            grid[self.active_idx] = values
+            grids[name] = grid.reshape(self.height, self.width)
+        status = pixel_status(self.result, self.mask, self.max_iter)
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            if self.result[view].shape != (TILE_SIZE, TILE_SIZE):
+                continue
+            self.tile_cache.store(self._tile_key(tx, ty), self.max_iter, result=self.result[view],
+                                  status=status[view], **{name: grid[view] for name, grid in grids.items()})
+
+    def _checkpoint_ready(self):
+        return (self.checkpoint is not None and self._resumable and not self.deep and not self.mariani_silver
+                and not self.refine_pending and not self.progressive_pending)
+
+    def _save_checkpoint(self, pending=None, force=False):
+        """
+        Enregistre l'état dans le fichier 'checkpoint' si checkpoint_interval secondes se sont
+        écoulées depuis le précédent enregistrement (ou avec 'force'). 'pending' = (pixels,
+        itération) est l'ensemble compact en cours de calcul et l'itération qu'il a atteinte ;
+        il est enregistré avec les paires de pixels symétriques qui restent à recopier.
+        Le point c des pixels n'est pas enregistré : il est recalculé à la reprise.
+        """
+        if not self._checkpoint_ready():
+            return
+        if not force and time.perf_counter() - self._checkpoint_time < self.checkpoint_interval:
+            return
+        with PROFILER.span("state.checkpoint"):
+            meta = {"size": [self.width, self.height], "fractal_type": self.fractal_type,
+                    "params": self.formula.cache_key(self.params), "precision": self.precision,
+                    "interior_check": self.interior_check,
+                    "bounds": [self.re_start, self.re_end, self.im_start, self.im_end],
+                    "center": [str(self.center_re), str(self.center_im)], "span": [self.span_re, self.span_im],
+                    "max_iter": self.max_iter, "iteration": self.max_iter, "mirror": None,
+                    "approximate": self.approximate}
+            arrays = {"result": self.result, "mask": self.mask, "active_idx": self.active_idx,
+                      "active_z": self.active_z}
+            if self._tracks_prev():
+                arrays["active_m"] = self.active_m
+            if pending is not None:
+                (idx, z, c, m), meta["iteration"] = pending
+                arrays.update(pending_idx=idx, pending_z=z)
+                if m is not None:
+                    arrays["pending_m"] = m
+                if self._partner is not None:
+                    meta["mirror"], arrays["mirror_dst"], arrays["mirror_src"] = self._mirror
+            write_checkpoint(self.checkpoint, meta, arrays)
+        self._checkpoint_time = time.perf_counter()
+
+    def _resume_checkpoint(self):
+        """
+        Rattache l'état au fichier 'checkpoint' s'il existe et a été enregistré pour la même
+        taille, la même précision et les mêmes options de calcul : les tableaux sont
+        projetés depuis le fichier (voir checkpoint.read_checkpoint) au lieu d'être copiés,
+        puis les pixels en cours de calcul sont itérés jusqu'à max_iter. Retourne True si
+        l'état a été repris.
+        """
+        try:
+            meta, arrays = read_checkpoint(self.checkpoint)
+        except (OSError, ValueError):
+            return False
+        if (meta["size"] != [self.width, self.height] or meta["precision"] != self.precision
+                or meta["interior_check"] != self.interior_check):
+            return False
+        self.fractal_type = meta["fractal_type"]
+        self.formula_params = bound_params(meta["params"])
+        self._bind_formula()
+        self.re_start, self.re_end, self.im_start, self.im_end = meta["bounds"]
+        self.center_re, self.center_im = (Decimal(value) for value in meta["center"])
+        self.span_re, self.span_im = meta["span"]
+        self.max_iter = meta["max_iter"]
+        self._update_precision_mode()
         self.compute_grid()
-    
+        self._reset()
+        self.computed_fraction = 0.0
+        # Une vue affinée qui a gardé des pixels de l'aperçu le reste (voir update_add_iterations)
+        self.approximate = meta["approximate"]
+        self.result, self.mask = arrays["result"], arrays["mask"]
+        self.active_idx, self.active_z, self.active_c, m = self._saved_pixels(arrays, "active")
+        if m is not None:
+            self.active_m = m
+        self._resumable = True
+        if "pending_idx" in arrays:
+            if meta["mirror"] is not None:
+                dst, src = arrays["mirror_dst"], arrays["mirror_src"]
+                self._mirror = (meta["mirror"], dst, src)
+                self._partner = np.full(self.width * self.height, -1, dtype=np.intp)
+                self._partner[src] = dst
+            pixels = self._saved_pixels(arrays, "pending")
+            self.computed_fraction = pixels[0].size / self.result.size
+            self._append_active(self._iterate_saved(pixels, meta["iteration"]))
+            self._finish_mirror()
+            self._store_tiles((0, self.height, 0, self.width))
+        self._save_checkpoint()
+        return True
+
+    def _saved_pixels(self, arrays, prefix):
+        # Ensemble compact enregistré sous 'prefix' ; c est recalculé depuis la grille
+        idx = arrays[prefix + "_idx"]
+        c = self.formula.start(np, self.points(idx), self.params)[1]
+        m = arrays[prefix + "_m"] if self._tracks_prev() else None
+        return idx, arrays[prefix + "_z"], c, m
+
+    def close(self):
+        """
+        Enregistre une dernière fois l'état dans le fichier 'checkpoint', s'il y a lieu.
+        """
+        self._save_checkpoint(force=True)
+
+    def reset_view(self):
+        """
+        Réinitialise la vue aux paramètres initiaux.
+        """
+        re_start, re_end, im_start, im_end, max_iter = self.init_params
+        self._set_domain(re_start, re_end, im_start, im_end)
+        self.max_iter = max_iter
+        self.compute_grid()
+        self.full_recompute()
+
     def update_zoom(self, new_re_start, new_re_end, new_im_start, new_im_end, new_max_iter):
         """
         Met à jour le domaine et le nombre d'itérations.
-        
+
         Si le domaine reste identique (à un epsilon près) et que new_max_iter est supérieur,
         effectue seulement les itérations supplémentaires (update incrémental). Sinon, refait un recalcul complet.
         """
-        if (abs(new_re_start - self.re_start) < 1e-9 and abs(new_re_end - self.re_end) < 1e-9 and
-            abs(new_im_start - self.im_start) < 1e-9 and abs(new_im_end - self.im_end) < 1e-9 and
-            new_max_iter > self.max_iter):
+        # La tolérance suit la taille d'un pixel pour rester valable en zoom profond
+        eps = min(1e-9, 1e-3 * self.span_re / self.width)
+        same_domain = (abs(new_re_start - self.re_start) < eps and abs(new_re_end - self.re_end) < eps and
+                       abs(new_im_start - self.im_start) < eps and abs(new_im_end - self.im_end) < eps)
+        if same_domain and new_max_iter > self.max_iter:
             self.update_add_iterations(new_max_iter)
         else:
-            self.re_start = new_re_start
-            self.re_end = new_re_end
-            self.im_start = new_im_start
-            self.im_end = new_im_end
+            if not same_domain:
+                self._set_domain(new_re_start, new_re_end, new_im_start, new_im_end)
             self.max_iter = new_max_iter
             self.compute_grid()
             self.full_recompute()
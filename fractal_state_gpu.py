@@ -1,15 +1,42 @@
 # fractal_state_gpu.py
 import cupy as cp
-import ui  # Pour accéder à UI_OPTIONS
+import numpy as np
+from formulas import get_formula
+from instrumentation import PROFILER
+from fractal_state_cpu import exposed_rects, iterate_active, translation_slices
+from precision import RESULT_DTYPE, complex_dtype
+from symmetry import centered_axis, mirror_orbit, mirror_pairs
+from tile_cache import ACTIVE, ESCAPED, TILE_SIZE, lattice_origin, level_key, pixel_status, view_tiles
 
 class FractalStateGPU:
     """
-    Calcule la fractale sur le GPU avec CuPy et supporte plusieurs formules :
-      - Mandelbrot, Julia, Burning Ship, Custom,
-      - Tricorn, Multibrot3, Phoenix et Perpendicular.
+    Calcule la fractale sur le GPU avec CuPy et supporte toutes les formules du registre
+    formulas.FORMULAS (Mandelbrot, Julia, Burning Ship, Custom, Tricorn, Multibrot3,
+    Phoenix, Perpendicular et celles ajoutées par register_formula). La formule et ses
+    paramètres ('fractal_type', 'formula_params') sont liés au début de chaque recalcul
+    complet ; les pixels actifs sont rassemblés une seule fois en un ensemble compact
+    itéré jusqu'à max_iter (voir _run).
+
+    Avec interior_check, les points de la cardioïde principale et du bourgeon de
+    période 2 (Mandelbrot) sont écartés d'emblée et les orbites devenues périodiques
+    (détection de Brent, toutes formules) sont retirées sans modifier l'image.
+
+    Avec un tile_cache, les vues sont assemblées à partir des tuiles déjà calculées pour
+    la même formule et les mêmes paramètres (voir FractalStateCPU).
+
+    Selon 'precision' (voir precision.complex_dtype), les vues peu profondes à peu
+    d'itérations sont calculées en complex64 ; 'result' est stocké en float32.
+
+    Avec symmetry, un recalcul complet n'itère que les pixels sans image par la symétrie
+    de la formule dans la vue ; les autres sont recopiés (voir FractalStateCPU).
     """
     
-    def __init__(self, width, height, max_iter, re_start, re_end, im_start, im_end, fractal_type="Mandelbrot"):
+    def __init__(self, width, height, max_iter, re_start, re_end, im_start, im_end, fractal_type="Mandelbrot",
+                 interior_check=True, tile_cache=None, precision="auto", formula_params=None, symmetry=True):
+        self.interior_check = interior_check
+        self.symmetry = symmetry
+        self.precision = precision
+        self.tile_cache = tile_cache
         self.width = width
         self.height = height
         self.max_iter = max_iter
@@ -18,80 +45,185 @@ class FractalStateGPU:
         self.im_start = im_start
         self.im_end = im_end
         self.fractal_type = fractal_type
+        self.formula_params = formula_params
         # Sauvegarde des paramètres initiaux pour le Reset Zoom
         self.init_params = (re_start, re_end, im_start, im_end, max_iter)
         self.compute_grid()
         self.full_recompute()
     
+    def _view_dtype(self):
+        # Type complexe de la vue en max_iter itérations (voir precision.complex_dtype)
+        step = max((self.re_end - self.re_start) / (self.width - 1),
+                   (self.im_end - self.im_start) / (self.height - 1))
+        return complex_dtype(self.precision, (self.re_start + self.re_end) / 2,
+                             (self.im_start + self.im_end) / 2, step, self.max_iter)
+
     def compute_grid(self):
-        re = cp.linspace(self.re_start, self.re_end, self.width)
-        im = cp.linspace(self.im_start, self.im_end, self.height)
-        self.c = re[cp.newaxis, :] + 1j * im[:, cp.newaxis]
+        self.cdtype = self._view_dtype()
+        if self.tile_cache is not None:
+            # Position de la vue dans le réseau des tuiles du cache (sa grille n'est pas déplacée)
+            step_re = (self.re_end - self.re_start) / (self.width - 1)
+            step_im = (self.im_end - self.im_start) / (self.height - 1)
+            self.origin, phase = lattice_origin(self.re_start, self.im_start, step_re, step_im)
+            self.level = level_key(step_re, step_im, phase)
+        re = centered_axis(self.re_start, self.re_end, self.width, cp)
+        im = centered_axis(self.im_start, self.im_end, self.height, cp)
+        self.c = (re[cp.newaxis, :] + 1j * im[:, cp.newaxis]).astype(self.cdtype)
     
     def full_recompute(self):
-        # Initialisation de z selon la formule
-        if self.fractal_type in ["Julia", "Custom"]:
-            self.z = self.c.copy()
-        else:
-            self.z = cp.zeros((self.height, self.width), dtype=cp.complex128)
+        # Formule et paramètres lus une seule fois pour tout le calcul
+        self.formula = get_formula(self.fractal_type)
+        self.params = self.formula.bind(self.formula_params)
         # Variables pour le calcul itératif
-        self.result = cp.full((self.height, self.width), self.max_iter, dtype=cp.float64)
-        self.mask = cp.ones((self.height, self.width), dtype=bool)
+        self.z = cp.zeros((self.height, self.width), dtype=self.cdtype)
+        self.result = cp.full((self.height, self.width), self.max_iter, dtype=RESULT_DTYPE)
+        self.mask = cp.zeros((self.height, self.width), dtype=bool)
         # Pour Phoenix, on garde z_prev (initialisé à 0)
         self.z_prev = cp.zeros_like(self.z)
-        for i in range(self.max_iter):
-            self.iterate(i)
+        view = (0, self.height, 0, self.width)
+        pixels = self._assemble(view)
+        mirror = self._plan_mirror(pixels)
+        self._iterate_pixels(pixels)
+        if mirror is not None:
+            kind, dst, src = mirror
+            for grid in (self.result, self.mask):
+                grid.reshape(-1)[dst] = grid.reshape(-1)[src]
+            z, z_prev = mirror_orbit(kind, self.z.reshape(-1)[src], self.z_prev.reshape(-1)[src], xp=cp)
+            self.z.reshape(-1)[dst] = z
+            self.z_prev.reshape(-1)[dst] = z_prev
+        self._store_tiles(view)
+
+    def _plan_mirror(self, pixels):
+        """
+        Retire du masque 'pixels' les pixels images d'un autre par la symétrie de la formule
+        (points exactement opposés de la grille, voir symmetry.mirror_pairs). Retourne
+        (type, images, sources) sur le GPU, ou None.
+        """
+        kind = self.formula.symmetry_for(self.params)
+        if not self.symmetry or kind is None:
+            return None
+        dst, src = mirror_pairs(cp.asnumpy(self.c[0].real), cp.asnumpy(self.c[:, 0].imag), kind)
+        dst, src = cp.asarray(dst), cp.asarray(src)
+        planned = pixels.reshape(-1)[dst]
+        if not bool(planned.any()):
+            return None
+        dst, src = dst[planned], src[planned]
+        pixels.reshape(-1)[dst] = False
+        return kind, dst, src
     
-    def iterate(self, i):
-        if self.fractal_type == "Mandelbrot":
-            self.z[self.mask] = self.z[self.mask]**2 + self.c[self.mask]
-        elif self.fractal_type == "Julia":
-            self.z[self.mask] = self.z[self.mask]**2 + (-0.7 + 0.27015j)
-        elif self.fractal_type == "Burning Ship":
-            z = self.z[self.mask]
-            z = cp.abs(z.real) + 1j * cp.abs(z.imag)
-            self.z[self.mask] = z**2 + self.c[self.mask]
-        elif self.fractal_type == "Custom":
-            custom_c = ui.UI_OPTIONS["custom_re"] + 1j * ui.UI_OPTIONS["custom_im"]
-            self.z[self.mask] = self.z[self.mask]**2 + custom_c
-        elif self.fractal_type == "Tricorn":
-            # Utilise le conjugué : z = conj(z)^2 + c
-            self.z[self.mask] = cp.conj(self.z[self.mask])**2 + self.c[self.mask]
-        elif self.fractal_type == "Multibrot3":
-            self.z[self.mask] = self.z[self.mask]**3 + self.c[self.mask]
-        elif self.fractal_type == "Phoenix":
-            # p constant, par exemple -0.5
-            p = -0.5
-            temp = self.z[self.mask]
-            self.z[self.mask] = self.z[self.mask]**2 + p * self.z_prev[self.mask] + self.c[self.mask]
-            self.z_prev[self.mask] = temp
-        elif self.fractal_type == "Perpendicular":
-            # Variation : inverser le signe de la partie imaginaire après avoir pris l'absolu
-            z = self.z[self.mask]
-            self.z[self.mask] = (cp.abs(z.real) + 1j * -cp.abs(z.imag))**2 + self.c[self.mask]
-        
-        diverged = cp.abs(self.z) > 2
-        new_diverged = diverged & self.mask
-        if cp.any(new_diverged):
-            self.result[new_diverged] = i + 1 - cp.log(cp.log(cp.abs(self.z[new_diverged])))/cp.log(2)
-            self.mask[new_diverged] = False
+    def _iterate_pixels(self, pixels):
+        """
+        Initialise puis itère de 0 à max_iter les seuls pixels indiqués par le masque 'pixels' ;
+        les pixels déjà actifs ailleurs sont mis de côté pendant ce calcul.
+        """
+        retained = self.mask & ~pixels
+        if PROFILER.enabled:
+            PROFILER.count("pixels_computed", int(pixels.sum()))
+        # Initialisation de z selon la formule
+        self.z[pixels] = self.c[pixels] if self.formula.julia else 0
+        self.z_prev[pixels] = 0
+        self.result[pixels] = self.max_iter
+        self.mask = pixels.copy()
+        if self.interior_check and self.formula.mandelbrot_interior:
+            x = self.c.real - 0.25
+            y2 = self.c.imag ** 2
+            q = x * x + y2
+            interior = (q * (q + x) <= 0.25 * y2) | ((self.c.real + 1.0) ** 2 + y2 <= 0.0625)
+            self.mask[interior] = False
+        self._run(0)
+        self.mask |= retained
+
+    def sample(self, idx, jitter):
+        """
+        Équivalent de FractalStateCPU.sample : les points décalés de 'jitter' pixels sont
+        itérés par le même code que la vue (iterate), dans des tableaux temporaires qui
+        remplacent le temps du calcul ceux de l'état. Retourne leurs valeurs sur l'hôte.
+        """
+        saved = (self.c, self.z, self.z_prev, self.result, self.mask)
+        step_re = (self.re_end - self.re_start) / (self.width - 1)
+        step_im = (self.im_end - self.im_start) / (self.height - 1)
+        offsets = cp.asarray(jitter.real * step_re + 1j * jitter.imag * step_im)
+        try:
+            self.c = (self.c.ravel()[cp.asarray(idx)] + offsets).astype(self.cdtype)
+            self.z = cp.zeros(idx.size, dtype=self.cdtype)
+            self.z_prev = cp.zeros_like(self.z)
+            self.result = cp.full(idx.size, self.max_iter, dtype=RESULT_DTYPE)
+            self.mask = cp.zeros(idx.size, dtype=bool)
+            self._iterate_pixels(cp.ones(idx.size, dtype=bool))
+            return cp.asnumpy(self.result)
+        finally:
+            self.c, self.z, self.z_prev, self.result, self.mask = saved
+
+    def _resume_pixels(self, pixels, start):
+        """
+        Reprend à l'itération 'start' les pixels actifs du masque 'pixels' (tuiles du cache
+        calculées avec moins d'itérations), jusqu'à max_iter.
+        """
+        retained = self.mask & ~pixels
+        self.mask &= pixels
+        self._run(start)
+        self.mask |= retained
+
+    def _run(self, start):
+        """
+        Itère de 'start' à max_iter les pixels actifs : leurs z, c (et z_prev) sont rassemblés
+        une seule fois en un ensemble compact, itéré sur le GPU par
+        fractal_state_cpu.iterate_active, qui en retire les pixels échappés ou périodiques
+        sans parcourir la grille ; l'état des pixels encore actifs y est replacé à la fin.
+        """
+        formula = self.formula
+        idx = cp.flatnonzero(self.mask)
+        z = self.z.reshape(-1)[idx]
+        c = cp.full_like(z, self.params["c"]) if formula.julia else self.c.reshape(-1)[idx]
+        prev = self.z_prev.reshape(-1)[idx] if formula.uses_prev else None
+        idx, z, c, prev = iterate_active(idx, z, c, self.result, self.mask, start, self.max_iter,
+                                         self.interior_check, None, formula, self.params, prev, xp=cp)
+        self.z.reshape(-1)[idx] = z
+        if prev is not None:
+            self.z_prev.reshape(-1)[idx] = prev
 
     def update_add_iterations(self, new_max_iter):
-        for i in range(self.max_iter, new_max_iter):
-            self.iterate(i)
-        self.max_iter = new_max_iter
+        old_max_iter, self.max_iter = self.max_iter, new_max_iter
+        if self._view_dtype() != self.cdtype:
+            # La vue passe en complex128 (voir precision.SINGLE_PRECISION_MAX_ITER) : recalcul complet
+            self.compute_grid()
+            self.full_recompute()
+            return
+        # Pixels non échappés : intérieurs (y compris ceux déjà écartés) tant qu'ils ne s'échappent pas
+        interior = self.result == old_max_iter
+        self._run(old_max_iter)
+        interior &= self.result == old_max_iter
+        self.result[interior] = new_max_iter
+        self._store_tiles((0, self.height, 0, self.width))
     
     def apply_translation(self, dx, dy):
-        self.z = cp.roll(self.z, shift=(dy, dx), axis=(0, 1))
-        self.result = cp.roll(self.result, shift=(dy, dx), axis=(0, 1))
-        self.mask = cp.roll(self.mask, shift=(dy, dx), axis=(0, 1))
-        scale_re = (self.re_end - self.re_start) / self.width
-        scale_im = (self.im_end - self.im_start) / self.height
+        """
+        Décale la partie conservée de l'image (sans rebouclage) et ne calcule que la bande
+        en L découverte par la translation.
+        """
+        scale_re = (self.re_end - self.re_start) / (self.width - 1)
+        scale_im = (self.im_end - self.im_start) / (self.height - 1)
         self.re_start -= dx * scale_re
         self.re_end   -= dx * scale_re
         self.im_start -= dy * scale_im
         self.im_end   -= dy * scale_im
         self.compute_grid()
+        if abs(dx) >= self.width or abs(dy) >= self.height:
+            self.full_recompute()
+            return
+        dst, src = translation_slices(self.width, self.height, dx, dy)
+        for name in ("z", "z_prev", "result", "mask"):
+            old = getattr(self, name)
+            new = cp.zeros_like(old)
+            new[dst] = old[src]
+            setattr(self, name, new)
+        rects = exposed_rects(self.width, self.height, dx, dy)
+        exposed = cp.zeros((self.height, self.width), dtype=bool)
+        for rect in rects:
+            exposed |= self._assemble(rect)
+        self._iterate_pixels(exposed)
+        for rect in rects:
+            self._store_tiles(rect)
     
     def update_zoom(self, new_re_start, new_re_end, new_im_start, new_im_end, new_max_iter):
         if (abs(new_re_start - self.re_start) < 1e-9 and abs(new_re_end - self.re_end) < 1e-9 and
@@ -107,6 +239,19 @@ class FractalStateGPU:
             self.compute_grid()
             self.full_recompute()
     
+    def zoom_center(self, factor, new_max_iter):
+        """
+        Zoome d'un facteur 'factor' autour du centre de la vue.
+        Le calcul se fait au plus en float64 : les vues plus petites qu'environ 1e-13 y deviennent pixellisées
+        (avec BACKEND = "auto", fractal_app les confie alors à un moteur CPU en mode perturbation).
+        """
+        center_re = (self.re_start + self.re_end) / 2
+        center_im = (self.im_start + self.im_end) / 2
+        width_range = (self.re_end - self.re_start) * factor
+        height_range = (self.im_end - self.im_start) * factor
+        self.update_zoom(center_re - width_range / 2, center_re + width_range / 2,
+                         center_im - height_range / 2, center_im + height_range / 2, new_max_iter)
+    
     def reset_view(self):
         """
         Réinitialise la vue aux paramètres initiaux.
@@ -114,3 +259,53 @@ class FractalStateGPU:
         self.re_start, self.re_end, self.im_start, self.im_end, self.max_iter = self.init_params
         self.compute_grid()
         self.full_recompute()
+
+    def _tile_key(self, tx, ty):
+        # Le type complexe en fait partie : une tuile calculée en complex64 ne sert jamais
+        # de point de reprise à une vue calculée en complex128
+        return (self.fractal_type, self.formula.cache_key(self.params), self.level, np.dtype(self.cdtype).str,
+                tx, ty)
+
+    def _assemble(self, rect):
+        """
+        Remplit depuis le cache de tuiles les pixels du rectangle 'rect' = (y0, y1, x0, x1)
+        et reprend jusqu'à max_iter les tuiles calculées avec moins d'itérations. Retourne
+        le masque (sur le GPU) des pixels qui restent à calculer.
+        """
+        y0, y1, x0, x1 = rect
+        todo = np.zeros((self.height, self.width), dtype=bool)
+        todo[y0:y1, x0:x1] = True
+        if self.tile_cache is None:
+            return cp.asarray(todo)
+        resumed = {}
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            found = self.tile_cache.lookup(self._tile_key(tx, ty), self.max_iter)
+            if found is None:
+                continue
+            entry_max_iter, arrays = found
+            status = arrays["status"][tile]
+            self.result[view] = cp.asarray(np.where(status == ESCAPED, arrays["result"][tile], self.max_iter))
+            self.mask[view] = cp.asarray(status == ACTIVE)
+            self.z[view] = cp.asarray(arrays["z"][tile])
+            self.z_prev[view] = cp.asarray(arrays["z_prev"][tile])
+            todo[view] = False
+            if entry_max_iter < self.max_iter:
+                resumed.setdefault(entry_max_iter, np.zeros_like(todo))[view] = True
+        for start, pixels in resumed.items():
+            self._resume_pixels(cp.asarray(pixels), start)
+        return cp.asarray(todo)
+
+    def _store_tiles(self, rect):
+        """
+        Enregistre dans le cache les tuiles entièrement visibles qui recouvrent 'rect'.
+        """
+        if self.tile_cache is None:
+            return
+        result, mask = cp.asnumpy(self.result), cp.asnumpy(self.mask)
+        z, z_prev = cp.asnumpy(self.z), cp.asnumpy(self.z_prev)
+        status = pixel_status(result, mask, self.max_iter)
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            if result[view].shape != (TILE_SIZE, TILE_SIZE):
+                continue
+            self.tile_cache.store(self._tile_key(tx, ty), self.max_iter, result=result[view],
+                                  z=z[view], z_prev=z_prev[view], status=status[view])
@@ -0,0 +1,678 @@
+# fractal_state_mp.py
+import os
+import signal
+import time
+import weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from formulas import get_formula
+from fractal_state_cpu import (PERIODICITY_EPS, exposed_rects, in_cardioid_or_bulb, iterate_active,
+                               translation_slices)
+from instrumentation import PROFILER
+from perturbation import (ReferenceOrbit, iterate_perturbation, midpoint, needs_perturbation,
+                          pixel_offsets, shift)
+from precision import RESULT_DTYPE, complex_dtype
+from progressive import PROGRESSIVE_STRIDES, fill_from_grid, pass_mask
+from symmetry import centered_axis, mirror_orbit, mirror_pairs
+from tile_cache import TILE_SIZE as CACHE_TILE_SIZE
+from tile_cache import ACTIVE, ESCAPED, lattice_origin, level_key, pixel_status, view_tiles
+from zoom_reuse import refine_from_seed, resample_previous
+
+# Côté d'une tuile en pixels. Des tuiles petites et nombreuses permettent
+# d'équilibrer la charge : celles qui touchent le bord de l'ensemble coûtent
+# beaucoup plus cher que celles situées à l'extérieur.
+TILE_SIZE = 64
+
+# Tableaux partagés entre le processus principal et les processus de travail. En mode
+# perturbation, 'ref_index' est la position de chaque pixel dans l'orbite de référence.
+# 'todo' marque les pixels à calculer depuis l'itération 0.
+SHARED_ARRAYS = (("result", RESULT_DTYPE), ("mask", bool), ("ref_index", np.intp), ("todo", bool))
+
+# Orbites partagées, dans le type complexe de la vue : 'z' (les écarts dz en mode
+# perturbation) et 'z_prev', valeur précédente de z pour les formules uses_prev (Phoenix).
+# Elles sont réallouées quand ce type change (voir FractalStateMP._allocate_orbits).
+ORBIT_ARRAYS = ("z", "z_prev")
+
+# Tableaux partagés attachés dans chaque processus de travail (voir _init_worker et
+# _attach_orbits), forme des grilles et noms des blocs d'orbites attachés.
+_shared = {}
+_shape = None
+_orbit_names = None
+
+# Numéro de génération partagé : une tâche d'une génération périmée est ignorée.
+_generation = None
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(names, shape, generation):
+    """
+    Initialise un processus de travail : attache les blocs de mémoire partagée
+    (voir SHARED_ARRAYS) et le compteur de génération une fois pour toutes.
+    """
+    global _generation, _shape
+    # Le gestionnaire de SIGTERM installé par SDL (pygame.init) est hérité lors du fork :
+    # sans le rétablir, pool.terminate() peut attendre indéfiniment la fin d'un processus.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for key, dtype in SHARED_ARRAYS:
+        _shared[key] = _attach(names[key], shape, dtype)
+    _generation = generation
+    _shape = shape
+
+
+def _attach_orbits(names, cdtype):
+    """
+    Attache les blocs 'z' et 'z_prev' nommés 'names' (voir ORBIT_ARRAYS), dans le type
+    'cdtype', s'ils ne le sont pas déjà ; les blocs précédents sont détachés.
+    """
+    global _orbit_names
+    if names == _orbit_names:
+        return
+    for key, name in zip(ORBIT_ARRAYS, names):
+        previous = _shared.pop(key, None)
+        if previous is not None:
+            shm = previous[0]
+            del previous
+            shm.close()
+        _shared[key] = _attach(name, _shape, cdtype)
+    _orbit_names = names
+
+
+def _load_tile(tile, start, stop, c_abs, interior_check):
+    """
+    Prépare une tuile : copie locale de 'result' et 'mask', et indices des pixels à itérer.
+
+    Pour start == 0, seuls les pixels marqués dans la grille partagée 'todo' sont
+    (ré)initialisés ; les autres pixels de la tuile sont laissés tels quels. Sinon, le
+    calcul reprend sur les pixels encore actifs. Retourne (result, mask, idx, fresh).
+    """
+    result = _shared["result"][1][tile].copy()
+    mask = _shared["mask"][1][tile].copy()
+    if start == 0:
+        todo = _shared["todo"][1][tile].ravel()
+        result.ravel()[todo] = stop
+        mask.ravel()[todo] = True
+        if interior_check:
+            interior = in_cardioid_or_bulb(c_abs) & todo
+            mask.ravel()[interior] = False
+            todo = todo & ~interior
+        return result, mask, np.flatnonzero(todo), True
+    return result, mask, np.flatnonzero(mask), False
+
+
+def _store_tile(tile, result, mask, idx, **active):
+    """
+    Recopie une tuile dans la mémoire partagée ; les tableaux de 'active' (z, ref_index)
+    ne sont écrits qu'aux positions idx des pixels restés actifs.
+    """
+    for key, values in active.items():
+        local = _shared[key][1][tile].copy()
+        local.ravel()[idx] = values
+        _shared[key][1][tile] = local
+    _shared["result"][1][tile] = result
+    _shared["mask"][1][tile] = mask
+
+
+def _compute_tile(task):
+    """
+    Calcule une tuile (y0:y1, x0:x1) pour les itérations start..stop directement
+    dans la mémoire partagée. Seules les coordonnées de la tuile et du domaine
+    (plus l'orbite de référence en mode perturbation) transitent entre les processus.
+    Hors perturbation, les orbites
+    de la formule 'formula' (avec ses paramètres liés 'params') sont itérées dans le type
+    complexe 'cdtype' de la vue, celui des blocs partagés 'orbits' (voir _attach_orbits).
+    """
+    (generation, y0, y1, x0, x1, start, stop, interior_check, width, height,
+     re_start, re_end, im_start, im_end, deep, orbits, cdtype, formula, params) = task
+    if generation != _generation.value:
+        return 0
+    _attach_orbits(orbits, cdtype)
+    tile = (slice(y0, y1), slice(x0, x1))
+
+    if deep is not None:
+        return _compute_tile_deep(tile, start, stop, interior_check, width, height, *deep)
+
+    re = centered_axis(re_start, re_end, width)[x0:x1]
+    im = centered_axis(im_start, im_end, height)[y0:y1]
+    c = np.empty((y1 - y0, x1 - x0), dtype=cdtype)
+    c.real = re[np.newaxis, :]
+    c.imag = im[:, np.newaxis]
+    c = c.ravel()
+
+    result, mask, idx, fresh = _load_tile(tile, start, stop, c, interior_check and formula.mandelbrot_interior)
+    z, c = formula.start(np, c[idx], params)
+    prev = None
+    if fresh:
+        if formula.uses_prev:
+            prev = np.zeros_like(z)
+    else:
+        z = _shared["z"][1][tile].ravel()[idx]
+        if formula.uses_prev:
+            prev = _shared["z_prev"][1][tile].ravel()[idx]
+
+    idx, z, c, prev = iterate_active(idx, z, c, result, mask, start, stop, interior_check, None, formula, params,
+                                     prev)
+    active = {"z": z} if prev is None else {"z": z, "z_prev": prev}
+    _store_tile(tile, result, mask, idx, **active)
+    return idx.size
+
+
+def _compute_tile_deep(tile, start, stop, interior_check, width, height,
+                       span_re, span_im, center, offset, orbit):
+    """
+    Équivalent de _compute_tile en mode perturbation : itère les écarts dz par rapport
+    à l'orbite de référence transmise avec la tâche.
+    """
+    (y0, y1), (x0, x1) = (tile[0].start, tile[0].stop), (tile[1].start, tile[1].stop)
+    dc = pixel_offsets(width, height, span_re, span_im, y0, y1, x0, x1).ravel() + offset
+
+    result, mask, idx, fresh = _load_tile(tile, start, stop, center - offset + dc, interior_check)
+    if fresh:
+        dz = np.zeros(idx.size, dtype=np.complex128)
+        m = np.zeros(idx.size, dtype=np.intp)
+    else:
+        dz = _shared["z"][1][tile].ravel()[idx]
+        m = _shared["ref_index"][1][tile].ravel()[idx]
+    dc = dc[idx]
+
+    step = max(span_re / (width - 1), span_im / (height - 1))
+    idx, dz, dc, m = iterate_perturbation(idx, dz, dc, m, orbit, result, mask, start, stop,
+                                          interior_check, min(PERIODICITY_EPS, step * 1e-6))
+    _store_tile(tile, result, mask, idx, z=dz, ref_index=m)
+    return idx.size
+
+
+def _release(pool, blocks):
+    pool.terminate()
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+class FractalStateMP:
+    """
+    Variante multi-cœurs de FractalStateCPU.
+
+    La vue est découpée en tuiles distribuées dynamiquement à un pool de processus.
+    'z', 'result' et 'mask' résident en mémoire partagée : les processus y écrivent
+    directement, sans sérialiser de tableaux. L'interface (update_zoom,
+    apply_translation, update_add_iterations, zoom_center) est la même que celle de
+    FractalStateCPU, y compris le passage automatique en mode perturbation, la
+    réutilisation de l'image précédente lors d'un zoom (zoom_reuse, refine) et le rendu
+    progressif (progressive, advance).
+
+    En mode progressive, chaque passe est confiée au pool de façon asynchrone : advance()
+    attend au plus le budget de l'image. Pour abandonner une passe, le numéro de
+    génération partagé est incrémenté ; les tuiles encore en file sont alors ignorées
+    par les processus et seules celles déjà en cours sont attendues.
+
+    Avec un tile_cache, les vues sont assemblées dans le processus principal à partir des
+    tuiles déjà calculées (voir FractalStateCPU) et seules les autres sont distribuées.
+
+    La formule ('fractal_type', 'formula_params') est liée au début de chaque recalcul
+    complet, comme dans FractalStateCPU, puis transmise avec chaque tâche. Avec symmetry,
+    les pixels images d'un autre par la symétrie de la formule sont recopiés dans les
+    tableaux partagés au lieu d'être distribués (voir FractalStateCPU).
+    """
+
+    def __init__(self, width, height, max_iter, re_start, re_end, im_start, im_end,
+                 workers=None, tile_size=TILE_SIZE, interior_check=True, zoom_reuse=False,
+                 progressive=False, tile_cache=None, precision="auto", fractal_type="Mandelbrot",
+                 formula_params=None, symmetry=True):
+        self.fractal_type = fractal_type
+        self.formula_params = formula_params
+        self.formula = get_formula(fractal_type)
+        self.params = self.formula.bind(formula_params)
+        self.interior_check = interior_check
+        self.symmetry = symmetry
+        self._mirror = None
+        self.precision = precision
+        self.zoom_reuse = zoom_reuse
+        self.progressive = progressive
+        self.tile_cache = tile_cache
+        # Sauvegarde des paramètres initiaux pour le Reset Zoom
+        self.init_params = (re_start, re_end, im_start, im_end, max_iter)
+        self._passes = []
+        self._todo = None
+        self._job = None
+        self.seed = None
+        self.refine_pending = False
+        self.approximate = False
+        self.width = width
+        self.height = height
+        self.max_iter = max_iter
+        self._blocks = []
+        self._orbits = None
+        self.z = self.z_prev = None
+        self._set_domain(re_start, re_end, im_start, im_end)
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_size = tile_size
+
+        shape = (height, width)
+        names = {}
+        for key, dtype in SHARED_ARRAYS:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._blocks.append(shm)
+            names[key] = shm.name
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+        self.generation = mp.RawValue("q", 0)
+        self.pool = mp.Pool(self.workers, initializer=_init_worker,
+                            initargs=(names, shape, self.generation))
+        self._finalizer = weakref.finalize(self, _release, self.pool, self._blocks)
+        self.full_recompute()
+
+    def _set_domain(self, re_start, re_end, im_start, im_end):
+        self.re_start = re_start
+        self.re_end = re_end
+        self.im_start = im_start
+        self.im_end = im_end
+        self.center_re = midpoint(re_start, re_end)
+        self.center_im = midpoint(im_start, im_end)
+        self.span_re = re_end - re_start
+        self.span_im = im_end - im_start
+        self._update_precision_mode()
+        self._update_lattice()
+
+    def _set_bounds_from_center(self):
+        self.re_start = float(shift(self.center_re, -self.span_re / 2))
+        self.re_end = float(shift(self.center_re, self.span_re / 2))
+        self.im_start = float(shift(self.center_im, -self.span_im / 2))
+        self.im_end = float(shift(self.center_im, self.span_im / 2))
+        self._update_lattice()
+
+    def _update_lattice(self):
+        """
+        Position de la vue dans le réseau global du cache de tuiles.
+        """
+        self.steps = (self.span_re / (self.width - 1), self.span_im / (self.height - 1))
+        self.origin, phase = lattice_origin(self.re_start, self.im_start, *self.steps)
+        self.level = level_key(*self.steps, phase)
+
+    def _update_precision_mode(self):
+        """
+        Détermine si la vue courante doit être calculée par perturbation, et sinon dans
+        quel type complexe. Les grilles elles-mêmes sont construites tuile par tuile dans
+        les processus de travail.
+        """
+        self.step = max(self.span_re / (self.width - 1), self.span_im / (self.height - 1))
+        self.deep = self.formula.perturbation and needs_perturbation(self.center_re, self.center_im, self.step)
+        self.cdtype = self._view_dtype(self.max_iter)
+        self._allocate_orbits()
+
+    def _view_dtype(self, max_iter):
+        # Voir FractalStateCPU._view_dtype
+        if self.deep:
+            return np.complex128
+        return complex_dtype(self.precision, self.center_re, self.center_im, self.step, max_iter)
+
+    def _allocate_orbits(self):
+        """
+        Alloue 'z' et 'z_prev' en mémoire partagée dans le type complexe de la vue, s'ils
+        ne le sont pas déjà : en complex64, ils occupent moitié moins de place. Les blocs
+        précédents sont libérés ; les processus de travail s'attachent aux nouveaux à leur
+        tâche suivante, qui en transmet les noms.
+        """
+        if self.z is not None and self.z.dtype == self.cdtype:
+            return
+        self._cancel()
+        previous = [shm for shm in self._blocks if shm.name in (self._orbits or ())]
+        self.z = self.z_prev = None
+        for shm in previous:
+            self._blocks.remove(shm)
+            shm.close()
+            shm.unlink()
+        shape = (self.height, self.width)
+        names = []
+        for key in ORBIT_ARRAYS:
+            shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(self.cdtype).itemsize)
+            self._blocks.append(shm)
+            names.append(shm.name)
+            setattr(self, key, np.ndarray(shape, dtype=self.cdtype, buffer=shm.buf))
+        self._orbits = tuple(names)
+
+    def _bind_formula(self):
+        """
+        Voir FractalStateCPU._bind_formula.
+        """
+        formula = get_formula(self.fractal_type)
+        changed = formula.perturbation != self.formula.perturbation
+        self.formula, self.params = formula, formula.bind(self.formula_params)
+        if changed:
+            self._update_precision_mode()
+
+    def close(self):
+        """
+        Arrête le pool et libère la mémoire partagée.
+        """
+        self._cancel()
+        self._finalizer()
+
+    def _tiles(self, start, stop, rects):
+        t = self.tile_size
+        deep = None
+        if self.deep:
+            self.reference.extend(stop)
+            # Écart entre le centre de la vue et celui de l'orbite (non nul après une translation)
+            offset = complex(self.center_re - self.reference.center_re,
+                             self.center_im - self.reference.center_im)
+            deep = (self.span_re, self.span_im, complex(self.center_re, self.center_im), offset,
+                    self.reference.orbit)
+        domain = (self.width, self.height, self.re_start, self.re_end, self.im_start, self.im_end, deep,
+                  self._orbits, np.dtype(self.cdtype), self.formula, self.params)
+        for ry0, ry1, rx0, rx1 in rects:
+            for y0 in range(ry0, ry1, t):
+                for x0 in range(rx0, rx1, t):
+                    y1, x1 = min(y0 + t, ry1), min(x0 + t, rx1)
+                    # Depuis l'itération 0, les tuiles sans pixel marqué n'ont rien à calculer
+                    if start == 0 and not self.todo[y0:y1, x0:x1].any():
+                        continue
+                    yield (self.generation.value, y0, y1, x0, x1, start, stop,
+                           self.interior_check) + domain
+
+    def _run(self, start, stop, rects=None):
+        """
+        Distribue les rectangles 'rects' (toute la vue par défaut) découpés en tuiles.
+        """
+        if rects is None:
+            rects = [(0, self.height, 0, self.width)]
+        # chunksize=1 : chaque processus reprend une tuile dès qu'il a fini la précédente.
+        tiles = self._tiles(start, stop, rects)
+        for _ in self.pool.imap_unordered(_compute_tile, tiles, chunksize=1):
+            pass
+
+    def _cancel(self):
+        """
+        Abandonne le travail asynchrone en cours (voir la docstring de la classe).
+        """
+        self._passes = []
+        if self._job is not None:
+            self.generation.value += 1
+            self._job.wait()
+            self._job = None
+
+    @property
+    def progressive_pending(self):
+        """
+        Vrai tant que des passes du rendu progressif restent à calculer.
+        """
+        return bool(self._passes) or self._job is not None
+
+    def advance(self, budget_ms):
+        """
+        Poursuit le rendu progressif : lance la passe suivante si aucune n'est en cours,
+        puis attend sa fin au plus budget_ms millisecondes. Une passe terminée est complétée
+        à partir de sa grille (voir progressive.fill_from_grid). Retourne True si au moins
+        une passe s'est terminée.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        updated = False
+        while self.progressive_pending:
+            if self._job is None:
+                stride = self._passes.pop(0)
+                previous = stride * 2 if stride < PROGRESSIVE_STRIDES[0] else None
+                self.todo[:] = pass_mask(self.height, self.width, stride, previous) & self._todo
+                if PROFILER.enabled:
+                    PROFILER.count("pixels_computed", int(self.todo.sum()))
+                tasks = list(self._tiles(0, self.max_iter, [(0, self.height, 0, self.width)]))
+                self._job = self.pool.map_async(_compute_tile, tasks, chunksize=1)
+                self._job_stride = stride
+            self._job.wait(max(deadline - time.perf_counter(), 0))
+            if not self._job.ready():
+                break
+            self._job = None
+            # Les pixels issus du cache de tuiles (et les images par symétrie) sont déjà définitifs
+            fill_from_grid(self.result, self._job_stride, keep=~self._todo)
+            self._mirror_grids()
+            updated = True
+            if not self.progressive_pending:
+                self._mirror = None
+                self._store_tiles((0, self.height, 0, self.width))
+            if time.perf_counter() >= deadline:
+                break
+        return updated
+
+    def full_recompute(self):
+        """
+        Recalcule entièrement la fractale ; chaque processus initialise lui-même ses tuiles.
+        Avec symmetry, seuls les pixels sans image dans la vue sont calculés.
+        En mode progressive, les passes sont seulement planifiées (voir advance).
+        """
+        self._cancel()
+        self._bind_formula()
+        # Le nombre d'itérations a pu changer depuis la dernière évaluation du type complexe
+        self.cdtype = self._view_dtype(self.max_iter)
+        self._allocate_orbits()
+        self.seed = None
+        self.refine_pending = False
+        self.approximate = False
+        if self.deep:
+            self.reference = ReferenceOrbit(self.center_re, self.center_im, self.step, self.max_iter)
+        view = (0, self.height, 0, self.width)
+        self._todo = self._assemble(view)
+        self._plan_mirror(self._todo)
+        self.computed_fraction = self._todo.mean()
+        if self.progressive:
+            self._passes = list(PROGRESSIVE_STRIDES)
+            return
+        self.todo[:] = self._todo
+        if PROFILER.enabled:
+            PROFILER.count("pixels_computed", int(self.todo.sum()))
+        self._run(0, self.max_iter)
+        self._mirror_grids()
+        self._mirror = None
+        self._store_tiles(view)
+
+    def _axes(self):
+        # Axes de la grille construite par les processus de travail (voir _compute_tile)
+        return (centered_axis(self.re_start, self.re_end, self.width),
+                centered_axis(self.im_start, self.im_end, self.height))
+
+    def _plan_mirror(self, todo):
+        """
+        Voir FractalStateCPU._plan_mirror : les pixels retirés de 'todo' sont recopiés par
+        _mirror_grids, avec leur état ('z', 'z_prev') conjugué ou identique.
+        """
+        self._mirror = None
+        kind = self.formula.symmetry_for(self.params)
+        if not self.symmetry or kind is None or self.deep:
+            return
+        real = np.empty(0, dtype=self.cdtype).real.dtype
+        axis_re, axis_im = self._axes()
+        dst, src = mirror_pairs(axis_re.astype(real), axis_im.astype(real), kind)
+        planned = todo.ravel()[dst]
+        if planned.any():
+            todo.ravel()[dst[planned]] = False
+            self._mirror = (kind, dst[planned], src[planned])
+
+    def _mirror_grids(self):
+        if self._mirror is None:
+            return
+        kind, dst, src = self._mirror
+        for grid in (self.result, self.mask):
+            grid.reshape(-1)[dst] = grid.reshape(-1)[src]
+        z, z_prev = mirror_orbit(kind, self.z.reshape(-1)[src], self.z_prev.reshape(-1)[src])
+        self.z.reshape(-1)[dst] = z
+        self.z_prev.reshape(-1)[dst] = z_prev
+
+    def compute_pixels(self, idx):
+        """
+        Calcule complètement (jusqu'à max_iter) les pixels d'indices plats 'idx' ; seules
+        les tuiles qui en contiennent sont distribuées aux processus.
+        """
+        self.todo[:] = False
+        self.todo.reshape(-1)[idx] = True
+        PROFILER.count("pixels_computed", idx.size)
+        self._run(0, self.max_iter)
+
+    def update_add_iterations(self, new_max_iter):
+        """
+        Ajoute des itérations en reprenant 'z' et 'mask' depuis la mémoire partagée. Si
+        l'affinage d'un zoom a conservé des pixels de l'aperçu, si un rendu progressif est
+        inachevé ou si la vue passe en complex128, la vue est recalculée.
+        """
+        self._finish_refine()
+        if self.approximate or self.progressive_pending or self._view_dtype(new_max_iter) != self.cdtype:
+            self.max_iter = new_max_iter
+            self.full_recompute()
+            return
+        interior = self.result == self.max_iter
+        self._run(self.max_iter, new_max_iter)
+        interior &= self.result == self.max_iter
+        self.result[interior] = new_max_iter
+        self.max_iter = new_max_iter
+        self._store_tiles((0, self.height, 0, self.width))
+
+    def apply_translation(self, dx, dy):
+        """
+        Décale en place la partie conservée des tableaux partagés, met à jour le domaine,
+        puis ne calcule que la bande en L découverte (voir FractalStateCPU.apply_translation).
+        """
+        self._finish_refine()
+        self.center_re = shift(self.center_re, -dx * self.span_re / (self.width - 1))
+        self.center_im = shift(self.center_im, -dy * self.span_im / (self.height - 1))
+        self._set_bounds_from_center()
+        if abs(dx) >= self.width or abs(dy) >= self.height or self.progressive_pending:
+            self.full_recompute()
+            return
+        dst, src = translation_slices(self.width, self.height, dx, dy)
+        for arr in (self.z, self.z_prev, self.result, self.mask, self.ref_index):
+            arr[dst] = arr[src]
+        rects = exposed_rects(self.width, self.height, dx, dy)
+        self.todo[:] = False
+        for rect in rects:
+            self.todo[:] |= self._assemble(rect)
+        if PROFILER.enabled:
+            PROFILER.count("pixels_computed", int(self.todo.sum()))
+        self._run(0, self.max_iter, rects)
+        for rect in rects:
+            self._store_tiles(rect)
+
+    def zoom_center(self, factor, new_max_iter):
+        """
+        Zoome d'un facteur 'factor' autour du centre de la vue conservé en haute précision.
+        Avec zoom_reuse, 'result' reçoit seulement l'aperçu projeté (voir
+        FractalStateCPU.zoom_center) et le calcul est laissé à refine().
+        """
+        self.span_re *= factor
+        self.span_im *= factor
+        self._set_bounds_from_center()
+        self._cancel()
+        old_max_iter = self.max_iter
+        self.max_iter = new_max_iter
+        self._update_precision_mode()
+        if not self.zoom_reuse:
+            self.full_recompute()
+            return
+        previous = self.seed if self.refine_pending else self.result
+        seed = resample_previous(previous, factor)
+        seed[seed >= old_max_iter] = new_max_iter
+        self.seed = seed
+        self.result[:] = np.where(np.isnan(seed), new_max_iter, seed)
+        self.refine_pending = True
+
+    def refine(self):
+        """
+        Étape d'affinage qui suit un zoom avec réutilisation (voir FractalStateCPU.refine).
+        """
+        seed = self.seed
+        self.seed = None
+        self.refine_pending = False
+        if self.deep:
+            self.reference = ReferenceOrbit(self.center_re, self.center_im, self.step, self.max_iter)
+        self.result[:] = self.max_iter
+        self.mask[:] = False
+        accepted = refine_from_seed(self, seed)
+        self.approximate = bool(accepted.any())
+        self.computed_fraction = 1.0 - accepted.sum() / accepted.size
+        self._store_tiles((0, self.height, 0, self.width))
+
+    def _finish_refine(self):
+        if self.refine_pending:
+            self.refine()
+
+    def _cache_enabled(self):
+        return self.tile_cache is not None and not self.deep
+
+    def _tile_key(self, tx, ty):
+        # Le type complexe en fait partie : une tuile calculée en complex64 ne sert jamais
+        # de point de reprise à une vue calculée en complex128
+        return (self.fractal_type, self.formula.cache_key(self.params), self.level, np.dtype(self.cdtype).str,
+                tx, ty)
+
+    def _assemble(self, rect):
+        """
+        Remplit les tableaux partagés depuis le cache de tuiles dans le rectangle 'rect'
+        (voir FractalStateCPU._assemble). Les tuiles calculées avec moins d'itérations sont
+        reprises par le pool. Retourne le masque des pixels qui restent à calculer.
+        """
+        y0, y1, x0, x1 = rect
+        todo = np.zeros((self.height, self.width), dtype=bool)
+        todo[y0:y1, x0:x1] = True
+        if not self._cache_enabled():
+            return todo
+        resumed = {}
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            found = self.tile_cache.lookup(self._tile_key(tx, ty), self.max_iter)
+            if found is None:
+                continue
+            entry_max_iter, arrays = found
+            status = arrays["status"][tile]
+            self.result[view] = np.where(status == ESCAPED, arrays["result"][tile], self.max_iter)
+            self.mask[view] = status == ACTIVE
+            self.z[view] = arrays["z"][tile]
+            if self.formula.uses_prev:
+                self.z_prev[view] = arrays["z_prev"][tile]
+            todo[view] = False
+            if entry_max_iter < self.max_iter:
+                rows, cols = view
+                resumed.setdefault(entry_max_iter, []).append((rows.start, rows.stop, cols.start, cols.stop))
+        for start, rects in resumed.items():
+            self._run(start, self.max_iter, rects)
+        return todo
+
+    def _store_tiles(self, rect):
+        """
+        Enregistre dans le cache les tuiles entièrement visibles qui recouvrent 'rect'.
+        """
+        if not self._cache_enabled() or self.approximate or self.refine_pending or self.progressive_pending:
+            return
+        status = pixel_status(self.result, self.mask, self.max_iter)
+        names = ("z", "z_prev") if self.formula.uses_prev else ("z",)
+        for tx, ty, view, tile in view_tiles(self.origin[0], self.origin[1], rect):
+            if self.result[view].shape != (CACHE_TILE_SIZE, CACHE_TILE_SIZE):
+                continue
+            self.tile_cache.store(self._tile_key(tx, ty), self.max_iter, result=self.result[view],
+                                  status=status[view], **{name: getattr(self, name)[view] for name in names})
+
+    def reset_view(self):
+        """
+        Réinitialise la vue aux paramètres initiaux.
+        """
+        re_start, re_end, im_start, im_end, max_iter = self.init_params
+        self._set_domain(re_start, re_end, im_start, im_end)
+        self.max_iter = max_iter
+        self.full_recompute()
+
+    def update_zoom(self, new_re_start, new_re_end, new_im_start, new_im_end, new_max_iter):
+        """
+        Même logique que FractalStateCPU.update_zoom : itérations supplémentaires si le
+        domaine est inchangé, recalcul complet sinon.
+        """
+        eps = min(1e-9, 1e-3 * self.span_re / self.width)
+        same_domain = (abs(new_re_start - self.re_start) < eps and abs(new_re_end - self.re_end) < eps and
+                       abs(new_im_start - self.im_start) < eps and abs(new_im_end - self.im_end) < eps)
+        if same_domain and new_max_iter > self.max_iter:
+            self.update_add_iterations(new_max_iter)
+        else:
+            if not same_domain:
+                self._set_domain(new_re_start, new_re_end, new_im_start, new_im_end)
+            self.max_iter = new_max_iter
+            self.full_recompute()
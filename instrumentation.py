@@ -0,0 +1,141 @@
+# instrumentation.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Nombre d'images conservées pour les moyennes affichées par le HUD.
+HUD_FRAMES = 30
+
+# Nombre maximal d'événements de trace conservés : au-delà, les plus anciens sont abandonnés.
+TRACE_EVENTS = 200_000
+
+# Contexte vide partagé : une mesure désactivée ne crée aucun objet.
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """
+    Mesures par image des étapes du rendu (événements, calcul, coloration, interface,
+    affichage...) et compteurs (pixels actifs par itération, pixels recalculés).
+
+    Désactivé par défaut : span() retourne alors un contexte vide partagé et count() ne
+    fait rien, si bien que les points de mesure ne coûtent qu'un test d'attribut. Activé,
+    chaque mesure s'ajoute aux totaux de l'image en cours (voir end_frame) : la mémoire
+    utilisée ne dépend pas de la durée de la session. Avec 'trace', elle devient aussi un
+    événement de trace (format « Trace Event » de Chrome, voir export_chrome_trace), dans
+    un tampon circulaire des TRACE_EVENTS derniers événements.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self.events = deque(maxlen=TRACE_EVENTS)
+        self.frames = []
+        self._lock = threading.Lock()
+        self._frame = {}
+        self._threads = {}
+        self._origin = time.perf_counter()
+
+    def enable(self, enabled=True, trace=False):
+        """
+        Active ou désactive les mesures ; avec 'trace', les événements sont conservés pour
+        export_chrome_trace.
+        """
+        self.enabled = enabled
+        self.tracing = enabled and trace
+
+    def span(self, name):
+        """
+        Contexte qui mesure la durée du bloc sous le nom 'name'.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record_since(self, name, start):
+        """
+        Enregistre sous le nom 'name' la durée écoulée depuis 'start' (time.perf_counter()),
+        pour les blocs qui se prêtent mal à un contexte.
+        """
+        if self.enabled:
+            self._record(name, start, time.perf_counter())
+
+    def count(self, name, value):
+        """
+        Ajoute 'value' au compteur 'name' de l'image en cours et, avec la trace, note sa valeur.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self._frame[name] = self._frame.get(name, 0) + value
+            if self.tracing:
+                self.events.append({"name": name, "ph": "C", "ts": (now - self._origin) * 1e6,
+                                    "pid": os.getpid(), "args": {name: value}})
+
+    def _record(self, name, start, end):
+        with self._lock:
+            key = name + " ms"
+            self._frame[key] = self._frame.get(key, 0.0) + (end - start) * 1e3
+            if self.tracing:
+                tid = threading.get_ident()
+                if tid not in self._threads:
+                    # Nom du thread affiché par le visualiseur de trace
+                    self._threads[tid] = threading.current_thread().name
+                self.events.append({"name": name, "ph": "X", "ts": (start - self._origin) * 1e6,
+                                    "dur": (end - start) * 1e6, "pid": os.getpid(), "tid": tid})
+
+    def end_frame(self):
+        """
+        Clôt l'image en cours : ses totaux rejoignent l'historique des HUD_FRAMES dernières.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            frame, self._frame = self._frame, {}
+        self.frames.append(frame)
+        del self.frames[:-HUD_FRAMES]
+
+    def summary(self):
+        """
+        Moyenne par image de chaque mesure et compteur sur les dernières images.
+        """
+        totals = {}
+        for frame in self.frames:
+            for name, value in frame.items():
+                totals[name] = totals.get(name, 0) + value
+        return {name: value / len(self.frames) for name, value in sorted(totals.items())}
+
+    def export_chrome_trace(self, path):
+        """
+        Écrit les événements au format JSON « Trace Event » (chrome://tracing, Perfetto).
+        """
+        with self._lock:
+            events = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                      for tid, name in self._threads.items()]
+            events += self.events
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+# Instance partagée par l'application, les renderers et les états de fractale.
+PROFILER = Profiler()
@@ -0,0 +1,167 @@
+# julia_atlas.py
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from formulas import get_formula
+from fractal_state_cpu import iterate_active
+from precision import RESULT_DTYPE, complex_dtype
+from symmetry import centered_axis, mirror_pairs
+
+# Nombre de constantes c par axe de l'atlas (ATLAS_GRID × ATLAS_GRID vignettes).
+ATLAS_GRID = 32
+
+# Nombre d'itérations des vignettes.
+ATLAS_MAX_ITER = 200
+
+# Demi-hauteur du domaine de chaque vignette dans le plan des z ; la largeur suit les
+# proportions de la vignette (pixels carrés). Les ensembles de Julia connexes tiennent
+# dans |z| <= 2, l'essentiel de leur détail dans |Im z| <= 1.3.
+ATLAS_HALF_SPAN = 1.3
+
+
+def atlas_constants(re_start, re_end, im_start, im_end, cols=ATLAS_GRID, rows=ATLAS_GRID):
+    """
+    Constantes c de l'atlas : centres des rows × cols cellules de la vue (re_start, re_end,
+    im_start, im_end), tableau (rows, cols) dont la ligne 0 est la partie imaginaire la plus
+    petite, comme les lignes de 'result'.
+    """
+    re = re_start + (np.arange(cols) + 0.5) * (re_end - re_start) / cols
+    im = im_start + (np.arange(rows) + 0.5) * (im_end - im_start) / rows
+    return re[np.newaxis, :] + 1j * im[:, np.newaxis]
+
+
+def thumbnail_axes(width, height, half_span=ATLAS_HALF_SPAN):
+    """
+    Axes (réel, imaginaire) des pixels d'une vignette width × height, centrés sur 0.
+    """
+    half_re = half_span * (width - 1) / (height - 1)
+    return centered_axis(-half_re, half_re, width), centered_axis(-half_span, half_span, height)
+
+
+def julia_batch(constants, width, height, max_iter=ATLAS_MAX_ITER, half_span=ATLAS_HALF_SPAN,
+                interior_check=True, precision="auto", xp=np):
+    """
+    Calcule en un seul lot les ensembles de Julia z² + c des N constantes 'constants' :
+    retourne 'result' (N, height, width), au format de FractalStateCPU.result.
+
+    Toutes les vignettes partagent la même grille de points (voir thumbnail_axes) ; leurs
+    pixels forment un seul ensemble compact itéré par fractal_state_cpu.iterate_active,
+    si bien que les pixels échappés de toutes les vignettes sont retirés ensemble et que
+    le coût par itération suit le nombre total de pixels actifs, sans surcoût par vignette.
+    La symétrie centrale des ensembles de Julia (voir symmetry.mirror_pairs) est exploitée
+    une fois pour toutes : seule une moitié des pixels de chaque vignette est calculée.
+    Avec xp=cupy, le calcul a lieu sur le GPU et 'result' y reste.
+    """
+    constants = np.asarray(constants).ravel()
+    count = constants.size
+    axis_re, axis_im = thumbnail_axes(width, height, half_span)
+    step = 2 * half_span / (height - 1)
+    cdtype = complex_dtype(precision, 0.0, 0.0, step, max_iter)
+    real = np.empty(0, dtype=cdtype).real.dtype
+    dst, src = mirror_pairs(axis_re.astype(real), axis_im.astype(real), "point")
+    keep = np.ones(width * height, dtype=bool)
+    keep[dst] = False
+    local = np.flatnonzero(keep)
+
+    points = (axis_re[np.newaxis, :] + 1j * axis_im[:, np.newaxis]).astype(cdtype).ravel()[local]
+    idx = xp.asarray((np.arange(count)[:, np.newaxis] * (width * height) + local).ravel())
+    z = xp.tile(xp.asarray(points), count)
+    c = xp.repeat(xp.asarray(constants.astype(cdtype)), local.size)
+    result = xp.full((count, height * width), max_iter, dtype=RESULT_DTYPE)
+    mask = xp.ones((count, height * width), dtype=bool)
+    formula = get_formula("Julia")
+    iterate_active(idx, z, c, result, mask, 0, max_iter, interior_check, formula=formula,
+                   params=formula.bind(), xp=xp)
+    result[:, xp.asarray(dst)] = result[:, xp.asarray(src)]
+    return result.reshape(count, height, width)
+
+
+def mosaic(thumbnails, rows, cols):
+    """
+    Dispose les vignettes (rows * cols, h, w) en une image (rows * h, cols * w) : la vignette
+    k occupe la ligne k // cols et la colonne k % cols.
+    """
+    _, height, width = thumbnails.shape
+    return thumbnails.reshape(rows, cols, height, width).transpose(0, 2, 1, 3).reshape(rows * height, cols * width)
+
+
+class JuliaAtlas:
+    """
+    Atlas des ensembles de Julia des constantes prises sur une vue de l'ensemble de
+    Mandelbrot, disposé en mosaïque dans une image de screen_width × screen_height pixels
+    (la marge laissée par la division en vignettes vaut 0). 'result' et 'max_iter' se
+    passent directement à display_fractal ; cell_at donne la constante d'un pixel de
+    l'écran, pour ouvrir l'ensemble de Julia correspondant.
+    """
+
+    def __init__(self, screen_width, screen_height, re_start, re_end, im_start, im_end, grid=ATLAS_GRID,
+                 max_iter=ATLAS_MAX_ITER, precision="auto", xp=np):
+        self.grid = grid
+        self.max_iter = max_iter
+        self.generation = None
+        self.thumb_width = screen_width // grid
+        self.thumb_height = screen_height // grid
+        self.constants = atlas_constants(re_start, re_end, im_start, im_end, grid, grid)
+        start = time.perf_counter()
+        thumbnails = julia_batch(self.constants, self.thumb_width, self.thumb_height, max_iter,
+                                 precision=precision, xp=xp)
+        if hasattr(thumbnails, "get"):
+            thumbnails = thumbnails.get()
+        self.elapsed = time.perf_counter() - start
+        self.result = np.zeros((screen_height, screen_width), dtype=RESULT_DTYPE)
+        tiled = mosaic(thumbnails, grid, grid)
+        self.result[:tiled.shape[0], :tiled.shape[1]] = tiled
+
+    def cell_at(self, x, y):
+        """
+        Constante c de la vignette sous le pixel (x, y) de l'écran, ou None dans la marge.
+        """
+        col, row = x // self.thumb_width, y // self.thumb_height
+        if col >= self.grid or row >= self.grid:
+            return None
+        return complex(self.constants[row, col])
+
+
+def _separate_renders(constants, width, height, max_iter):
+    from fractal_state_cpu import FractalStateCPU
+    half_re = ATLAS_HALF_SPAN * (width - 1) / (height - 1)
+    for c in constants.ravel():
+        FractalStateCPU(width, height, max_iter, -half_re, half_re, -ATLAS_HALF_SPAN, ATLAS_HALF_SPAN,
+                        fractal_type="Custom", formula_params={"c": complex(c)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure du calcul par lot de l'atlas des ensembles de Julia.")
+    parser.add_argument("--grid", type=int, default=ATLAS_GRID, help="constantes par axe")
+    parser.add_argument("--thumb", type=int, nargs=2, default=(34, 20), metavar=("LARGEUR", "HAUTEUR"))
+    parser.add_argument("--max-iter", type=int, default=ATLAS_MAX_ITER)
+    parser.add_argument("--view", type=float, nargs=4, default=(-2.0, 0.6, -1.2, 1.2),
+                        metavar=("RE_START", "RE_END", "IM_START", "IM_END"))
+    parser.add_argument("--gpu", action="store_true", help="calcul par lot avec CuPy")
+    args = parser.parse_args(argv)
+
+    width, height = args.thumb
+    constants = atlas_constants(*args.view, args.grid, args.grid)
+    pixels = constants.size * width * height
+    xp = np
+    if args.gpu:
+        import cupy as xp
+    start = time.perf_counter()
+    julia_batch(constants, width, height, args.max_iter, xp=xp)
+    if args.gpu:
+        xp.cuda.Device().synchronize()
+    batched = time.perf_counter() - start
+    start = time.perf_counter()
+    _separate_renders(constants, width, height, args.max_iter)
+    separate = time.perf_counter() - start
+    print("%d vignettes de %d×%d, %d itérations" % (constants.size, width, height, args.max_iter))
+    print("lot : %.3f s (%.2f Mpixels/s)" % (batched, pixels / batched / 1e6))
+    print("séparés : %.3f s (%.2f Mpixels/s), x%.1f" % (separate, pixels / separate / 1e6, separate / batched))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# mariani_silver.py
+import numpy as np
+
+# Côté (intérieur) en dessous duquel un rectangle non uniforme est calculé pixel par pixel
+# plutôt que subdivisé.
+MIN_RECT_SIZE = 6
+
+
+def _border_indices(rect, width):
+    y0, y1, x0, x1 = rect
+    cols = np.arange(x0, x1)
+    rows = np.arange(y0 + 1, y1 - 1)
+    return np.concatenate([
+        y0 * width + cols,
+        (y1 - 1) * width + cols,
+        rows * width + x0,
+        rows * width + (x1 - 1),
+    ])
+
+
+def _interior_indices(rect, width):
+    y0, y1, x0, x1 = rect
+    rows = np.arange(y0 + 1, y1 - 1)[:, np.newaxis]
+    cols = np.arange(x0 + 1, x1 - 1)[np.newaxis, :]
+    return (rows * width + cols).ravel()
+
+
+def _fill(state, rect, count):
+    """
+    Remplit l'intérieur d'un rectangle uniforme. Les pixels intérieurs à l'ensemble gardent
+    max_iter ; sinon les valeurs smooth du bord sont interpolées (surface de Coons) pour
+    conserver un dégradé continu.
+    """
+    y0, y1, x0, x1 = rect
+    inner = (slice(y0 + 1, y1 - 1), slice(x0 + 1, x1 - 1))
+    state.mask[inner] = False
+    if count == 0:
+        return
+    r = state.result
+    top, bottom = r[y0, x0:x1], r[y1 - 1, x0:x1]
+    left, right = r[y0:y1, x0][:, np.newaxis], r[y0:y1, x1 - 1][:, np.newaxis]
+    u = (np.arange(x1 - x0) / (x1 - x0 - 1))[np.newaxis, :]
+    v = (np.arange(y1 - y0) / (y1 - y0 - 1))[:, np.newaxis]
+    patch = ((1 - v) * top + v * bottom + (1 - u) * left + u * right
+             - ((1 - u) * (1 - v) * top[0] + u * (1 - v) * top[-1]
+                + (1 - u) * v * bottom[0] + u * v * bottom[-1]))
+    r[inner] = patch[1:-1, 1:-1]
+    state.counts[inner] = count
+
+
+def render_mariani_silver(state):
+    """
+    Calcule la vue de 'state' par subdivision de rectangles (algorithme de Mariani–Silver).
+
+    Seul le bord de chaque rectangle est itéré : si tous les pixels du bord ont le même
+    nombre d'itérations à l'échappement (ou sont tous intérieurs), l'intérieur est rempli
+    sans calcul ; sinon le rectangle est découpé en quatre. Les bords de tous les
+    rectangles d'un même niveau sont calculés en un seul lot via state.compute_pixels.
+
+    'state' doit fournir width, height, result, mask, counts et compute_pixels(idx).
+    Remplit state.result au même format qu'un calcul complet et retourne la fraction
+    de pixels effectivement calculés.
+    """
+    width, height = state.width, state.height
+    done = np.zeros(width * height, dtype=bool)
+    counts = state.counts.reshape(-1)
+    computed = 0
+    rects = [(0, height, 0, width)]
+
+    # Les pixels à calculer directement sont différés et regroupés avec les bords du
+    # niveau suivant : chaque niveau ne coûte ainsi qu'un seul lot d'itérations.
+    direct = np.empty(0, dtype=np.intp)
+    while rects or direct.size:
+        border = [_border_indices(rect, width) for rect in rects]
+        batch = np.unique(np.concatenate(border + [direct]))
+        batch = batch[~done[batch]]
+        state.compute_pixels(batch)
+        done[batch] = True
+        computed += batch.size
+
+        uniform = np.zeros(len(rects), dtype=bool)
+        if rects:
+            # Un bord est uniforme si le min et le max de ses nombres d'itérations coïncident
+            offsets = np.cumsum([0] + [b.size for b in border[:-1]])
+            edges = counts[np.concatenate(border)]
+            uniform = np.minimum.reduceat(edges, offsets) == np.maximum.reduceat(edges, offsets)
+
+        next_rects = []
+        pending = []
+        for rect, edge, flat in zip(rects, border, uniform):
+            y0, y1, x0, x1 = rect
+            if y1 - y0 <= 2 or x1 - x0 <= 2:
+                continue
+            if flat:
+                _fill(state, rect, counts[edge[0]])
+                done[_interior_indices(rect, width)] = True
+            elif y1 - y0 - 2 <= MIN_RECT_SIZE or x1 - x0 - 2 <= MIN_RECT_SIZE:
+                pending.append(_interior_indices(rect, width))
+            else:
+                ym, xm = (y0 + y1) // 2, (x0 + x1) // 2
+                # Les sous-rectangles partagent leurs bords : ils ne sont calculés qu'une fois
+                next_rects += [(y0, ym + 1, x0, xm + 1), (y0, ym + 1, xm, x1),
+                               (ym, y1, x0, xm + 1), (ym, y1, xm, x1)]
+        direct = np.concatenate(pending) if pending else np.empty(0, dtype=np.intp)
+        rects = next_rects
+
+    return computed / (width * height)
@@ -0,0 +1,170 @@
+# perturbation.py
+from decimal import Decimal, localcontext
+
+import numpy as np
+
+from instrumentation import PROFILER
+
+# En dessous de cet écart entre pixels (relatif à |centre|), les coordonnées en
+# float64 ne distinguent plus correctement les pixels voisins : on passe alors au
+# calcul par perturbation.
+PRECISION_LIMIT = 1e-14
+
+# Chiffres significatifs ajoutés à ceux qu'impose la taille d'un pixel pour l'orbite de référence.
+GUARD_DIGITS = 12
+
+# Précision (en chiffres) utilisée pour stocker et déplacer le centre de la vue.
+CENTER_PRECISION = 120
+
+
+def midpoint(start, end):
+    """
+    Retourne le milieu de [start, end] sous forme de Decimal exact.
+    """
+    with localcontext() as ctx:
+        ctx.prec = CENTER_PRECISION
+        return (Decimal(start) + Decimal(end)) / 2
+
+
+def shift(center, delta):
+    """
+    Retourne center + delta (delta en float) en haute précision.
+    """
+    with localcontext() as ctx:
+        ctx.prec = CENTER_PRECISION
+        return center + Decimal(delta)
+
+
+def needs_perturbation(center_re, center_im, step):
+    """
+    Indique si l'écart entre pixels 'step' est trop petit pour un calcul direct en float64
+    autour du centre donné.
+    """
+    magnitude = max(abs(float(center_re)), abs(float(center_im)), 1.0)
+    return step < PRECISION_LIMIT * magnitude
+
+
+def offset_axes(width, height, span_re, span_im, y0=0, y1=None, x0=0, x1=None):
+    """
+    Retourne les axes (re, im) des écarts au centre de la vue des colonnes x0:x1 et des
+    lignes y0:y1. La disposition est la même que celle de la grille construite avec linspace.
+    """
+    y1 = height if y1 is None else y1
+    x1 = width if x1 is None else x1
+    re = (np.arange(x0, x1) - (width - 1) / 2) * (span_re / (width - 1))
+    im = (np.arange(y0, y1) - (height - 1) / 2) * (span_im / (height - 1))
+    return re, im
+
+
+def pixel_offsets(width, height, span_re, span_im, y0=0, y1=None, x0=0, x1=None):
+    """
+    Retourne les écarts dc (complex128) entre les pixels [y0:y1, x0:x1] et le centre de la vue.
+    """
+    re, im = offset_axes(width, height, span_re, span_im, y0, y1, x0, x1)
+    return re[np.newaxis, :] + 1j * im[:, np.newaxis]
+
+
+class ReferenceOrbit:
+    """
+    Orbite de référence Z_n calculée en haute précision (module decimal) au centre de la vue.
+
+    Les valeurs sont stockées en complex128 dans 'orbit' ; l'état décimal est conservé
+    pour pouvoir prolonger l'orbite quand des itérations sont ajoutées. L'orbite s'arrête
+    dès que la référence s'échappe.
+    """
+
+    def __init__(self, center_re, center_im, step, max_iter):
+        digits = max(17, int(-np.log10(step)) + GUARD_DIGITS)
+        self.precision = digits
+        self.center_re = Decimal(center_re)
+        self.center_im = Decimal(center_im)
+        self._x = Decimal(0)
+        self._y = Decimal(0)
+        self.escaped = False
+        self.orbit = np.zeros(1, dtype=np.complex128)
+        self.extend(max_iter)
+
+    def extend(self, max_iter):
+        """
+        Prolonge l'orbite jusqu'à max_iter itérations (ou jusqu'à l'échappement).
+        """
+        n = self.orbit.size - 1
+        if self.escaped or n >= max_iter:
+            return
+        values = []
+        x, y = self._x, self._y
+        with localcontext() as ctx:
+            ctx.prec = self.precision
+            for _ in range(n, max_iter):
+                x, y = x * x - y * y + self.center_re, 2 * x * y + self.center_im
+                values.append(complex(float(x), float(y)))
+                if x * x + y * y > 4:
+                    self.escaped = True
+                    break
+        self._x, self._y = x, y
+        self.orbit = np.concatenate([self.orbit, np.array(values, dtype=np.complex128)])
+
+
+def iterate_perturbation(idx, dz, dc, m, orbit, result, mask, start, stop, interior_check=False,
+                         periodicity_eps=1e-12, counts=None):
+    """
+    Itère les écarts dz à l'orbite de référence pour les pixels actifs (tableaux compacts).
+
+    z_n = Z_m + dz, avec dz <- 2 Z_m dz + dz^2 + dc et m l'indice de chaque pixel dans
+    l'orbite. Un pixel est rebasé (dz <- z, m <- 0) lorsque |z| < |dz|, signe d'un
+    glitch de précision, ou lorsqu'il atteint la fin d'une orbite de référence échappée.
+
+    Mêmes conventions que fractal_state_cpu.iterate_active pour 'result', 'mask' et 'counts' ;
+    retourne les tableaux (idx, dz, dc, m) compactés.
+    """
+    flat_result = result.reshape(-1)
+    flat_mask = mask.reshape(-1)
+    last = orbit.size - 1
+    inv_log2 = 1.0 / np.log(2)
+    trace = PROFILER.enabled
+    if interior_check:
+        z_ref = orbit[m] + dz
+        eps2 = periodicity_eps * periodicity_eps
+
+    for i in range(start, stop):
+        if idx.size == 0:
+            break
+        if trace:
+            PROFILER.count("active_pixels", idx.size)
+        zm = orbit[m]
+        zm *= 2
+        zm += dz
+        dz *= zm
+        dz += dc
+        m += 1
+        z = orbit[m]
+        z += dz
+        mod2 = z.real * z.real + z.imag * z.imag
+
+        retire = mod2 > 4.0
+        if retire.any():
+            sel = np.flatnonzero(retire)
+            flat_result[idx[sel]] = i + 1 - np.log(0.5 * np.log(mod2[sel])) * inv_log2
+            flat_mask[idx[sel]] = False
+            if counts is not None:
+                counts.reshape(-1)[idx[sel]] = i + 1
+        if interior_check:
+            d = z - z_ref
+            periodic = d.real * d.real + d.imag * d.imag < eps2
+            if periodic.any():
+                flat_mask[idx[periodic]] = False
+                retire |= periodic
+            if (i + 1) & i == 0:
+                z_ref = z.copy()
+
+        rebase = (mod2 < dz.real * dz.real + dz.imag * dz.imag) | (m >= last)
+        if rebase.any():
+            dz[rebase] = z[rebase]
+            m[rebase] = 0
+
+        if retire.any():
+            keep = ~retire
+            idx, dz, dc, m = idx[keep], dz[keep], dc[keep], m[keep]
+            if interior_check:
+                z_ref = z_ref[keep]
+    return idx, dz, dc, m
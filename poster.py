@@ -0,0 +1,248 @@
+# poster.py
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from antialias import antialias
+from coloration import map_smooth_to_color_fixed
+from fractal_state_cpu import FractalStateCPU
+
+# Côté (en pixels) des tuiles calculées : la mémoire utilisée par un processus ne dépend
+# que de cette taille, pas de celle de l'affiche.
+POSTER_TILE = 512
+
+# Nombre de lignes compressées à la fois lors de l'écriture du PNG final.
+PNG_ROWS = 256
+
+
+def poster_tiles(width, height, tile):
+    """
+    Énumère les rectangles (y0, y1, x0, x1) des tuiles de l'affiche, ligne par ligne.
+    """
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            yield y0, min(y0 + tile, height), x0, min(x0 + tile, width)
+
+
+def _make_state(engine, fractal, width, height, max_iter, re_start, re_end, im_start, im_end):
+    if engine == "gpu":
+        from fractal_state_gpu import FractalStateGPU
+        return FractalStateGPU(width, height, max_iter, re_start, re_end, im_start, im_end,
+                               fractal_type=fractal)
+    return FractalStateCPU(width, height, max_iter, re_start, re_end, im_start, im_end, fractal_type=fractal)
+
+
+def tile_state(rect, params):
+    """
+    Calcule le rectangle 'rect' = (y0, y1, x0, x1) d'une grande image avec un moteur de
+    l'application (FractalStateCPU ou FractalStateGPU) et retourne l'état obtenu.
+
+    'params' donne le moteur, la formule, max_iter et la grille : (re_start, im_start,
+    pas_re, pas_im). La tuile est calculée comme une vue indépendante dont les bornes sont
+    celles de ses pixels ; une tuile d'un seul pixel de large (ou de haut) est calculée sur
+    deux pixels, le pas de la grille étant (fin - début) / (n - 1) : l'état peut donc
+    dépasser 'rect' d'un pixel à droite ou en bas.
+    """
+    y0, y1, x0, x1 = rect
+    re_start, im_start, step_re, step_im = params["grid"]
+    width, height = max(x1 - x0, 2), max(y1 - y0, 2)
+    return _make_state(params["engine"], params["fractal"], width, height, params["max_iter"],
+                       re_start + x0 * step_re, re_start + (x0 + width - 1) * step_re,
+                       im_start + y0 * step_im, im_start + (y0 + height - 1) * step_im)
+
+
+def compute_tile(rect, params):
+    """
+    Calcule le rectangle 'rect' (voir tile_state) et retourne son tableau 'result'.
+    """
+    y0, y1, x0, x1 = rect
+    state = tile_state(rect, params)
+    result = state.result
+    if params["engine"] == "gpu":
+        result = result.get()
+    return result[:y1 - y0, :x1 - x0]
+
+
+def antialias_tile(rect, params):
+    """
+    Couleurs anti-crénelées (voir antialias.antialias) du rectangle 'rect'. La tuile est
+    calculée avec une marge d'un pixel pour que les pixels de bord soient aussi détectés
+    le long de ses côtés. Retourne (couleurs, nombre d'échantillons supplémentaires).
+    """
+    y0, y1, x0, x1 = rect
+    width, height = params["size"]
+    my0, mx0 = max(y0 - 1, 0), max(x0 - 1, 0)
+    state = tile_state((my0, min(y1 + 1, height), mx0, min(x1 + 1, width)), params)
+    image, extra = antialias(state, params["colormap"], params["gamma"])
+    return image[y0 - my0:y1 - my0, x0 - mx0:x1 - mx0], extra
+
+
+def render_tile(job):
+    """
+    Calcule une tuile de l'affiche (voir compute_tile), la colore avec
+    map_smooth_to_color_fixed (ou l'anti-crénèle, voir antialias_tile) et l'écrit dans
+    l'image brute en memmap. Retourne (rect, nombre d'échantillons supplémentaires).
+    """
+    path, rect, params = job
+    y0, y1, x0, x1 = rect
+    extra = 0
+    if params["antialias"]:
+        colors, extra = antialias_tile(rect, params)
+    else:
+        result = compute_tile(rect, params)
+        # Même normalisation et même correction gamma que l'affichage interactif
+        normalized = np.clip(result / (params["max_iter"] + 1), 0, 1) ** params["gamma"]
+        colors = map_smooth_to_color_fixed(normalized, params["colormap"])
+    image = np.load(path, mmap_mode="r+")
+    image[y0:y1, x0:x1] = colors
+    image.flush()
+    del image
+    return rect, extra
+
+
+def _write_json(path, data):
+    # Écriture atomique : le fichier de progression est toujours complet
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _png_chunk(f, kind, data):
+    f.write(struct.pack(">I", len(data)) + kind + data)
+    f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def _png_stream(f, image, rows):
+    height, width, _ = image.shape
+    compressor = zlib.compressobj(6)
+    f.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    for y0 in range(0, height, rows):
+        block = image[y0:y0 + rows].reshape(-1, width * 3)
+        # Chaque ligne est précédée de son type de filtre (0 : aucun)
+        lines = np.zeros((block.shape[0], width * 3 + 1), dtype=np.uint8)
+        lines[:, 1:] = block
+        data = compressor.compress(lines.tobytes())
+        if data:
+            _png_chunk(f, b"IDAT", data)
+    _png_chunk(f, b"IDAT", compressor.flush())
+    _png_chunk(f, b"IEND", b"")
+
+
+def write_png(path, image, rows=PNG_ROWS):
+    """
+    Écrit l'image RGB 'image' (hauteur, largeur, 3) en uint8, éventuellement en memmap,
+    dans un PNG compressé par blocs de 'rows' lignes : seul un bloc est en mémoire à la fois.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        _png_stream(f, image, rows)
+    os.replace(tmp, path)
+
+
+def encode_png(image):
+    """
+    Retourne le contenu d'un PNG de l'image RGB 'image' (voir write_png), en mémoire.
+    """
+    buffer = io.BytesIO()
+    _png_stream(buffer, image, PNG_ROWS)
+    return buffer.getvalue()
+
+
+def render_poster(output, width, height, center_re, center_im, span_re, max_iter,
+                  colormap="viridis", gamma=0.5, tile=POSTER_TILE, workers=None,
+                  engine="cpu", fractal="Mandelbrot", antialias=False, log=print):
+    """
+    Calcule une affiche de width×height pixels centrée sur (center_re, center_im) et de
+    largeur span_re dans le plan complexe, puis l'écrit dans le PNG 'output'.
+
+    Les tuiles colorées sont écrites dans une image brute en memmap ('output'.part.npy) et
+    chaque tuile terminée est notée dans 'output'.progress.json : relancée avec les mêmes
+    paramètres après une interruption, la commande ne recalcule que les tuiles manquantes.
+    Aucun tableau de la taille de l'affiche n'est alloué en mémoire, hors memmap.
+
+    Avec 'antialias', les pixels de bord sont suréchantillonnés (voir antialias_tile) ; le
+    nombre d'échantillons supplémentaires est affiché à la fin.
+    """
+    span_im = span_re * (height - 1) / (width - 1)
+    step_re, step_im = span_re / (width - 1), span_im / (height - 1)
+    params = {"size": [width, height], "center": [center_re, center_im], "span": span_re,
+              "max_iter": max_iter, "colormap": colormap, "gamma": gamma, "tile": tile,
+              "engine": engine, "fractal": fractal, "antialias": antialias,
+              "grid": [center_re - span_re / 2, center_im - span_im / 2, step_re, step_im]}
+    part = output + ".part.npy"
+    progress = output + ".progress.json"
+
+    done = set()
+    if os.path.exists(part) and os.path.exists(progress):
+        with open(progress) as f:
+            saved = json.load(f)
+        if saved["params"] == params:
+            done = {tuple(rect) for rect in saved["done"]}
+    if not done:
+        # Crée l'image brute (en-tête .npy et taille finale) ; chaque processus la rouvre
+        # pour y écrire ses tuiles (voir render_tile)
+        np.lib.format.open_memmap(part, mode="w+", dtype=np.uint8, shape=(height, width, 3)).flush()
+        _write_json(progress, {"params": params, "done": []})
+
+    todo = [rect for rect in poster_tiles(width, height, tile) if rect not in done]
+    total = len(done) + len(todo)
+    if done:
+        log("Reprise : %d tuiles sur %d déjà calculées" % (len(done), total))
+    jobs = [(part, rect, params) for rect in todo]
+    if engine == "gpu" or workers == 1:
+        finished = map(render_tile, jobs)
+        pool = None
+    else:
+        pool = mp.Pool(workers)
+        finished = pool.imap_unordered(render_tile, jobs, chunksize=1)
+    extra = 0
+    try:
+        for rect, samples in finished:
+            extra += samples
+            done.add(rect)
+            _write_json(progress, {"params": params, "done": sorted(done)})
+            log("Tuiles : %d / %d" % (len(done), total))
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if antialias:
+        log("Échantillons supplémentaires : %d (%.2f par pixel calculé)"
+            % (extra, extra / max(1, sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in todo))))
+    write_png(output, np.load(part, mmap_mode="r"))
+    os.remove(part)
+    os.remove(progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rendu d'une affiche en haute définition, sans fenêtre.")
+    parser.add_argument("output", help="fichier PNG à écrire")
+    parser.add_argument("--size", type=int, nargs=2, default=(8192, 8192), metavar=("LARGEUR", "HAUTEUR"))
+    parser.add_argument("--center", type=float, nargs=2, default=(-0.75, 0.0), metavar=("RE", "IM"))
+    parser.add_argument("--span", type=float, default=3.5, help="largeur de la vue dans le plan complexe")
+    parser.add_argument("--max-iter", type=int, default=500)
+    parser.add_argument("--colormap", default="viridis")
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--tile", type=int, default=POSTER_TILE)
+    parser.add_argument("--workers", type=int, default=None, help="processus de calcul (défaut : tous les cœurs)")
+    parser.add_argument("--engine", choices=("cpu", "gpu"), default="cpu")
+    parser.add_argument("--fractal", default="Mandelbrot", help="formule (voir formulas.FORMULAS)")
+    parser.add_argument("--antialias", action="store_true", help="suréchantillonne les pixels de bord")
+    args = parser.parse_args(argv)
+    width, height = args.size
+    render_poster(args.output, width, height, args.center[0], args.center[1], args.span, args.max_iter,
+                  args.colormap, args.gamma, args.tile, args.workers, args.engine, args.fractal,
+                  args.antialias)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# precision.py
+import numpy as np
+
+# Au-dessus de cet écart entre pixels (relatif à |centre|), les points et les orbites
+# peuvent être calculés en complex64 : l'erreur d'arrondi du float32 (≈ 1.2e-7) reste
+# inférieure à la taille d'un pixel. En dessous, le calcul passe en complex128.
+SINGLE_PRECISION_LIMIT = 3e-4
+
+# L'erreur du float32 s'amplifie le long des orbites proches du bord : "auto" ne choisit
+# complex64 que jusqu'à ce nombre d'itérations. Mesuré sur la vue initiale (300 × 200 et
+# 1100 × 600) : à 50 itérations, 0.02 % des pixels diffèrent du double de plus de 0.01 et
+# aucun d'une itération ; à 100 itérations, 0.16 % et 0.02 % ; à 300 itérations, 0.37 % et
+# 0.1 % (jusqu'à 99 itérations d'écart).
+SINGLE_PRECISION_MAX_ITER = 64
+
+# Type des valeurs smooth ('result') : un float32 représente exactement les itérations
+# jusqu'à 2**24 avec une partie fractionnaire bien plus fine que les 4096 entrées des LUT.
+RESULT_DTYPE = np.float32
+
+# Politiques acceptées par les états de fractale (paramètre 'precision').
+PRECISION_POLICIES = ("auto", "single", "double")
+
+
+def complex_dtype(policy, center_re, center_im, step, max_iter):
+    """
+    Retourne le type complexe (np.complex64 ou np.complex128) à utiliser pour une vue
+    d'écart entre pixels 'step' autour du centre donné, calculée en max_iter itérations :
+    "single" et "double" l'imposent, "auto" ne choisit complex64 que si max_iter ne
+    dépasse pas SINGLE_PRECISION_MAX_ITER et que step dépasse SINGLE_PRECISION_LIMIT * |centre|.
+    La vue initiale de l'application (100 itérations) est donc calculée en double.
+    """
+    if policy not in PRECISION_POLICIES:
+        raise ValueError("precision inconnue : %r" % (policy,))
+    if policy == "double":
+        return np.complex128
+    if policy == "single":
+        return np.complex64
+    if max_iter > SINGLE_PRECISION_MAX_ITER:
+        return np.complex128
+    magnitude = max(abs(float(center_re)), abs(float(center_im)), 1.0)
+    return np.complex64 if step > SINGLE_PRECISION_LIMIT * magnitude else np.complex128
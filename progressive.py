@@ -0,0 +1,35 @@
+# progressive.py
+import numpy as np
+
+# Pas successifs (en pixels) des passes du rendu progressif : 1/8, 1/4, 1/2 puis pleine résolution.
+PROGRESSIVE_STRIDES = (8, 4, 2, 1)
+
+
+def pass_mask(height, width, stride, previous=None):
+    """
+    Retourne le masque des pixels calculés par la passe de pas 'stride' : les pixels de la
+    grille (y % stride == 0, x % stride == 0) qui n'appartiennent pas à celle de la passe
+    précédente (pas 'previous').
+    """
+    grid = np.zeros((height, width), dtype=bool)
+    grid[::stride, ::stride] = True
+    if previous is not None:
+        grid[::previous, ::previous] = False
+    return grid
+
+
+def fill_from_grid(result, stride, keep=None):
+    """
+    Complète 'result' en place à partir des pixels de la grille de pas 'stride' (déjà
+    calculés) : chaque pixel reçoit la valeur du pixel de grille situé en haut à gauche
+    de son bloc. Les pixels de la grille et ceux du masque 'keep' sont inchangés.
+    """
+    if stride == 1:
+        return
+    height, width = result.shape
+    coarse = result[::stride, ::stride]
+    filled = np.repeat(np.repeat(coarse, stride, axis=0), stride, axis=1)[:height, :width]
+    if keep is None:
+        result[:] = filled
+    else:
+        np.copyto(result, filled, where=~keep)
@@ -1,30 +1,91 @@
 # renderer_cpu.py
 import pygame
 import numpy as np
-from coloration import map_smooth_to_color_fixed
+from coloration import colormap_lut, quantize
+from instrumentation import PROFILER
+
+# Tampons conservés d'un affichage à l'autre : surface cible, indices quantifiés et
+# tables de couleurs déjà converties au format de pixel de la surface.
+_surface = None
+_indices = None
+_scratch = None
+_packed_luts = {}
+_last_frame = None
+
+
+def _packed_lut(surface, colormap_name, gamma):
+    """
+    Retourne la LUT (colormap, gamma) sous forme d'entiers 32 bits au format de 'surface'.
+    """
+    key = (colormap_name, gamma)
+    packed = _packed_luts.get(key)
+    if packed is None:
+        lut = colormap_lut(colormap_name, gamma).astype(np.uint32)
+        shifts, losses = surface.get_shifts(), surface.get_losses()
+        packed = np.zeros(len(lut), dtype=np.uint32)
+        for channel in range(3):
+            packed |= (lut[:, channel] >> losses[channel]) << shifts[channel]
+        _packed_luts[key] = packed
+    return packed
+
+
+def blit_result(screen, result, max_iter, colormap_name="viridis", gamma=0.5, requantize=True):
+    """
+    Colore 'result' et le copie sur 'screen' sans allouer de tableau ni de surface.
+
+    'result' est quantifié en indices de LUT (étape sautée si requantize est faux), puis les
+    couleurs sont écrites directement dans une surface persistante via surfarray.pixels2d.
+    """
+    global _surface, _indices, _scratch
+    height, width = result.shape
+    if _surface is None or _surface.get_size() != (width, height):
+        _surface = pygame.Surface((width, height), 0, 32)
+        _indices = np.empty((height, width), dtype=np.uint16)
+        _scratch = np.empty((height, width), dtype=np.float32)
+        _packed_luts.clear()
+        requantize = True
+    if requantize:
+        with PROFILER.span("quantize"):
+            quantize(result, max_iter, out=_indices, scratch=_scratch)
+    with PROFILER.span("colorize"):
+        pixels = pygame.surfarray.pixels2d(_surface)
+        # pixels2d est indexé (x, y) : sa transposée est la mémoire de la surface ligne par ligne
+        np.take(_packed_lut(_surface, colormap_name, gamma), _indices, out=pixels.T, mode="clip")
+        del pixels
+    with PROFILER.span("blit"):
+        screen.blit(_surface, (0, 0))
+
 
 def display_fractal(screen, state, colormap_name="viridis", gamma=0.5):
     """
     Affiche la fractale à partir de l'état CPU.
-    Normalise le tableau 'result' obtenu par NumPy, applique une correction gamma,
-    puis utilise un colormap pour obtenir l'image finale en RGB affichée via Pygame.
-    
+    Quantifie le tableau 'result' en indices d'une table de couleurs (LUT) où la correction
+    gamma est déjà appliquée, puis écrit l'image RGB dans une surface Pygame persistante.
+
     Paramètres :
       - screen : Surface Pygame où afficher l'image.
-      - state : Instance de FractalStateCPU contenant 'result', 'max_iter', etc.
+      - state : Instance de FractalStateCPU (ou image publiée par le thread de calcul)
+        contenant 'result', 'max_iter', etc.
       - colormap_name : Nom du colormap à appliquer (défaut "viridis").
       - gamma : Valeur de correction gamma à appliquer (défaut 0.5).
+
+    Une image publiée (qui possède un numéro 'generation') ne change plus : si elle est
+    réaffichée, par exemple pour un changement de gamma ou de palette, seule la LUT change.
+    L'image est seulement dessinée sur 'screen' : l'application la présente une fois par
+    tour, avec l'interface (voir ui.draw_ui).
+    """
+    global _last_frame
+    same_frame = state is _last_frame and getattr(state, "generation", None) is not None
+    blit_result(screen, state.result, state.max_iter, colormap_name, gamma, requantize=not same_frame)
+    _last_frame = state
+
+
+def restore_background(screen, rect):
+    """
+    Recopie sur 'screen' le rectangle 'rect' de la dernière image affichée, par exemple sous
+    un élément de l'interface redessiné (voir ui.draw_ui).
     """
-    # Normalisation de la fractale en fonction du nombre maximal d'itérations
-    normalized = state.result / (state.max_iter + 1)
-    normalized = np.clip(normalized, 0, 1)
-    normalized = np.power(normalized, gamma)
-    
-    # Application du colormap pour obtenir une image RGB
-    color_array = map_smooth_to_color_fixed(normalized, colormap_name)
-    
-    # Pygame attend une surface avec un tableau de forme (width, height, 3),
-    # donc on transpose le tableau (qui est initialement de forme (hauteur, largeur, 3))
-    surface = pygame.surfarray.make_surface(np.transpose(color_array, (1, 0, 2)))
-    screen.blit(surface, (0, 0))
-    pygame.display.flip()
+    if _surface is None:
+        screen.fill((0, 0, 0), rect)
+    else:
+        screen.blit(_surface, rect, rect)
@@ -0,0 +1,68 @@
+# symmetry.py
+import numpy as np
+
+# Symétries reconnues (attribut 'symmetry' des formules, voir formulas.Formula) :
+# "conjugate" : la formule commute avec la conjugaison (z, c -> conj z, conj c) et l'image
+# est symétrique par rapport à l'axe réel ; "point" : pour une formule de type Julia en z²,
+# les points p et -p ont la même orbite dès la première itération (symétrie centrale).
+SYMMETRIES = ("conjugate", "point")
+
+
+def centered_axis(start, end, num, xp=np):
+    """
+    Équivalent de linspace(start, end, num) calculé depuis le milieu de l'intervalle :
+    les valeurs sont milieu + k * pas avec k demi-entier ou entier, si bien qu'un
+    intervalle centré sur 0 donne des valeurs exactement opposées deux à deux (ligne de
+    pixels et son image par symétrie).
+    """
+    step = (end - start) / (num - 1)
+    return (start + end) / 2 + (xp.arange(num) - (num - 1) / 2) * step
+
+
+def _opposites(values):
+    # Pour chaque valeur, indice de la valeur exactement opposée (-1 si absente)
+    lookup = {value: i for i, value in enumerate(values.tolist())}
+    return np.array([lookup.get(-value, -1) for value in values.tolist()], dtype=np.intp)
+
+
+def mirror_pairs(axis_re, axis_im, symmetry):
+    """
+    Paires de pixels images l'un de l'autre par la symétrie 'symmetry' dans la grille
+    d'axes (axis_re, axis_im) : retourne (dst, src), indices plats tels que chaque pixel
+    dst peut recevoir la valeur de src au lieu d'être calculé. Seules les coordonnées
+    exactement opposées (dans le type de calcul des points) sont appariées ; les pixels
+    dst sont ceux de partie imaginaire positive, ceux de l'axe restent à calculer (sauf,
+    pour la symétrie centrale, la moitié de partie réelle positive).
+    """
+    width = axis_re.size
+    rows = _opposites(axis_im)
+    dst_rows = np.flatnonzero((rows >= 0) & (axis_im > 0))
+    src_rows = rows[dst_rows]
+    if symmetry == "conjugate":
+        cols = np.arange(width)
+        dst = dst_rows[:, np.newaxis] * width + cols
+        src = src_rows[:, np.newaxis] * width + cols
+        return dst.ravel(), src.ravel()
+    if symmetry != "point":
+        raise ValueError("symétrie inconnue : %r" % (symmetry,))
+    cols = _opposites(axis_re)
+    dst_cols = np.flatnonzero(cols >= 0)
+    src_cols = cols[dst_cols]
+    dst = [(dst_rows[:, np.newaxis] * width + dst_cols).ravel()]
+    src = [(src_rows[:, np.newaxis] * width + src_cols).ravel()]
+    # Sur l'axe réel, la moitié de partie réelle positive est l'image de l'autre
+    half = np.flatnonzero((cols >= 0) & (axis_re > 0))
+    for row in np.flatnonzero(axis_im == 0):
+        dst.append(row * width + half)
+        src.append(row * width + cols[half])
+    return np.concatenate(dst), np.concatenate(src)
+
+
+def mirror_orbit(symmetry, *arrays, xp=np):
+    """
+    Valeurs (z, c, z précédent...) de l'orbite image d'une orbite déjà itérée au moins une
+    fois : conjuguées pour "conjugate", identiques pour "point". Les None sont conservés.
+    """
+    if symmetry == "conjugate":
+        return tuple(None if a is None else xp.conj(a) for a in arrays)
+    return tuple(None if a is None else a.copy() for a in arrays)
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Les modules du projet sont à la racine du dépôt, sans paquet
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+# test_interior_check.py
+import numpy as np
+import pytest
+
+from formulas import FORMULAS
+from fractal_state_cpu import FractalStateCPU
+
+# Vues comparées (re_start, re_end, im_start, im_end) : la vue initiale et une vue
+# presque entièrement intérieure, où la détection de cycle retire le plus de pixels.
+VIEWS = {"home": (-2.0, 1.0, -1.2, 1.2), "interior": (-0.35, 0.15, -0.2, 0.2)}
+
+WIDTH, HEIGHT = 96, 64
+MAX_ITER = 200
+ADDED_ITER = 500
+
+
+def _pair(fractal_type, precision, view):
+    return [FractalStateCPU(WIDTH, HEIGHT, MAX_ITER, *VIEWS[view], fractal_type=fractal_type,
+                            precision=precision, interior_check=interior_check)
+            for interior_check in (True, False)]
+
+
+@pytest.mark.parametrize("view", sorted(VIEWS))
+@pytest.mark.parametrize("precision", ["single", "double"])
+@pytest.mark.parametrize("fractal_type", sorted(FORMULAS))
+def test_interior_check_keeps_result(fractal_type, precision, view):
+    """
+    L'écartement des pixels intérieurs (cardioïde, bourgeon, orbites périodiques) ne
+    change pas l'image, ni après l'ajout d'itérations.
+    """
+    checked, plain = _pair(fractal_type, precision, view)
+    assert np.array_equal(checked.result, plain.result)
+
+    checked.update_add_iterations(ADDED_ITER)
+    plain.update_add_iterations(ADDED_ITER)
+    assert np.array_equal(checked.result, plain.result)
@@ -0,0 +1,53 @@
+# test_symmetry.py
+import numpy as np
+import pytest
+
+from fractal_state_cpu import FractalStateCPU
+from fractal_state_mp import FractalStateMP
+
+# Formules à symétrie "conjugate" (axe réel) et "point" (centre 0).
+SYMMETRIC_FORMULAS = ["Mandelbrot", "Tricorn", "Multibrot3", "Phoenix", "Julia", "Custom"]
+
+# Vues comparées : centrée sur 0 (les deux symétries s'y appliquent), traversée par l'axe
+# réel hors de son milieu, et entièrement au-dessus (l'axe y entre lors de la translation).
+VIEWS = {"straddling": (-1.6, 1.6, -1.2, 1.2), "off_centre": (-2.0, 1.0, -0.5, 1.3),
+         "above": (-2.0, 1.0, 0.3, 1.5)}
+
+WIDTH, HEIGHT = 96, 64
+MAX_ITER = 100
+ADDED_ITER = 300
+# Translation (en pixels) qui fait passer l'axe réel dans la vue "above"
+PAN = (5, 40)
+
+STATES = {"cpu": (FractalStateCPU, {}), "mp": (FractalStateMP, {"workers": 2})}
+
+
+@pytest.mark.parametrize("view", sorted(VIEWS))
+@pytest.mark.parametrize("fractal_type", SYMMETRIC_FORMULAS)
+@pytest.mark.parametrize("engine", sorted(STATES))
+def test_symmetry_keeps_result(engine, fractal_type, view):
+    """
+    La recopie des pixels symétriques donne exactement l'image calculée pixel par pixel,
+    après un recalcul complet, une translation à travers l'axe et l'ajout d'itérations.
+    """
+    cls, options = STATES[engine]
+    states = [cls(WIDTH, HEIGHT, MAX_ITER, *VIEWS[view], fractal_type=fractal_type, symmetry=symmetry,
+                  **options) for symmetry in (True, False)]
+    mirrored, plain = states
+    try:
+        assert np.array_equal(mirrored.result, plain.result)
+        if view == "straddling":
+            # Les pixels images n'ont pas été calculés
+            assert mirrored.computed_fraction < plain.computed_fraction
+
+        for state in states:
+            state.apply_translation(*PAN)
+        assert np.array_equal(mirrored.result, plain.result)
+
+        for state in states:
+            state.update_add_iterations(ADDED_ITER)
+        assert np.array_equal(mirrored.result, plain.result)
+    finally:
+        for state in states:
+            if hasattr(state, "close"):
+                state.close()
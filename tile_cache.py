@@ -0,0 +1,212 @@
+# tile_cache.py
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+# Côté (en pixels) des tuiles mises en cache. Les tuiles suivent un réseau global : le
+# pixel (gx, gy) du réseau de phase (px, py) correspond au point
+# ((gx + px / LATTICE_PHASE_STEPS) * pas_re, (gy + py / LATTICE_PHASE_STEPS) * pas_im).
+TILE_SIZE = 64
+
+# Résolution de la phase d'une vue dans le réseau (en fractions de pixel) : deux vues de
+# même échelle ne partagent leurs tuiles que si leurs pixels coïncident à ce pas près.
+LATTICE_PHASE_STEPS = 10**6
+
+# Statut d'un pixel dans une tuile mise en cache.
+ESCAPED, ACTIVE, INTERIOR = 0, 1, 2
+
+# Taille maximale par défaut du cache en mémoire (en octets).
+MEMORY_BYTES = 256 * 2**20
+
+
+def level_key(step_re, step_im, phase):
+    """
+    Niveau de zoom : écart entre pixels arrondi, pour que deux vues de même échelle
+    calculées par des chemins différents (reset, zoom arrière...) partagent leurs tuiles,
+    et phase de la vue dans le réseau (voir lattice_origin).
+    """
+    return float("%.12g" % step_re), float("%.12g" % step_im), phase
+
+
+def lattice_origin(re_start, im_start, step_re, step_im):
+    """
+    Retourne les coordonnées (gx0, gy0) dans le réseau global du pixel (0, 0) de la vue et
+    la phase (px, py) de ce pixel entre deux points du réseau, en 1/LATTICE_PHASE_STEPS de
+    pixel. La vue n'est pas déplacée sur le réseau : elle garde sa propre grille de
+    pixels, et seules les vues de même phase, dont les pixels coïncident, partagent leurs
+    tuiles (la phase fait partie de level_key).
+    """
+    gx0, px = divmod(round(re_start / step_re * LATTICE_PHASE_STEPS), LATTICE_PHASE_STEPS)
+    gy0, py = divmod(round(im_start / step_im * LATTICE_PHASE_STEPS), LATTICE_PHASE_STEPS)
+    return (gx0, gy0), (px, py)
+
+
+def pixel_status(result, mask, max_iter):
+    """
+    Statut de chaque pixel d'une vue calculée jusqu'à max_iter : ACTIVE (encore itéré),
+    INTERIOR (écarté comme intérieur) ou ESCAPED.
+    """
+    status = np.full(result.shape, ESCAPED, dtype=np.uint8)
+    status[result == max_iter] = INTERIOR
+    status[mask] = ACTIVE
+    return status
+
+
+def view_tiles(gx0, gy0, rect):
+    """
+    Énumère les tuiles du réseau qui recouvrent le rectangle 'rect' = (y0, y1, x0, x1) d'une
+    vue dont le pixel (0, 0) est le point (gx0, gy0) du réseau.
+
+    Pour chaque tuile, retourne (tx, ty, view, tile) où 'view' et 'tile' sont les couples de
+    tranches (lignes, colonnes) de la partie commune, dans la vue et dans la tuile.
+    """
+    y0, y1, x0, x1 = rect
+    t = TILE_SIZE
+    for ty in range((gy0 + y0) // t, (gy0 + y1 - 1) // t + 1):
+        gy_lo, gy_hi = max(ty * t, gy0 + y0), min((ty + 1) * t, gy0 + y1)
+        for tx in range((gx0 + x0) // t, (gx0 + x1 - 1) // t + 1):
+            gx_lo, gx_hi = max(tx * t, gx0 + x0), min((tx + 1) * t, gx0 + x1)
+            view = (slice(gy_lo - gy0, gy_hi - gy0), slice(gx_lo - gx0, gx_hi - gx0))
+            tile = (slice(gy_lo - ty * t, gy_hi - ty * t), slice(gx_lo - tx * t, gx_hi - tx * t))
+            yield tx, ty, view, tile
+
+
+def _as_tuple(value):
+    return tuple(_as_tuple(v) for v in value) if isinstance(value, list) else value
+
+
+class TileCache:
+    """
+    Cache de tuiles calculées, indexé par (type de fractale, paramètres de la formule,
+    niveau de zoom, tx, ty) puis par max_iter.
+
+    Chaque entrée contient des tableaux TILE_SIZE×TILE_SIZE : 'result', 'status'
+    (ESCAPED, ACTIVE ou INTERIOR) et 'z' pour les pixels encore actifs, ce qui permet de
+    reprendre une entrée calculée avec un max_iter inférieur. Le cache en mémoire est
+    borné en octets et évince les entrées les moins récemment utilisées ; avec 'disk_dir',
+    elles sont alors écrites sur disque (un fichier .npy par tableau, relu en memmap).
+    """
+
+    def __init__(self, max_bytes=MEMORY_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.resumes = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._disk = {}
+        # max_iter disponibles (mémoire et disque) pour chaque tuile
+        self._levels = {}
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def lookup(self, base_key, max_iter, resume=True):
+        """
+        Retourne (entry_max_iter, arrays) pour la tuile 'base_key' : l'entrée calculée
+        avec max_iter si elle existe, sinon (avec resume) celle du plus grand max_iter
+        inférieur, à reprendre à partir de ses 'z'. Retourne None en cas d'absence.
+        """
+        levels = self._levels.get(base_key, ())
+        if max_iter in levels:
+            best = max_iter
+        else:
+            lower = [m for m in levels if m < max_iter] if resume else []
+            if not lower:
+                self.misses += 1
+                return None
+            best = max(lower)
+        key = (base_key, best)
+        arrays = self._memory.get(key)
+        if arrays is None:
+            arrays = self._load(key)
+            self._insert(key, arrays)
+            self._evict()
+        else:
+            self._memory.move_to_end(key)
+        if best == max_iter:
+            self.hits += 1
+        else:
+            self.resumes += 1
+        return best, arrays
+
+    def store(self, base_key, max_iter, **arrays):
+        """
+        Enregistre une tuile complète (les tableaux sont copiés).
+        """
+        key = (base_key, max_iter)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._insert(key, {name: np.array(a) for name, a in arrays.items()})
+        self._levels.setdefault(base_key, set()).add(max_iter)
+        self._evict()
+
+    def hit_rate(self):
+        """
+        Part des recherches satisfaites par le cache (entrées exactes et points de reprise).
+        """
+        lookups = self.hits + self.resumes + self.misses
+        return (self.hits + self.resumes) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "resumes": self.resumes, "misses": self.misses,
+                "hit_rate": self.hit_rate(), "entries": len(self._memory), "bytes": self.nbytes,
+                "disk_entries": len(self._disk)}
+
+    def _insert(self, key, arrays):
+        self._memory[key] = arrays
+        self.nbytes += sum(a.nbytes for a in arrays.values())
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._memory) > 1:
+            key, arrays = self._memory.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in arrays.values())
+            if self.disk_dir is not None:
+                if key not in self._disk:
+                    self._save(key, arrays)
+            else:
+                levels = self._levels[key[0]]
+                levels.discard(key[1])
+                if not levels:
+                    del self._levels[key[0]]
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, digest)
+
+    def _save(self, key, arrays):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name, a in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), a)
+        with open(os.path.join(tmp, "key.json"), "w") as f:
+            json.dump(key, f)
+        # Le renommage rend l'entrée visible d'un seul coup
+        if os.path.exists(path):
+            shutil.rmtree(tmp)
+        else:
+            os.replace(tmp, path)
+        self._disk[key] = path
+
+    def _load(self, key):
+        path = self._disk[key]
+        return {name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+                for name in os.listdir(path) if name.endswith(".npy")}
+
+    def _scan_disk(self):
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                with open(os.path.join(path, "key.json")) as f:
+                    base_key, max_iter = _as_tuple(json.load(f))
+            except (OSError, ValueError):
+                continue
+            self._disk[(base_key, max_iter)] = path
+            self._levels.setdefault(base_key, set()).add(max_iter)
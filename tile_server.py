@@ -0,0 +1,439 @@
+# tile_server.py
+import argparse
+import json
+import multiprocessing as mp
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from coloration import map_smooth_to_color_fixed
+from formulas import FORMULAS, get_formula
+from poster import compute_tile, encode_png
+
+# Côté (en pixels) des tuiles servies, comme les cartes en ligne.
+TILE_PX = 256
+
+# Vue du niveau 0 (une seule tuile) : centre et largeur dans le plan complexe. Au niveau z,
+# la vue est découpée en 2^z × 2^z tuiles ; la ligne 0 d'une tuile est la partie
+# imaginaire la plus petite, comme dans l'application.
+WORLD_CENTER = (-0.5, 0.0)
+WORLD_SPAN = 4.0
+
+# Niveau de zoom maximal accepté (au-delà, le pas des pixels sort de la double précision
+# et le calcul passe par la perturbation, bien plus lente).
+MAX_ZOOM = 40
+
+# max_iter d'une tuile de niveau z : TILE_ITER_BASE + z * TILE_ITER_STEP, borné par
+# TILE_ITER_MAX. Toutes les tuiles d'un même niveau ont le même max_iter (pas de raccord).
+TILE_ITER_BASE = 200
+TILE_ITER_STEP = 100
+TILE_ITER_MAX = 5000
+
+# Mémoire (en octets) des PNG gardés en mémoire par le serveur (LRU).
+TILE_MEMORY_BYTES = 64 * 1024 * 1024
+
+# Rendus en attente ou en cours par processus de calcul au-delà desquels une nouvelle
+# tuile est refusée (503) : un client qui défile vite ne peut pas empiler des milliers de
+# tuiles déjà sorties de son écran, il les redemandera si elles sont encore visibles.
+PENDING_PER_WORKER = 2
+
+# Délai (en secondes) conseillé au client avant de redemander une tuile refusée.
+RETRY_AFTER = 1
+
+# Nouvelles demandes au plus d'une tuile refusée (503) par le test de charge ; au-delà,
+# la tuile est comptée comme un échec.
+LOAD_TEST_RETRIES = 30
+
+_TILE_PATH = re.compile(r"^/([^/]+)/(\d+)/(\d+)/(\d+)\.png$")
+
+
+class TileBusy(Exception):
+    """
+    Trop de rendus en attente : la tuile n'a pas été mise en file.
+    """
+
+
+def tile_max_iter(z):
+    return min(TILE_ITER_BASE + z * TILE_ITER_STEP, TILE_ITER_MAX)
+
+
+def tile_grid(z, x, y):
+    """
+    Grille (re_start, im_start, pas_re, pas_im) de la tuile (z, x, y), au format de
+    poster.tile_state : les pixels des tuiles voisines se suivent au même pas.
+    """
+    step = WORLD_SPAN / (2 ** z * TILE_PX)
+    re_start = WORLD_CENTER[0] - WORLD_SPAN / 2 + x * TILE_PX * step
+    im_start = WORLD_CENTER[1] - WORLD_SPAN / 2 + y * TILE_PX * step
+    return [re_start, im_start, step, step]
+
+
+def _init_worker():
+    # Ctrl+C arrête le serveur, qui termine lui-même le pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def render_tile_png(fractal, z, x, y, colormap, gamma):
+    """
+    Calcule la tuile (z, x, y) de la formule 'fractal' avec FractalStateCPU (voir
+    poster.compute_tile), la colore avec map_smooth_to_color_fixed et retourne son PNG.
+    Exécutée dans les processus de calcul du serveur.
+    """
+    max_iter = tile_max_iter(z)
+    params = {"engine": "cpu", "fractal": fractal, "max_iter": max_iter, "grid": tile_grid(z, x, y)}
+    result = compute_tile((0, TILE_PX, 0, TILE_PX), params)
+    # Même normalisation et même correction gamma que l'affichage interactif
+    normalized = np.clip(result / (max_iter + 1), 0, 1) ** gamma
+    return encode_png(map_smooth_to_color_fixed(normalized, colormap))
+
+
+class TileService:
+    """
+    Tuiles PNG calculées par un pool de 'workers' processus, avec un cache en mémoire (LRU
+    de 'memory_bytes' octets) et, si 'cache_dir' est donné, un cache sur disque
+    (cache_dir/<palette>_<gamma>/<formule>/z/x/y.png) qui survit au serveur.
+
+    Les demandes simultanées d'une même tuile attendent le même rendu. Au-delà de
+    'max_pending' rendus en attente ou en cours, une nouvelle tuile lève TileBusy au lieu
+    d'être mise en file.
+    """
+
+    def __init__(self, workers=None, colormap="viridis", gamma=0.5, memory_bytes=TILE_MEMORY_BYTES,
+                 cache_dir=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.colormap = colormap
+        self.gamma = gamma
+        self.memory_bytes = memory_bytes
+        self.cache_dir = None if cache_dir is None else os.path.join(cache_dir, "%s_%g" % (colormap, gamma))
+        self.max_pending = max_pending or PENDING_PER_WORKER * self.workers
+        self.pool = mp.Pool(self.workers, initializer=_init_worker)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._pending = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "renders": 0, "coalesced": 0, "rejected": 0,
+                      "errors": 0}
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def _disk_path(self, key):
+        fractal, z, x, y = key
+        return os.path.join(self.cache_dir, quote(fractal, safe=""), str(z), str(x), "%d.png" % y)
+
+    def _remember(self, key, data):
+        # Appelée avec self._lock
+        if key in self._memory:
+            return
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_used -= len(old)
+
+    def _read_disk(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un autre serveur ne lit jamais un PNG incomplet
+        tmp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _finished(self, key, data):
+        # Appelée par le thread de résultats du pool, avant le réveil des demandes en attente
+        with self._lock:
+            self._remember(key, data)
+            del self._pending[key]
+        if self.cache_dir is not None:
+            try:
+                self._write_disk(key, data)
+            except OSError:
+                pass
+
+    def _failed(self, key, error):
+        with self._lock:
+            self.stats["errors"] += 1
+            del self._pending[key]
+
+    def get(self, fractal, z, x, y, timeout=None):
+        """
+        PNG de la tuile (z, x, y) de la formule 'fractal'. Lève ValueError pour une tuile
+        hors de la carte ou une formule inconnue, TileBusy si la file de rendus est pleine.
+        """
+        get_formula(fractal)
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError("tuile hors de la carte : %d/%d/%d" % (z, x, y))
+        key = (fractal, z, x, y)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.stats["coalesced"] += 1
+        if pending is None:
+            data = self._read_disk(key)
+            if data is not None:
+                with self._lock:
+                    self._remember(key, data)
+                    self.stats["disk_hits"] += 1
+                return data
+            with self._lock:
+                # Le rendu a pu se terminer ou commencer pendant la lecture du disque
+                data = self._memory.get(key)
+                if data is not None:
+                    self.stats["memory_hits"] += 1
+                    return data
+                pending = self._pending.get(key)
+                if pending is not None:
+                    self.stats["coalesced"] += 1
+                elif len(self._pending) >= self.max_pending:
+                    self.stats["rejected"] += 1
+                    raise TileBusy(key)
+                else:
+                    self.stats["renders"] += 1
+                    pending = self.pool.apply_async(
+                        render_tile_png, (fractal, z, x, y, self.colormap, self.gamma),
+                        callback=lambda data: self._finished(key, data),
+                        error_callback=lambda error: self._failed(key, error))
+                    self._pending[key] = pending
+        return pending.get(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(pending=len(self._pending), memory_tiles=len(self._memory),
+                         memory_bytes=self._memory_used)
+        return stats
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """
+    GET /{formule}/{z}/{x}/{y}.png (nom de formule encodé dans l'URL, par exemple
+    Burning%20Ship) et GET /stats (compteurs du service, en JSON).
+    """
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            body = json.dumps(self.server.service.snapshot()).encode()
+            self._send(200, body, "application/json")
+            return
+        match = _TILE_PATH.match(self.path.split("?", 1)[0])
+        if match is None:
+            self._send(404, b"chemin attendu : /formule/z/x/y.png\n", "text/plain; charset=utf-8")
+            return
+        fractal = unquote(match.group(1))
+        z, x, y = (int(value) for value in match.groups()[1:])
+        try:
+            data = self.server.service.get(fractal, z, x, y)
+        except ValueError as error:
+            self._send(404, (str(error) + "\n").encode(), "text/plain; charset=utf-8")
+        except TileBusy:
+            self._send(503, b"trop de tuiles en attente\n", "text/plain; charset=utf-8",
+                       [("Retry-After", str(RETRY_AFTER))])
+        except Exception as error:
+            self._send(500, (repr(error) + "\n").encode(), "text/plain; charset=utf-8")
+        else:
+            self._send(200, data, "image/png", [("Cache-Control", "max-age=86400")])
+
+
+class TileServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # File d'attente des connexions du système : celle par défaut (5) fait perdre des
+    # connexions à un client qui ouvre plusieurs requêtes à la fois (reprise après 1 s).
+    request_queue_size = 128
+
+
+def make_server(service, host="127.0.0.1", port=8000, verbose=False):
+    server = TileServer((host, port), TileHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def scroll_workload(fractal="Mandelbrot", z=4, view=(4, 3), steps=8):
+    """
+    Suite de « vues » d'un client qui défile : à chaque pas, la fenêtre de view = (colonnes,
+    lignes) tuiles du niveau z avance d'une colonne ; puis le même trajet est refait au
+    niveau z + 1. Retourne la liste des vues, chacune liste d'URL relatives.
+    """
+    views = []
+    for level in (z, z + 1):
+        size = 2 ** level
+        columns, rows = view
+        y0 = max(0, size // 2 - rows // 2)
+        for step in range(steps):
+            x0 = (step + size // 2 - columns) % size
+            views.append(["/%s/%d/%d/%d.png" % (quote(fractal), level, (x0 + dx) % size, min(y0 + dy, size - 1))
+                          for dx in range(columns) for dy in range(rows)])
+    return views
+
+
+def _fetch(url, retries=LOAD_TEST_RETRIES):
+    """
+    Demande une tuile jusqu'à l'obtenir : une réponse 503 est redemandée après le délai de
+    son en-tête Retry-After, au plus 'retries' fois. Retourne (statut final, durée totale
+    attente comprise, nombre de refus).
+    """
+    start = time.perf_counter()
+    rejected = 0
+    while True:
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+            if status == 503 and rejected < retries:
+                rejected += 1
+                time.sleep(float(error.headers.get("Retry-After", RETRY_AFTER)))
+                continue
+        return status, time.perf_counter() - start, rejected
+
+
+def load_test(base_url, views, concurrency=8, clients=2, interval=0.0, log=print):
+    """
+    Charge le serveur de 'base_url' avec 'clients' clients simulés qui parcourent chacun
+    les mêmes vues (voir scroll_workload) : les tuiles d'une vue sont demandées en
+    parallèle ('concurrency' connexions par client). Avec interval = 0, un client attend
+    d'avoir reçu toutes les tuiles d'une vue avant de passer à la suivante ; sinon il
+    défile toutes les 'interval' secondes sans attendre.
+
+    Une tuile refusée (503) est redemandée après Retry-After (voir _fetch) : toutes les
+    tuiles sont servies, et leur latence compte l'attente des nouvelles demandes. Une tuile
+    encore refusée après LOAD_TEST_RETRIES demandes, ou en erreur, est un échec.
+    Retourne et affiche tuiles servies par seconde, latences p50 / p99, refus et échecs.
+    """
+    statuses, latencies, rejections = [], [], []
+    lock = threading.Lock()
+
+    def run_client():
+        def record(future):
+            status, latency, rejected = future.result()
+            with lock:
+                statuses.append(status)
+                latencies.append(latency)
+                rejections.append(rejected)
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            for view in views:
+                futures = [executor.submit(_fetch, base_url + path) for path in view]
+                for future in futures:
+                    future.add_done_callback(record)
+                if interval > 0:
+                    time.sleep(interval)
+                else:
+                    for future in futures:
+                        future.result()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    statuses = np.array(statuses)
+    served = np.array(latencies)[statuses == 200] * 1000
+    rejections = np.array(rejections)
+    report = {
+        "tiles": int(statuses.size),
+        "served": int(served.size),
+        "rejections": int(rejections.sum()),
+        "retried": int(np.count_nonzero(rejections)),
+        "failed": int(np.count_nonzero(statuses != 200)),
+        "elapsed_s": elapsed,
+        "tiles_s": served.size / elapsed,
+        "p50_ms": float(np.percentile(served, 50)) if served.size else float("nan"),
+        "p99_ms": float(np.percentile(served, 99)) if served.size else float("nan"),
+    }
+    log("%d tuiles, %d servies, %d échecs en %.2f s ; %d refus (503), %d tuiles redemandées"
+        % (report["tiles"], report["served"], report["failed"], elapsed, report["rejections"], report["retried"]))
+    log("%.1f tuiles/s, latence p50 %.1f ms, p99 %.1f ms" % (report["tiles_s"], report["p50_ms"], report["p99_ms"]))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur local de tuiles /formule/z/x/y.png.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="lance le serveur")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--workers", type=int, default=None, help="processus de calcul (défaut : tous les cœurs)")
+    serve.add_argument("--colormap", default="viridis")
+    serve.add_argument("--gamma", type=float, default=0.5)
+    serve.add_argument("--cache-dir", default=None, help="répertoire du cache de tuiles sur disque")
+    serve.add_argument("--memory-mb", type=float, default=TILE_MEMORY_BYTES / 2 ** 20)
+    serve.add_argument("--max-pending", type=int, default=None,
+                       help="rendus en attente au-delà desquels les tuiles sont refusées")
+    serve.add_argument("--verbose", action="store_true", help="journalise chaque requête")
+    load = commands.add_parser("load-test", help="mesure un serveur lancé avec 'serve'")
+    load.add_argument("url", nargs="?", default="http://127.0.0.1:8000")
+    load.add_argument("--fractal", default="Mandelbrot", choices=sorted(FORMULAS))
+    load.add_argument("--zoom", type=int, default=4)
+    load.add_argument("--steps", type=int, default=8)
+    load.add_argument("--clients", type=int, default=2)
+    load.add_argument("--concurrency", type=int, default=8, help="connexions simultanées par client")
+    load.add_argument("--interval", type=float, default=0.0,
+                      help="secondes entre deux vues sans attendre les tuiles (0 : attend chaque vue)")
+    args = parser.parse_args(argv)
+
+    if args.command == "load-test":
+        views = scroll_workload(args.fractal, args.zoom, steps=args.steps)
+        load_test(args.url.rstrip("/"), views, args.concurrency, args.clients, args.interval)
+        return 0
+
+    service = TileService(args.workers, args.colormap, args.gamma, int(args.memory_mb * 2 ** 20),
+                          args.cache_dir, args.max_pending)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print("Tuiles sur http://%s:%d/{formule}/{z}/{x}/{y}.png (%d processus)" % (args.host, args.port, service.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 # ui.py
 import pygame
 
-pygame.font.init()
-FONT = pygame.font.SysFont("Arial", 16)
+# Police de l'interface, créée au premier dessin (voir font) : SysFont parcourt les polices
+# du système, ce qui ralentirait le démarrage de tout module qui importe ui.
+FONT = None
 
 # Options UI globales initiales
 UI_OPTIONS = {
@@ -13,6 +14,7 @@ UI_OPTIONS = {
     "custom_re": -0.7,       # Valeur par défaut pour Custom
     "custom_im": 0.27015,     # Valeur par défaut pour Custom
     "fixed_iter": False,      # Si True, le nombre d'itérations ne change pas avec le zoom
+    "auto_iter": True,        # Si True, le nombre d'itérations suit l'histogramme des échappements
     "reset_zoom": False,      # Flag pour réinitialiser la vue
 }
 
@@ -37,6 +39,9 @@ RESET_BUTTON_RECT = pygame.Rect(950, 10, 100, 30)
 # Case à cocher pour fixer le nombre d'itérations (au-dessous des boutons de fractale)
 FIXED_ITER_CHECKBOX_RECT = pygame.Rect(10, 50, 20, 20)
 
+# Case à cocher du mode itérations automatiques (à droite de la précédente)
+AUTO_ITER_CHECKBOX_RECT = pygame.Rect(160, 50, 20, 20)
+
 # Curseur pour le nombre d'itérations (bas à gauche)
 ITER_SLIDER_RECT = pygame.Rect(10, 560, 200, 20)
 
@@ -46,6 +51,9 @@ PALETTE_BUTTON_RECT = pygame.Rect(590, 560, 80, 30)
 # Curseur pour gamma (bas à droite, en dessous du bouton de palette)
 GAMMA_SLIDER_RECT = pygame.Rect(680, 565, 110, 10)
 
+# Zone du HUD de mesures (sous le bouton Reset Zoom), affiché avec F3
+HUD_POS = (880, 50)
+
 # Curseurs pour Custom (affichés seulement si le type est "Custom")
 CUSTOM_RE_SLIDER_RECT = pygame.Rect(10, 80, 200, 20)
 CUSTOM_IM_SLIDER_RECT = pygame.Rect(10, 110, 200, 20)
@@ -55,77 +63,218 @@ dragging_gamma_slider = False
 dragging_custom_re_slider = False
 dragging_custom_im_slider = False
 
-def draw_ui(screen):
+def font():
+    """
+    Police de l'interface (FONT), créée à la première demande.
+    """
+    global FONT
+    if FONT is None:
+        pygame.font.init()
+        FONT = pygame.font.SysFont("Arial", 16)
+    return FONT
+
+def formula_params():
+    """
+    Paramètres de la formule sélectionnée réglés dans l'interface (constante c de Custom),
+    liés par l'état au début du recalcul (voir formulas.Formula.bind).
+    """
+    if UI_OPTIONS["fractal_type"] == "Custom":
+        return {"c": complex(UI_OPTIONS["custom_re"], UI_OPTIONS["custom_im"])}
+    return None
+
+# Couche de l'interface, conservée d'une image à l'autre : chaque élément n'y est redessiné
+# que si son état change, et seuls les rectangles modifiés sont recomposés sur l'écran.
+_layer = None
+_widget_states = {}
+_widget_areas = {}
+_labels = {}
+
+def _label(text, color):
     """
-    Dessine l'interface utilisateur par-dessus l'affichage de la fractale.
+    Surface du texte fixe 'text' (libellés des boutons et des cases), rendue une seule fois.
     """
-    # Boutons de sélection du type de fractale
+    surface = _labels.get((text, color))
+    if surface is None:
+        surface = _labels[(text, color)] = font().render(text, True, color)
+    return surface
+
+def _blit_centered(layer, surface, rect):
+    return layer.blit(surface, surface.get_rect(center=rect.center))
+
+def _draw_fractal_buttons(layer, fractal_type):
+    drawn = []
     for button in TOP_BUTTONS:
         rect = button["rect"]
-        color = (0, 200, 0) if button["label"] == UI_OPTIONS["fractal_type"] else (200, 200, 200)
-        pygame.draw.rect(screen, color, rect)
-        text_surface = FONT.render(button["label"], True, (0, 0, 0))
-        text_rect = text_surface.get_rect(center=rect.center)
-        screen.blit(text_surface, text_rect)
-    
-    # Bouton Reset Zoom
-    pygame.draw.rect(screen, (200, 100, 100), RESET_BUTTON_RECT)
-    reset_text = FONT.render("Reset Zoom", True, (0, 0, 0))
-    reset_text_rect = reset_text.get_rect(center=RESET_BUTTON_RECT.center)
-    screen.blit(reset_text, reset_text_rect)
-    
-    # Case à cocher pour fixer le nombre d'itérations
-    pygame.draw.rect(screen, (200, 200, 200), FIXED_ITER_CHECKBOX_RECT)
-    if UI_OPTIONS["fixed_iter"]:
-        pygame.draw.line(screen, (0,0,0), (FIXED_ITER_CHECKBOX_RECT.left, FIXED_ITER_CHECKBOX_RECT.top),
-                         (FIXED_ITER_CHECKBOX_RECT.right, FIXED_ITER_CHECKBOX_RECT.bottom), 2)
-        pygame.draw.line(screen, (0,0,0), (FIXED_ITER_CHECKBOX_RECT.left, FIXED_ITER_CHECKBOX_RECT.bottom),
-                         (FIXED_ITER_CHECKBOX_RECT.right, FIXED_ITER_CHECKBOX_RECT.top), 2)
-    fixed_text = FONT.render("Fixer itérations", True, (255, 255, 255))
-    screen.blit(fixed_text, (FIXED_ITER_CHECKBOX_RECT.right + 5, FIXED_ITER_CHECKBOX_RECT.top))
-    
-    # Curseur pour le nombre d'itérations
-    pygame.draw.rect(screen, (180, 180, 180), ITER_SLIDER_RECT)
-    slider_pos = int((UI_OPTIONS["max_iter"] - 50) / (2000 - 50) * ITER_SLIDER_RECT.width) + ITER_SLIDER_RECT.x
-    iter_handle_rect = pygame.Rect(slider_pos - 5, ITER_SLIDER_RECT.y - 5, 10, ITER_SLIDER_RECT.height + 10)
-    pygame.draw.rect(screen, (100, 100, 250), iter_handle_rect)
-    iter_text = FONT.render(f"Iter: {UI_OPTIONS['max_iter']}", True, (255, 255, 255))
-    screen.blit(iter_text, (ITER_SLIDER_RECT.x, ITER_SLIDER_RECT.y - 20))
-    
-    # Bouton pour changer de palette
-    pygame.draw.rect(screen, (180, 180, 180), PALETTE_BUTTON_RECT)
-    palette_text = FONT.render(UI_OPTIONS["colormap"], True, (0, 0, 0))
-    palette_text_rect = palette_text.get_rect(center=PALETTE_BUTTON_RECT.center)
-    screen.blit(palette_text, palette_text_rect)
-    
-    # Curseur pour gamma
-    pygame.draw.rect(screen, (180, 180, 180), GAMMA_SLIDER_RECT)
-    gamma_range = 2.0 - 0.1
-    gamma_pos = int((UI_OPTIONS["gamma"] - 0.1) / gamma_range * GAMMA_SLIDER_RECT.width) + GAMMA_SLIDER_RECT.x
-    gamma_handle_rect = pygame.Rect(gamma_pos - 5, GAMMA_SLIDER_RECT.y - 5, 10, GAMMA_SLIDER_RECT.height + 10)
-    pygame.draw.rect(screen, (100, 250, 100), gamma_handle_rect)
-    gamma_text = FONT.render(f"Gamma: {UI_OPTIONS['gamma']:.2f}", True, (255, 255, 255))
-    screen.blit(gamma_text, (GAMMA_SLIDER_RECT.x, GAMMA_SLIDER_RECT.y - 20))
-    
-    # Curseurs Custom (affichés uniquement en mode Custom)
-    if UI_OPTIONS["fractal_type"] == "Custom":
-        pygame.draw.rect(screen, (180, 180, 180), CUSTOM_RE_SLIDER_RECT)
-        re_pos = int((UI_OPTIONS["custom_re"] + 2.0) / 4.0 * CUSTOM_RE_SLIDER_RECT.width) + CUSTOM_RE_SLIDER_RECT.x
-        custom_re_handle = pygame.Rect(re_pos - 5, CUSTOM_RE_SLIDER_RECT.y - 5, 10, CUSTOM_RE_SLIDER_RECT.height + 10)
-        pygame.draw.rect(screen, (250, 100, 100), custom_re_handle)
-        re_text = FONT.render(f"Re: {UI_OPTIONS['custom_re']:.2f}", True, (255, 255, 255))
-        screen.blit(re_text, (CUSTOM_RE_SLIDER_RECT.x, CUSTOM_RE_SLIDER_RECT.y - 20))
-        
-        pygame.draw.rect(screen, (180, 180, 180), CUSTOM_IM_SLIDER_RECT)
-        im_pos = int((UI_OPTIONS["custom_im"] + 2.0) / 4.0 * CUSTOM_IM_SLIDER_RECT.width) + CUSTOM_IM_SLIDER_RECT.x
-        custom_im_handle = pygame.Rect(im_pos - 5, CUSTOM_IM_SLIDER_RECT.y - 5, 10, CUSTOM_IM_SLIDER_RECT.height + 10)
-        pygame.draw.rect(screen, (250, 100, 100), custom_im_handle)
-        im_text = FONT.render(f"Im: {UI_OPTIONS['custom_im']:.2f}", True, (255, 255, 255))
-        screen.blit(im_text, (CUSTOM_IM_SLIDER_RECT.x, CUSTOM_IM_SLIDER_RECT.y - 20))
+        color = (0, 200, 0) if button["label"] == fractal_type else (200, 200, 200)
+        drawn.append(pygame.draw.rect(layer, color, rect))
+        _blit_centered(layer, _label(button["label"], (0, 0, 0)), rect)
+    return drawn
+
+def _draw_reset_button(layer, _):
+    drawn = pygame.draw.rect(layer, (200, 100, 100), RESET_BUTTON_RECT)
+    _blit_centered(layer, _label("Reset Zoom", (0, 0, 0)), RESET_BUTTON_RECT)
+    return [drawn]
+
+def _draw_checkbox(layer, rect, checked, text):
+    drawn = [pygame.draw.rect(layer, (200, 200, 200), rect)]
+    if checked:
+        pygame.draw.line(layer, (0,0,0), (rect.left, rect.top), (rect.right, rect.bottom), 2)
+        pygame.draw.line(layer, (0,0,0), (rect.left, rect.bottom), (rect.right, rect.top), 2)
+        # Les traits débordent d'un pixel à droite et en bas
+        drawn.append(pygame.Rect(rect.x, rect.y, rect.width + 2, rect.height + 2))
+    drawn.append(layer.blit(_label(text, (255, 255, 255)), (rect.right + 5, rect.top)))
+    return drawn
+
+def _draw_fixed_iter(layer, checked):
+    return _draw_checkbox(layer, FIXED_ITER_CHECKBOX_RECT, checked, "Fixer itérations")
+
+def _draw_auto_iter(layer, checked):
+    return _draw_checkbox(layer, AUTO_ITER_CHECKBOX_RECT, checked, "Itérations auto")
+
+def _draw_slider(layer, rect, fraction, handle_color, text):
+    pos = int(fraction * rect.width) + rect.x
+    return [pygame.draw.rect(layer, (180, 180, 180), rect),
+            pygame.draw.rect(layer, handle_color, pygame.Rect(pos - 5, rect.y - 5, 10, rect.height + 10)),
+            layer.blit(font().render(text, True, (255, 255, 255)), (rect.x, rect.y - 20))]
+
+def _draw_iter_slider(layer, max_iter):
+    # Le mode automatique peut dépasser la borne du curseur
+    slider_iter = min(max_iter, 2000)
+    return _draw_slider(layer, ITER_SLIDER_RECT, (slider_iter - 50) / (2000 - 50), (100, 100, 250),
+                        f"Iter: {max_iter}")
+
+def _draw_palette_button(layer, colormap):
+    drawn = pygame.draw.rect(layer, (180, 180, 180), PALETTE_BUTTON_RECT)
+    _blit_centered(layer, _label(colormap, (0, 0, 0)), PALETTE_BUTTON_RECT)
+    return [drawn]
+
+def _draw_gamma_slider(layer, gamma):
+    return _draw_slider(layer, GAMMA_SLIDER_RECT, (gamma - 0.1) / (2.0 - 0.1), (100, 250, 100),
+                        f"Gamma: {gamma:.2f}")
+
+def _draw_custom_re_slider(layer, custom_re):
+    if custom_re is None:
+        return []
+    return _draw_slider(layer, CUSTOM_RE_SLIDER_RECT, (custom_re + 2.0) / 4.0, (250, 100, 100),
+                        f"Re: {custom_re:.2f}")
+
+def _draw_custom_im_slider(layer, custom_im):
+    if custom_im is None:
+        return []
+    return _draw_slider(layer, CUSTOM_IM_SLIDER_RECT, (custom_im + 2.0) / 4.0, (250, 100, 100),
+                        f"Im: {custom_im:.2f}")
+
+# Éléments de l'interface, dans l'ordre où ils sont dessinés
+WIDGETS = ["fractal_type", "reset", "fixed_iter", "auto_iter", "iter", "palette", "gamma",
+           "custom_re", "custom_im"]
+
+_WIDGET_DRAW = {
+    "fractal_type": _draw_fractal_buttons,
+    "reset": _draw_reset_button,
+    "fixed_iter": _draw_fixed_iter,
+    "auto_iter": _draw_auto_iter,
+    "iter": _draw_iter_slider,
+    "palette": _draw_palette_button,
+    "gamma": _draw_gamma_slider,
+    "custom_re": _draw_custom_re_slider,
+    "custom_im": _draw_custom_im_slider,
+}
+
+def widget_states():
+    """
+    État affiché de chaque élément de l'interface (voir WIDGETS) ; les curseurs Custom
+    valent None hors du mode Custom (ils ne sont pas affichés).
+    """
+    custom = UI_OPTIONS["fractal_type"] == "Custom"
+    return {
+        "fractal_type": UI_OPTIONS["fractal_type"],
+        "reset": None,
+        "fixed_iter": UI_OPTIONS["fixed_iter"],
+        "auto_iter": UI_OPTIONS["auto_iter"],
+        "iter": UI_OPTIONS["max_iter"],
+        "palette": UI_OPTIONS["colormap"],
+        "gamma": UI_OPTIONS["gamma"],
+        "custom_re": UI_OPTIONS["custom_re"] if custom else None,
+        "custom_im": UI_OPTIONS["custom_im"] if custom else None,
+    }
+
+def _update_layer(size):
+    """
+    Redessine dans la couche les éléments dont l'état a changé et retourne les rectangles
+    modifiés (ancienne et nouvelle emprise de chaque élément redessiné).
+    """
+    global _layer
+    if _layer is None or _layer.get_size() != size:
+        _layer = pygame.Surface(size, pygame.SRCALPHA)
+        _widget_states.clear()
+        _widget_areas.clear()
+    states = widget_states()
+    changed = {name for name in WIDGETS if name not in _widget_states or _widget_states[name] != states[name]}
+    if not changed:
+        return []
+    # Effacer un élément efface aussi les éléments qui chevauchent son emprise (le texte du
+    # curseur Re recouvre les cases à cocher) : ils sont redessinés avec lui.
+    while True:
+        cleared = [_widget_areas[name] for name in changed if name in _widget_areas]
+        overlapping = {name for name, area in _widget_areas.items()
+                       if name not in changed and area.collidelist(cleared) != -1}
+        if not overlapping:
+            break
+        changed |= overlapping
+    dirty = []
+    for area in cleared:
+        _layer.fill((0, 0, 0, 0), area)
+        dirty.append(area)
+    for name in WIDGETS:
+        if name in changed:
+            drawn = _WIDGET_DRAW[name](_layer, states[name])
+            area = drawn[0].unionall(drawn[1:]) if drawn else pygame.Rect(0, 0, 0, 0)
+            _widget_areas[name] = area
+            _widget_states[name] = states[name]
+            dirty.append(area)
+    return [area for area in dirty if area.width and area.height]
+
+def draw_ui(screen, restore, redraw_all=False):
+    """
+    Dessine l'interface utilisateur par-dessus l'affichage de la fractale et retourne la
+    liste des rectangles de 'screen' modifiés (vide si rien n'a changé).
+
+    L'interface est une couche conservée d'une image à l'autre, où seuls les éléments dont
+    l'état a changé sont redessinés (voir widget_states), et seuls les rectangles modifiés
+    sont recomposés sur l'écran, après que restore(screen, rect) y a remis l'image de la
+    fractale (voir renderer_cpu.restore_background). Avec 'redraw_all', l'image vient
+    d'être entièrement redessinée : toute l'interface y est recomposée.
+    """
+    dirty = _update_layer(screen.get_size())
+    if redraw_all:
+        dirty = [area for area in _widget_areas.values() if area.width and area.height]
+    for rect in dirty:
+        # Les rectangles peuvent se chevaucher : l'image est remise avant chaque composition
+        restore(screen, rect)
+        screen.blit(_layer, rect, rect)
+    return dirty
+
+def draw_hud(screen, stats):
+    """
+    Affiche les mesures par image (durées en ms et compteurs, voir instrumentation.Profiler)
+    sur un fond sombre, à côté des autres éléments de l'interface.
+    """
+    lines = [f"{name}: {value:.1f}" if name.endswith(" ms") else f"{name}: {value:,.0f}"
+             for name, value in stats.items()]
+    if not lines:
+        return
+    height = font().get_linesize()
+    background = pygame.Surface((210, height * len(lines) + 8))
+    background.set_alpha(160)
+    screen.blit(background, HUD_POS)
+    for k, line in enumerate(lines):
+        screen.blit(font().render(line, True, (255, 255, 255)), (HUD_POS[0] + 4, HUD_POS[1] + 4 + k * height))
 
 def handle_ui_event(event, state):
     """
     Gère les événements liés à l'UI et retourne True si l'affichage doit être rafraîchi.
+    'state' est le ComputeWorker de l'application : les recalculs sont seulement mis en file
+    (et fusionnés) pour le thread de calcul.
     """
     global dragging_iter_slider, dragging_gamma_slider, dragging_custom_re_slider, dragging_custom_im_slider
     updated = False
@@ -137,8 +286,7 @@ def handle_ui_event(event, state):
             if button["rect"].collidepoint(pos):
                 if UI_OPTIONS["fractal_type"] != button["label"]:
                     UI_OPTIONS["fractal_type"] = button["label"]
-                    state.fractal_type = button["label"]
-                    state.full_recompute()
+                    state.full_recompute(fractal_type=button["label"], formula_params=formula_params())
                     updated = True
                 break
         # Bouton Reset Zoom
@@ -154,6 +302,12 @@ def handle_ui_event(event, state):
         # Case à cocher fixed_iter
         if FIXED_ITER_CHECKBOX_RECT.collidepoint(pos):
             UI_OPTIONS["fixed_iter"] = not UI_OPTIONS["fixed_iter"]
+            state.set_auto_iter(UI_OPTIONS["auto_iter"] and not UI_OPTIONS["fixed_iter"])
+            updated = True
+        # Case à cocher auto_iter
+        if AUTO_ITER_CHECKBOX_RECT.collidepoint(pos):
+            UI_OPTIONS["auto_iter"] = not UI_OPTIONS["auto_iter"]
+            state.set_auto_iter(UI_OPTIONS["auto_iter"] and not UI_OPTIONS["fixed_iter"])
             updated = True
 
         # Curseur itérations (si la case n'est pas fixée)
@@ -162,7 +316,7 @@ def handle_ui_event(event, state):
             relative_x = pos[0] - ITER_SLIDER_RECT.x
             new_iter = int(relative_x / ITER_SLIDER_RECT.width * (2000 - 50)) + 50
             UI_OPTIONS["max_iter"] = new_iter
-            state.update_zoom(state.re_start, state.re_end, state.im_start, state.im_end, new_iter)
+            state.set_max_iter(new_iter)
             updated = True
 
         # Curseur gamma
@@ -180,14 +334,14 @@ def handle_ui_event(event, state):
                 relative_x = pos[0] - CUSTOM_RE_SLIDER_RECT.x
                 new_custom_re = (relative_x / CUSTOM_RE_SLIDER_RECT.width) * 4.0 - 2.0
                 UI_OPTIONS["custom_re"] = round(new_custom_re, 2)
-                state.full_recompute()
+                state.full_recompute(formula_params=formula_params())
                 updated = True
             if CUSTOM_IM_SLIDER_RECT.collidepoint(pos):
                 dragging_custom_im_slider = True
                 relative_x = pos[0] - CUSTOM_IM_SLIDER_RECT.x
                 new_custom_im = (relative_x / CUSTOM_IM_SLIDER_RECT.width) * 4.0 - 2.0
                 UI_OPTIONS["custom_im"] = round(new_custom_im, 2)
-                state.full_recompute()
+                state.full_recompute(formula_params=formula_params())
                 updated = True
 
     elif event.type == pygame.MOUSEBUTTONUP:
@@ -199,7 +353,7 @@ def handle_ui_event(event, state):
             relative_x = pos[0] - ITER_SLIDER_RECT.x
             new_iter = int(relative_x / ITER_SLIDER_RECT.width * (2000 - 50)) + 50
             UI_OPTIONS["max_iter"] = new_iter
-            state.update_zoom(state.re_start, state.re_end, state.im_start, state.im_end, new_iter)
+            state.set_max_iter(new_iter)
             updated = True
         if dragging_gamma_slider:
             pos = event.pos
@@ -212,14 +366,14 @@ def handle_ui_event(event, state):
             relative_x = pos[0] - CUSTOM_RE_SLIDER_RECT.x
             new_custom_re = (relative_x / CUSTOM_RE_SLIDER_RECT.width) * 4.0 - 2.0
             UI_OPTIONS["custom_re"] = round(new_custom_re, 2)
-            state.full_recompute()
+            state.full_recompute(formula_params=formula_params())
             updated = True
         if dragging_custom_im_slider and UI_OPTIONS["fractal_type"] == "Custom":
             pos = event.pos
             relative_x = pos[0] - CUSTOM_IM_SLIDER_RECT.x
             new_custom_im = (relative_x / CUSTOM_IM_SLIDER_RECT.width) * 4.0 - 2.0
             UI_OPTIONS["custom_im"] = round(new_custom_im, 2)
-            state.full_recompute()
+            state.full_recompute(formula_params=formula_params())
             updated = True
 
     return updated
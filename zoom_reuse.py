@@ -0,0 +1,105 @@
+# zoom_reuse.py
+import numpy as np
+
+# Écart maximal (en itérations smooth) dans un voisinage 3×3 pour qu'une zone soit jugée uniforme.
+UNIFORM_TOLERANCE = 1.0
+
+# Côté des blocs de vérification : un seul pixel par bloc uniforme est recalculé
+# pour valider l'aperçu, le bloc entier ne l'est qu'en cas de désaccord.
+VERIFY_BLOCK = 4
+
+# Écart toléré entre l'aperçu et la valeur recalculée d'un pixel de vérification.
+VERIFY_TOLERANCE = 0.25
+
+
+def resample_previous(result, scale, offset_x=0.0, offset_y=0.0):
+    """
+    Projette l'image 'result' d'une vue précédente sur la nouvelle vue (même taille en pixels).
+
+    'scale' est le rapport entre le pas des pixels de la nouvelle vue et celui de l'ancienne,
+    (offset_x, offset_y) le déplacement du centre exprimé en pixels de l'ancienne vue.
+    L'interpolation est bilinéaire ; les pixels qui tombent hors de l'ancienne vue valent NaN.
+    """
+    height, width = result.shape
+    cx, cy = (width - 1) / 2, (height - 1) / 2
+    x = cx + offset_x + (np.arange(width) - cx) * scale
+    y = cy + offset_y + (np.arange(height) - cy) * scale
+    x0 = np.clip(np.floor(x).astype(np.intp), 0, width - 2)
+    y0 = np.clip(np.floor(y).astype(np.intp), 0, height - 2)
+    fx = (x - x0)[np.newaxis, :]
+    fy = (y - y0)[:, np.newaxis]
+    # Interpolation séparable : d'abord selon les lignes, puis selon les colonnes
+    rows = result.take(y0, axis=0) * (1 - fy) + result.take(y0 + 1, axis=0) * fy
+    seed = rows.take(x0, axis=1) * (1 - fx) + rows.take(x0 + 1, axis=1) * fx
+    outside = ((x < 0) | (x > width - 1))[np.newaxis, :] | ((y < 0) | (y > height - 1))[:, np.newaxis]
+    seed[outside] = np.nan
+    return seed
+
+
+def uniform_pixels(seed):
+    """
+    Retourne le masque des pixels dont le voisinage 3×3 de l'aperçu est connu et uniforme.
+    """
+    padded = np.pad(seed, 1, mode="edge")
+    height, width = seed.shape
+    lo = np.full(seed.shape, np.inf)
+    hi = np.full(seed.shape, -np.inf)
+    for dy in range(3):
+        for dx in range(3):
+            window = padded[dy:dy + height, dx:dx + width]
+            np.fmin(lo, window, out=lo)
+            np.fmax(hi, window, out=hi)
+    uniform = hi - lo <= UNIFORM_TOLERANCE
+    uniform &= ~np.isnan(seed)
+    for dy in range(3):
+        for dx in range(3):
+            uniform &= ~np.isnan(padded[dy:dy + height, dx:dx + width])
+    return uniform
+
+
+def plan_refinement(seed):
+    """
+    Première étape de l'affinage : retourne (uniform, first) où 'first' désigne les pixels
+    à itérer complètement tout de suite, c'est-à-dire les pixels de bord (non uniformes)
+    et un pixel de vérification au centre de chaque bloc VERIFY_BLOCK×VERIFY_BLOCK.
+    """
+    uniform = uniform_pixels(seed)
+    centers = np.zeros(seed.shape, dtype=bool)
+    centers[VERIFY_BLOCK // 2::VERIFY_BLOCK, VERIFY_BLOCK // 2::VERIFY_BLOCK] = True
+    return uniform, ~uniform | centers
+
+
+def rejected_blocks(seed, result):
+    """
+    Seconde étape : compare l'aperçu aux pixels de vérification recalculés (déjà écrits dans
+    'result') et retourne le masque des pixels appartenant à un bloc dont l'aperçu est
+    contredit, ou à un bloc incomplet sans pixel de vérification.
+    """
+    height, width = seed.shape
+    b = VERIFY_BLOCK
+    rows = (height + b - 1) // b
+    cols = (width + b - 1) // b
+    bad = np.ones((rows, cols), dtype=bool)
+    check = result[b // 2::b, b // 2::b]
+    bad[:check.shape[0], :check.shape[1]] = ~(np.abs(check - seed[b // 2::b, b // 2::b]) <= VERIFY_TOLERANCE)
+    return np.repeat(np.repeat(bad, b, axis=0), b, axis=1)[:height, :width]
+
+
+def refine_from_seed(state, seed):
+    """
+    Affine une vue dont 'seed' est l'aperçu projeté depuis la vue précédente.
+
+    Les pixels de bord et les pixels de vérification sont calculés par
+    state.compute_pixels, puis les blocs uniformes contredits par la vérification.
+    Les autres pixels uniformes reçoivent la valeur de l'aperçu (et sont retirés du
+    masque des pixels actifs). 'state.result' doit valoir max_iter partout au départ.
+    Retourne le masque des pixels conservés depuis l'aperçu.
+    """
+    uniform, first = plan_refinement(seed)
+    state.compute_pixels(np.flatnonzero(first))
+    second = uniform & ~first & rejected_blocks(seed, state.result)
+    state.compute_pixels(np.flatnonzero(second))
+    accepted = uniform & ~first & ~second
+    state.result[accepted] = seed[accepted]
+    state.mask[accepted] = False
+    return accepted